@@ -17,6 +17,8 @@ setuptools.setup(
     author="Henri Immonen",
     author_email="henri.immonen@mostdigital.fi",
     install_requires=get_requirements(),
+    extras_require={"snapshot": ["lxml"]},
     packages=get_packages(where="src"),
-    package_dir={"": "src"}
+    package_dir={"": "src"},
+    entry_points={"console_scripts": ["selenium-helpers=selenium_helpers.cli:main"]}
 )
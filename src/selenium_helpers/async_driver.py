@@ -0,0 +1,629 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Script has class 'AsyncDriver', an 'asyncio' version of the helpers of 'Driver', which speaks the
+WebDriver protocol over non-blocking connections, so that one event loop can drive many sessions.
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from collections import deque
+from contextlib import asynccontextmanager, suppress
+
+from selenium.webdriver.remote.command import Command
+from selenium.webdriver.remote.errorhandler import ErrorHandler
+
+from selenium_helpers import browser_scripts
+from selenium_helpers import service
+from selenium_helpers.repeat_on_failure import get_remaining_time
+from selenium_helpers.selenium_helpers import (_DEFAULT_SCRIPT_TIMEOUT, _SETTLE_TIMES_LENGTH,
+                                               WAIT_CONDITIONS, InvalidSelectorException,
+                                               InvalidXPath, Settings, TimeoutException,
+                                               WebDriverException, _check_xpaths)
+
+_MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
+_LOG = logging.getLogger(name=_MODULE_NAME)
+
+# Key of element references in the W3C WebDriver protocol.
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+
+class _HTTPConnectionPool:
+    """
+    At most 'size' kept-alive HTTP/1.1 connections to 'host' and 'port', over 'asyncio' streams.
+    Requests wait for a free connection when all of them are in use.
+    """
+
+    def __init__(self, host, port, size=4, connect_timeout=5, read_timeout=None):
+        """Initialize '_HTTPConnectionPool'. Timeouts are in seconds, or 'None' for no limit."""
+
+        self.host = host
+        self.port = int(port)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._semaphore = asyncio.Semaphore(size)
+        self._idle_connections = []
+
+    async def request(self, method, path, body=None):
+        """
+        Send a request with the JSON 'body' and return the status code and the body of the
+        response.
+        """
+
+        data = json.dumps(body).encode("UTF-8") if body is not None else b""
+        head = (f"{method} {path} HTTP/1.1\r\n"
+                f"Host: {self.host}:{self.port}\r\n"
+                f"Accept: application/json\r\n"
+                f"Content-Type: application/json;charset=UTF-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: keep-alive\r\n\r\n").encode("ascii")
+
+        async with self._semaphore:
+            while True:
+                reused = bool(self._idle_connections)
+                if reused:
+                    reader, writer = self._idle_connections.pop()
+                else:
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_connection(self.host, self.port), self.connect_timeout)
+
+                try:
+                    writer.write(head + data)
+                    await writer.drain()
+                    status, response_body, keep_alive = await asyncio.wait_for(
+                        self._read_response(reader), self.read_timeout)
+                except (ConnectionError, asyncio.IncompleteReadError) as error:
+                    writer.close()
+                    # The server may have closed a kept-alive connection while it was idle.
+                    if reused:
+                        _LOG.debug("Reconnecting after a closed connection: %s", error)
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+
+                if keep_alive:
+                    self._idle_connections.append((reader, writer))
+                else:
+                    writer.close()
+                return status, response_body
+
+    @staticmethod
+    async def _read_response(reader):
+        """Read a response and return its status code, body and whether to keep the connection."""
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed by the server")
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close"
+        if "content-length" in headers:
+            body = await reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b";")[0], 16)
+                if not size:
+                    while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b"".join(chunks)
+        else:
+            body = await reader.read()
+            keep_alive = False
+        return status, body.decode("UTF-8"), keep_alive
+
+    async def close(self):
+        """Close the idle connections."""
+
+        while self._idle_connections:
+            _, writer = self._idle_connections.pop()
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+class AsyncElement:
+    """Reference to an element of the page of 'driver'. Methods are coroutines."""
+
+    def __init__(self, driver, id_):
+        """Initialize 'AsyncElement'."""
+
+        self.driver = driver
+        self.id = id_
+
+    def __eq__(self, other):
+        return isinstance(other, AsyncElement) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    async def _execute(self, command, method, path="", body=None):
+        return await self.driver.execute(command, method, f"/element/{self.id}{path}", body)
+
+    async def find_element_by_xpath(self, xpath):
+        """Return the first element matching 'xpath' relative to this element."""
+
+        body = {"using": "xpath", "value": xpath}
+        value = await self._execute(Command.FIND_CHILD_ELEMENT, "POST", "/element", body)
+        return self.driver._unwrap(value)
+
+    async def find_elements_by_xpath(self, xpath):
+        """Return the elements matching 'xpath' relative to this element."""
+
+        body = {"using": "xpath", "value": xpath}
+        value = await self._execute(Command.FIND_CHILD_ELEMENTS, "POST", "/elements", body)
+        return self.driver._unwrap(value)
+
+    async def text(self):
+        """Return the visible text of the element."""
+
+        return await self._execute(Command.GET_ELEMENT_TEXT, "GET", "/text")
+
+    async def get_attribute(self, name):
+        """
+        Return the property 'name' of the element, or the attribute if there is no such property,
+        like 'WebElement.get_attribute()'.
+        """
+
+        value = await self._execute(Command.GET_ELEMENT_PROPERTY, "GET", f"/property/{name}")
+        if value is None:
+            value = await self._execute(Command.GET_ELEMENT_ATTRIBUTE, "GET",
+                                        f"/attribute/{name}")
+        return value
+
+    async def click(self):
+        """Click the element."""
+
+        await self._execute(Command.CLICK_ELEMENT, "POST", "/click", {})
+
+    async def clear(self):
+        """Clear the value of the element."""
+
+        await self._execute(Command.CLEAR_ELEMENT, "POST", "/clear", {})
+
+    async def send_keys(self, keys):
+        """Type 'keys' to the element."""
+
+        await self._execute(Command.SEND_KEYS_TO_ELEMENT, "POST", "/value",
+                            {"text": keys, "value": list(keys)})
+
+class AsyncDriver:
+    """
+    Class with the helpers of 'Driver' as coroutines. Retries sleep with 'asyncio.sleep()' and
+    commands are sent over kept-alive non-blocking connections, so waiting for a browser does not
+    block a thread. 'Settings' are used like 'Driver' uses them, except that the element cache,
+    snapshots and self-healing elements are not supported.
+
+    Can be used like this:
+    > driver = await AsyncDriver.start(_get_default_options(), Settings(), port=9515)
+    > async with driver.open_url("https://example.com"):
+    >     print(await driver.read_text_by_xpath("//h1"))
+    > await driver.quit()
+    """
+
+    def __init__(self, settings, port=None, session_id=None):
+        """
+        Initialize 'AsyncDriver' for the 'chromedriver' on 'port', or on the port from the
+        environment. Use 'start()' to start or reattach to a session.
+        """
+
+        if not isinstance(settings, Settings):
+            raise TypeError(f"Invalid type: {type(settings)}")
+
+        self.settings = settings
+        self.session_id = session_id
+        # Pairs of action name and seconds spent waiting for the page to settle after it.
+        self.settle_times = deque(maxlen=_SETTLE_TIMES_LENGTH)
+        # Script timeout of the session, in seconds. Only ever raised by the helpers.
+        self._script_timeout = _DEFAULT_SCRIPT_TIMEOUT
+        # URL patterns blocked with 'block_urls()', or 'None' if not set.
+        self._blocked_urls = None
+        self._error_handler = ErrorHandler()
+
+        port = port if port is not None else os.environ.get(service.PORT_ENV_KEY,
+                                                             service.DEFAULT_PORT)
+        self._connections = _HTTPConnectionPool("127.0.0.1", port,
+                                                size=settings.connection_pool_size,
+                                                connect_timeout=settings.connect_timeout,
+                                                read_timeout=settings.read_timeout)
+
+    @classmethod
+    async def start(cls, options, settings, port=None, session_id=None):
+        """
+        Return 'AsyncDriver' with a new session started with 'options', or with the existing
+        session 'session_id'. Raise 'WebDriverException' if the session does not respond.
+        """
+
+        driver = cls(settings, port=port, session_id=session_id)
+        try:
+            if session_id is None:
+                await driver._start_session(options)
+            # Verify that the browser opened.
+            await driver.current_url()
+        except BaseException:
+            await driver._connections.close()
+            raise
+        return driver
+
+    async def _start_session(self, options):
+        capabilities = options.to_capabilities()
+        body = {"capabilities": {"firstMatch": [{}], "alwaysMatch": capabilities},
+                "desiredCapabilities": capabilities}
+        value = await self._request("POST", "/session", body)
+        self.session_id = value["sessionId"]
+
+    async def _request(self, method, path, body=None):
+        """Send a request to the 'chromedriver' and return the value of the response."""
+
+        status, response_body = await self._connections.request(method, path, body)
+        if status >= 400:
+            self._error_handler.check_response({"status": status, "value": response_body})
+            raise WebDriverException(f"HTTP status {status}: {response_body}")
+
+        response = json.loads(response_body) if response_body else {}
+        value = response.get("value")
+        # Responses of the legacy protocol have the session id at the top level.
+        if "sessionId" in response and isinstance(value, dict):
+            value.setdefault("sessionId", response["sessionId"])
+        return value
+
+    async def execute(self, command, method, path, body=None):
+        """
+        Send the command 'method' 'path' of the session, with the JSON 'body', and return its value.
+        Errors are raised as the same exceptions as with 'Driver'. Latencies are recorded to
+        'Settings.metrics', if set, by 'command', the name 'Driver' records the command with.
+        """
+
+        start_time = time.perf_counter()
+        failed = True
+        try:
+            value = await self._request(method, f"/session/{self.session_id}{path}", body)
+            failed = False
+            return value
+        finally:
+            if self.settings.metrics:
+                self.settings.metrics.record_command(command,
+                                                     time.perf_counter() - start_time, failed)
+
+    def _wrap(self, value):
+        """Return 'value' with elements replaced by references, for script arguments."""
+
+        if isinstance(value, AsyncElement):
+            return {ELEMENT_KEY: value.id}
+        if isinstance(value, (list, tuple)):
+            return [self._wrap(item) for item in value]
+        if isinstance(value, dict):
+            return {key: self._wrap(item) for key, item in value.items()}
+        return value
+
+    def _unwrap(self, value):
+        """Return 'value' with element references replaced by 'AsyncElement' instances."""
+
+        if isinstance(value, list):
+            return [self._unwrap(item) for item in value]
+        if isinstance(value, dict):
+            if ELEMENT_KEY in value:
+                return AsyncElement(self, value[ELEMENT_KEY])
+            return {key: self._unwrap(item) for key, item in value.items()}
+        return value
+
+    async def current_url(self):
+        """Return the url of the current page."""
+
+        return await self.execute(Command.GET_CURRENT_URL, "GET", "/url")
+
+    async def get(self, url):
+        """Navigate to 'url'."""
+
+        await self.execute(Command.GET, "POST", "/url", {"url": url})
+
+    async def execute_script(self, script, *args):
+        """Execute 'script' with 'args' in the page and return its value."""
+
+        body = {"script": script, "args": self._wrap(list(args))}
+        return self._unwrap(await self.execute(Command.W3C_EXECUTE_SCRIPT, "POST",
+                                                 "/execute/sync", body))
+
+    async def execute_async_script(self, script, *args):
+        """Execute the asynchronous 'script' with 'args' in the page and return its value."""
+
+        body = {"script": script, "args": self._wrap(list(args))}
+        return self._unwrap(await self.execute(Command.W3C_EXECUTE_SCRIPT_ASYNC, "POST",
+                                                 "/execute/async", body))
+
+    async def execute_cdp_cmd(self, cmd, params=None):
+        """Execute the DevTools protocol command 'cmd' with 'params' and return the result."""
+
+        body = {"cmd": cmd, "params": params or {}}
+        return await self.execute("executeCdpCommand", "POST", "/goog/cdp/execute", body)
+
+    async def is_alive(self):
+        """Return 'True' if the session still responds to commands."""
+
+        with suppress(WebDriverException, OSError, asyncio.TimeoutError):
+            await self.current_url()
+            return True
+        return False
+
+    async def find_element_by_xpath(self, xpath):
+        """Return the first element matching 'xpath'."""
+
+        body = {"using": "xpath", "value": xpath}
+        return self._unwrap(await self.execute(Command.FIND_ELEMENT, "POST", "/element", body))
+
+    async def find_elements_by_xpath(self, xpath):
+        """Return the elements matching 'xpath'."""
+
+        body = {"using": "xpath", "value": xpath}
+        return self._unwrap(await self.execute(Command.FIND_ELEMENTS, "POST", "/elements", body))
+
+    async def find_by_xpath(self, xpath, root_element=None, many=False):
+        """
+        Find the first element matching 'xpath' and 'root_element'. If 'many' is 'True', return a
+        list of elements, instead of the first found. Raise 'InvalidXPath' right away, without
+        retrying, if 'xpath' is not valid.
+        """
+
+        _check_xpaths(xpath)
+        root_element = root_element if root_element else self
+
+        async def implementation():
+            """Wrapped function implementation."""
+
+            try:
+                if many:
+                    if self.settings.wait_for_elements:
+                        await self._wait_for_element(xpath, root_element, "present")
+                    return await root_element.find_elements_by_xpath(xpath)
+                if self.settings.wait_for_elements:
+                    return await self._wait_for_element(xpath, root_element, "present")
+                return await root_element.find_element_by_xpath(xpath)
+            except InvalidSelectorException as error:
+                # Rejected by the browser although the syntax is valid, e.g. an unknown function.
+                raise InvalidXPath(f"'{xpath}': {error.msg}") from None
+
+        return await self.settings.get_async_default_re_try()(implementation)()
+
+    async def wait_for_xpath(self, xpath, timeout, condition="present", root_element=None):
+        """
+        Wait at most 'timeout' seconds for the first element matching 'xpath' and 'root_element' to
+        fulfill 'condition', and return it, like 'Driver.wait_for_xpath()'.
+        """
+
+        if condition not in WAIT_CONDITIONS:
+            raise ValueError(f"Unknown condition: '{condition}'")
+        _check_xpaths(xpath)
+        root_element = root_element if root_element is not self else None
+
+        await self._ensure_script_timeout(timeout)
+        result = await self.execute_async_script(browser_scripts.WAIT_FOR_XPATH, xpath,
+                                                 root_element, condition, timeout * 1000)
+        if result is None:
+            raise TimeoutException(f"Element not {condition} in {timeout} seconds: '{xpath}'")
+        if isinstance(result, dict):
+            raise InvalidXPath(f"'{xpath}': {result['error']}")
+        return result
+
+    async def _wait_for_element(self, xpath, root_element, condition):
+        """
+        Call 'wait_for_xpath()' with 'Settings.wait_timeout', shortened to the time left until the
+        deadline of the retries.
+        """
+
+        timeout = self.settings.wait_timeout
+        remaining_time = get_remaining_time()
+        if remaining_time is not None:
+            timeout = min(timeout, remaining_time)
+        return await self.wait_for_xpath(xpath, timeout, condition=condition,
+                                         root_element=root_element)
+
+    async def _ensure_script_timeout(self, timeout):
+        """Make sure that asynchronous scripts can run at least 'timeout' seconds."""
+
+        # Leave time for the script to call back on its own timeout.
+        timeout += 1
+        if self._script_timeout < timeout:
+            await self.execute(Command.SET_TIMEOUTS, "POST", "/timeouts",
+                               {"script": int(timeout * 1000)})
+            self._script_timeout = timeout
+
+    async def click_by_xpath(self, xpath, send_js_event=False, root_element=None):
+        """Find and click the first element matching 'xpath' and 'root_element'."""
+
+        async def implementation():
+            """Wrapped function implementation."""
+
+            if self.settings.wait_for_elements:
+                element = await self._wait_for_element(xpath, root_element, "clickable")
+            else:
+                element = await self.find_by_xpath(xpath, root_element=root_element, many=False)
+            if send_js_event:
+                await self.execute_script("arguments[0].click();", element)
+            else:
+                await element.click()
+            await self._wait_after_action("click", self.settings.click_delay)
+            return element
+
+        return await self.settings.get_async_default_re_try()(implementation)()
+
+    async def read_text_by_xpath(self, xpath, root_element=None, allow_empty=True):
+        """
+        Find the first element matching 'xpath' and 'root_element' and return its text. If
+        'allow_empty' is 'False' and the text is empty, raise 'WebDriverException'.
+        """
+
+        async def implementation():
+            """Wrapped function implementation."""
+
+            if self.settings.wait_for_elements and not allow_empty:
+                element = await self._wait_for_element(xpath, root_element, "text_nonempty")
+            else:
+                element = await self.find_by_xpath(xpath, root_element=root_element, many=False)
+            text = await element.text()
+            if not text and not allow_empty:
+                raise WebDriverException(f"Text empty: '{xpath}'")
+            return text
+
+        return await self.settings.get_async_default_re_try()(implementation)()
+
+    async def read_attribute_by_xpath(self, xpath, attribute, root_element=None):
+        """
+        Find the first element matching 'xpath' and 'root_element' and return its attribute
+        'attribute', read like 'AsyncElement.get_attribute()' reads it.
+        """
+
+        async def implementation():
+            """Wrapped function implementation."""
+
+            element = await self.find_by_xpath(xpath, root_element=root_element, many=False)
+            return await element.get_attribute(attribute)
+
+        return await self.settings.get_async_default_re_try()(implementation)()
+
+    async def send_keys_by_xpath(self, xpath, keys, root_element=None):
+        """
+        Find the first element matching 'xpath' and 'root_element' and try to change its value to
+        'keys'.
+        """
+
+        async def implementation():
+            """Wrapped function implementation."""
+
+            element = await self.find_by_xpath(xpath, root_element=root_element)
+
+            await element.clear()
+            await self._wait_after_action("clear", self.settings.send_keys_delay)
+
+            await element.send_keys(keys)
+            await self._wait_after_action("send_keys", self.settings.send_keys_delay)
+
+            element_value = await element.get_attribute("value")
+            if element_value != keys:
+                raise WebDriverException(f"Element's value does not match with sent keys:\n"
+                                         f"'{element_value}' and '{keys}'")
+            return element
+
+        if not isinstance(keys, str):
+            keys = f"{keys}"
+        return await self.settings.get_async_default_re_try()(implementation)()
+
+    async def block_urls(self, patterns):
+        """
+        Block the browser from requesting URLs matching any of 'patterns', like
+        'Driver.block_urls()'.
+        """
+
+        patterns = list(patterns)
+        if patterns == (self._blocked_urls or []):
+            return
+
+        await self.execute_cdp_cmd("Network.enable")
+        await self.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        self._blocked_urls = patterns
+
+    @asynccontextmanager
+    async def open_url(self, url, go_back=True, refresh=False, blocked_urls=None):
+        """
+        Open the 'url'. If 'go_back' is 'True', go back to the original url afterwards. If
+        'refresh' is 'True', open the 'url' even if it is already open. Requests to URLs matching
+        'blocked_urls', or 'Settings.blocked_urls' if not given, are blocked.
+
+        Can be used like this:
+        > async with driver.open_url("google.com"):
+        >     print("Now at 'google.com'")
+        > print("Now at starting url.")
+        """
+
+        async def go_to(new_url):
+            """
+            Go to 'url' if it is a different page than the current one, or if 'refresh' is 'True'.
+            """
+
+            is_new_url = new_url != await self.current_url()
+            if refresh or is_new_url:
+                await self.get(new_url)
+                await self._wait_after_action("open_url", self.settings.change_page_delay)
+
+        await self.block_urls(self.settings.blocked_urls if blocked_urls is None else blocked_urls)
+        original_url = await self.current_url()
+        await go_to(url)
+        yield
+        if go_back:
+            await go_to(original_url)
+
+    async def wait_until_settled(self, max_wait, action=None):
+        """
+        Wait until the page has settled, but at most 'max_wait' seconds, like
+        'Driver.wait_until_settled()'. Return the time waited.
+        """
+
+        start_time = time.time()
+        try:
+            await self._ensure_script_timeout(max_wait)
+            await self.execute_async_script(browser_scripts.WAIT_UNTIL_SETTLED, max_wait * 1000,
+                                            self.settings.settle_quiet_time * 1000)
+        except WebDriverException as error:
+            # The page can change or an alert can open while the script runs.
+            _LOG.debug("Could not wait for the page to settle: %s", error)
+            await asyncio.sleep(max(0, max_wait - (time.time() - start_time)))
+
+        elapsed_time = time.time() - start_time
+        _LOG.debug("Page settled after '%s' in %.3f seconds", action, elapsed_time)
+        self.settle_times.append((action, elapsed_time))
+        if self.settings.metrics:
+            self.settings.metrics.record_settle(action, elapsed_time)
+        return elapsed_time
+
+    async def _wait_after_action(self, action, delay):
+        """Wait for the page to settle after 'action', or sleep 'delay' seconds if disabled."""
+
+        if self.settings.wait_for_settle:
+            await self.wait_until_settled(delay, action=action)
+        else:
+            await asyncio.sleep(delay)
+            if self.settings.metrics:
+                self.settings.metrics.record_delay(action, delay)
+
+    async def accept_alert(self):
+        """Close alert by clicking 'OK'."""
+
+        async def implementation():
+            """Wrapped function implementation."""
+
+            await self.execute(Command.W3C_ACCEPT_ALERT, "POST", "/alert/accept", {})
+        await self.settings.get_async_alerts_re_try()(implementation)()
+
+    async def cancel_alert(self):
+        """Close alert by clicking 'Cancel'."""
+
+        async def implementation():
+            """Wrapped function implementation."""
+
+            await self.execute(Command.W3C_DISMISS_ALERT, "POST", "/alert/dismiss", {})
+        await self.settings.get_async_alerts_re_try()(implementation)()
+
+    async def quit(self):
+        """End the session and close the connections."""
+
+        try:
+            await self._request("DELETE", f"/session/{self.session_id}")
+        finally:
+            await self._connections.close()
@@ -0,0 +1,293 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Script has JavaScript snippets that 'Driver' executes in the browser."""
+
+# Shared helpers, prepended to the scripts that need them. 'readNode()' approximates what
+# 'WebElement.text' and 'WebElement.get_attribute()' return.
+_HELPERS = """
+function evaluateFirst(xpath, root) {
+    return document.evaluate(xpath, root || document, null,
+                             XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+}
+function evaluateAll(xpath, root) {
+    var result = document.evaluate(xpath, root || document, null,
+                                   XPathResult.ORDERED_NODE_SNAPSHOT_TYPE, null);
+    var nodes = [];
+    for (var i = 0; i < result.snapshotLength; i++) {
+        nodes.push(result.snapshotItem(i));
+    }
+    return nodes;
+}
+function readNode(node, attribute) {
+    if (attribute) {
+        var property = node[attribute];
+        if (property !== undefined && property !== null && typeof property !== "object"
+                && typeof property !== "function") {
+            return "" + property;
+        }
+        return node.getAttribute ? node.getAttribute(attribute) : null;
+    }
+    var text = node.innerText !== undefined ? node.innerText : node.textContent;
+    return (text || "").trim();
+}
+"""
+
+# Arguments: list of xpaths, root element or 'null', attribute name or 'null'. Returns a list with
+# the text (or the attribute) of the first match of each xpath, 'null' for xpaths without a
+# match, or '{error, index}' for the first xpath that could not be evaluated.
+READ_XPATHS = _HELPERS + """
+var xpaths = arguments[0], root = arguments[1], attribute = arguments[2];
+var values = [];
+for (var i = 0; i < xpaths.length; i++) {
+    var node;
+    try {
+        node = evaluateFirst(xpaths[i], root);
+    } catch (error) {
+        return {error: "" + error, index: i};
+    }
+    values.push(node ? readNode(node, attribute) : null);
+}
+return values;
+"""
+
+# Arguments: row xpath, list of column xpaths relative to a row, root element or 'null', offset,
+# limit and a key unique to the extraction. Returns '{total, rows}', where 'rows' has the column
+# values of rows 'offset' to 'offset + limit', or '{error}' if an xpath could not be evaluated.
+# The rows found for the first chunk are kept on 'window' by the key until the last chunk is read,
+# so that the region is searched once, not once per chunk.
+EXTRACT_RECORDS = _HELPERS + """
+var rowXpath = arguments[0], columns = arguments[1], root = arguments[2];
+var offset = arguments[3], limit = arguments[4], key = arguments[5];
+try {
+    var found = window.__seleniumHelpersRows || (window.__seleniumHelpersRows = {});
+    var rows = offset > 0 ? found[key] : undefined;
+    if (!rows) {
+        rows = evaluateAll(rowXpath, root);
+    }
+    var records = [];
+    var end = Math.min(rows.length, offset + limit);
+    if (end < rows.length) {
+        found[key] = rows;
+    } else {
+        delete found[key];
+    }
+    for (var i = offset; i < end; i++) {
+        var record = [];
+        for (var j = 0; j < columns.length; j++) {
+            var node = evaluateFirst(columns[j], rows[i]);
+            record.push(node ? readNode(node, null) : null);
+        }
+        records.push(record);
+    }
+    return {total: rows.length, rows: records};
+} catch (error) {
+    return {error: "" + error};
+}
+"""
+
+# Arguments: table xpath, root element or 'null', offset and limit. Returns '{total, rows}', where
+# 'rows' has the cell texts of rows 'offset' to 'offset + limit', 'null' if the table was not found
+# or '{error}' if the xpath could not be evaluated.
+READ_TABLE = _HELPERS + """
+var xpath = arguments[0], root = arguments[1], offset = arguments[2], limit = arguments[3];
+var table;
+try {
+    table = evaluateFirst(xpath, root);
+} catch (error) {
+    return {error: "" + error};
+}
+if (!table || !table.rows) {
+    return null;
+}
+var records = [];
+var end = Math.min(table.rows.length, offset + limit);
+for (var i = offset; i < end; i++) {
+    var cells = table.rows[i].cells, record = [];
+    for (var j = 0; j < cells.length; j++) {
+        record.push(readNode(cells[j], null));
+    }
+    records.push(record);
+}
+return {total: table.rows.length, rows: records};
+"""
+
+# Arguments: maximum wait and quiet time in milliseconds, and the callback of
+# 'execute_async_script()'. Installs counters for in-flight fetch and XHR requests and a
+# 'MutationObserver' on the page, unless already installed, and calls back with 'true' once the
+# document is loaded, no requests are in flight and the DOM has not changed for the quiet time, or
+# with 'false' if the maximum wait is reached first.
+WAIT_UNTIL_SETTLED = """
+var maxWait = arguments[0], quietTime = arguments[1], done = arguments[arguments.length - 1];
+var state = window.__seleniumHelpersSettle;
+if (!state) {
+    state = window.__seleniumHelpersSettle = {pending: 0, lastMutation: Date.now()};
+    var finished = function() { state.pending--; };
+    if (window.fetch) {
+        var originalFetch = window.fetch;
+        window.fetch = function() {
+            state.pending++;
+            try {
+                var promise = originalFetch.apply(this, arguments);
+            } catch (error) {
+                finished();
+                throw error;
+            }
+            promise.then(finished, finished);
+            return promise;
+        };
+    }
+    var originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function() {
+        state.pending++;
+        this.addEventListener("loadend", finished);
+        try {
+            return originalSend.apply(this, arguments);
+        } catch (error) {
+            this.removeEventListener("loadend", finished);
+            finished();
+            throw error;
+        }
+    };
+    new MutationObserver(function() { state.lastMutation = Date.now(); }).observe(
+        document, {childList: true, subtree: true, attributes: true, characterData: true});
+}
+var start = Date.now();
+(function check() {
+    var now = Date.now();
+    var settled = document.readyState === "complete" && state.pending <= 0
+        && now - state.lastMutation >= quietTime;
+    if (settled || now - start >= maxWait) {
+        done(settled);
+    } else {
+        setTimeout(check, 25);
+    }
+})();
+"""
+
+# Arguments: xpath, root element or 'null', condition, timeout in milliseconds, and the callback of
+# 'execute_async_script()'. Calls back with the first element matching the xpath as soon as it
+# fulfills the condition, 'null' on timeout, or '{error}' if the xpath could not be evaluated.
+# The condition is checked again on every DOM mutation.
+WAIT_FOR_XPATH = _HELPERS + """
+var xpath = arguments[0], root = arguments[1], condition = arguments[2], timeout = arguments[3];
+var done = arguments[arguments.length - 1];
+function isVisible(node) {
+    if (!node.getClientRects().length) {
+        return false;
+    }
+    var style = window.getComputedStyle(node);
+    return style.visibility !== "hidden" && style.display !== "none";
+}
+function findMatch() {
+    var node = evaluateFirst(xpath, root);
+    if (!node || node.nodeType !== Node.ELEMENT_NODE) {
+        return null;
+    }
+    if ((condition === "visible" || condition === "clickable") && !isVisible(node)) {
+        return null;
+    }
+    if (condition === "clickable" && node.disabled) {
+        return null;
+    }
+    if (condition === "text_nonempty" && !readNode(node, null)) {
+        return null;
+    }
+    return node;
+}
+var observer = null, timer = null, fallback = null, finished = false;
+function finish(result) {
+    finished = true;
+    if (observer) {
+        observer.disconnect();
+    }
+    clearTimeout(timer);
+    clearInterval(fallback);
+    done(result);
+}
+function check() {
+    if (finished) {
+        return;
+    }
+    var node;
+    try {
+        node = findMatch();
+    } catch (error) {
+        finish({error: "" + error});
+        return;
+    }
+    if (node) {
+        finish(node);
+    }
+}
+check();
+if (!finished) {
+    observer = new MutationObserver(check);
+    observer.observe(document,
+                     {childList: true, subtree: true, attributes: true, characterData: true});
+    // Visibility can also change without DOM mutations, for example when a stylesheet loads.
+    fallback = setInterval(check, 250);
+    timer = setTimeout(function() { finish(null); }, timeout);
+}
+"""
+
+# Arguments: list of '[xpath, value]' pairs and root element or 'null'. Sets the value of the first
+# element matching each xpath, or its checked state if the value is a boolean, and dispatches
+# 'input' and 'change' events. Returns a list of '{found, editable, accepted}' telling for each
+# field whether the element was found, was not disabled or read-only, and accepted the value, or
+# '{error, index}' for the first xpath that could not be evaluated.
+FILL_FORM = _HELPERS + """
+var fields = arguments[0], root = arguments[1];
+function setValue(node, value) {
+    if (typeof value === "boolean") {
+        node.checked = value;
+    } else {
+        // Use the native setter, so that frameworks tracking the value notice the change.
+        var descriptor = Object.getOwnPropertyDescriptor(Object.getPrototypeOf(node), "value");
+        if (descriptor && descriptor.set) {
+            descriptor.set.call(node, value);
+        } else {
+            node.value = value;
+        }
+    }
+    node.dispatchEvent(new Event("input", {bubbles: true}));
+    node.dispatchEvent(new Event("change", {bubbles: true}));
+    return typeof value === "boolean" ? node.checked === value : node.value === value;
+}
+var results = [];
+for (var i = 0; i < fields.length; i++) {
+    var node;
+    try {
+        node = evaluateFirst(fields[i][0], root);
+    } catch (error) {
+        return {error: "" + error, index: i};
+    }
+    if (!node) {
+        results.push({found: false, editable: false, accepted: false});
+    } else if (node.disabled || node.readOnly) {
+        results.push({found: true, editable: false, accepted: false});
+    } else {
+        results.push({found: true, editable: true, accepted: setValue(node, fields[i][1])});
+    }
+}
+return results;
+"""
+
+# Opens an empty tab without switching to it.
+OPEN_TAB = """
+window.open("about:blank", "_blank");
+"""
+
+# Arguments: url. Starts navigating to the url without waiting for the page to load.
+NAVIGATE = """
+window.location.href = arguments[0];
+"""
+
+# Arguments: list of 'document.readyState' values counted as loaded. Returns whether the page the
+# tab was navigated to has loaded, so the empty page of a new tab does not count.
+IS_LOADED = """
+return window.location.href !== "about:blank" && arguments[0].indexOf(document.readyState) !== -1;
+"""
@@ -0,0 +1,291 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Script has the 'selenium-helpers' command line interface. 'selenium-helpers run' reads tasks from
+a file, runs them in worker processes with a 'chromedriver' and a session each, and writes the
+results as JSON lines. 'selenium-helpers daemon' runs a 'daemon.SessionDaemon', which leases warm
+sessions to other processes.
+
+The task file is a JSON object of the urls and what to extract from each:
+> {
+>     "fields": {"title": "//h1"},
+>     "records": {"row": "//table//tr", "columns": {"name": "./td[1]", "price": "./td[2]"}},
+>     "urls": ["https://example.com/a", {"url": "https://example.com/b", "fields": {}}]
+> }
+
+'fields' are read with 'Driver.read_texts_by_xpaths()' and 'records' with
+'Driver.extract_records()'. A url can be an object overriding them for that url.
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import signal
+import logging
+import argparse
+import threading
+import multiprocessing
+from contextlib import suppress
+
+import urllib3
+
+from selenium_helpers import daemon
+from selenium_helpers import pool
+from selenium_helpers import service
+from selenium_helpers.selenium_helpers import (PROFILES, Driver, InvalidXPath, Settings,
+                                               WebDriverException, _get_default_options)
+
+_MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
+_LOG = logging.getLogger(name=_MODULE_NAME)
+
+# Exceptions that fail a task, once its retries are used up, instead of stopping the worker.
+_TASK_EXCEPTIONS = (WebDriverException, InvalidXPath, urllib3.exceptions.HTTPError, OSError)
+
+# Interval, in seconds, between progress reports.
+_PROGRESS_INTERVAL = 1
+
+def load_tasks(task_file_path):
+    """
+    Read the task file 'task_file_path' and return a list of tasks, dicts with the keys 'index',
+    'url', 'fields' and 'records'. Raise 'ValueError' if the file is not valid.
+    """
+
+    with open(task_file_path, "r") as task_file:
+        spec = json.load(task_file)
+    if not isinstance(spec, dict) or not isinstance(spec.get("urls"), list):
+        raise ValueError(f"'{task_file_path}' has no list of 'urls'")
+
+    tasks = []
+    for index, url in enumerate(spec["urls"]):
+        task = {"index": index, "fields": spec.get("fields"), "records": spec.get("records")}
+        if isinstance(url, dict):
+            task.update(url)
+        else:
+            task["url"] = url
+        if not isinstance(task.get("url"), str):
+            raise ValueError(f"Task {index} of '{task_file_path}' has no url")
+        tasks.append(task)
+    return tasks
+
+def run_task(driver, task):
+    """
+    Open the url of 'task' with 'driver' and return the result of the task as a dict. The whole
+    task is retried with 'Settings.get_default_re_try()', and if it still fails, the result has
+    the error instead.
+    """
+
+    def implementation():
+        """Wrapped function implementation."""
+
+        with driver.open_url(task["url"], go_back=False):
+            result = {}
+            if task.get("fields"):
+                result["fields"] = driver.read_texts_by_xpaths(task["fields"])
+            if task.get("records"):
+                records = task["records"]
+                result["records"] = list(driver.extract_records(records["row"],
+                                                                records["columns"]))
+            return result
+
+    result = {"index": task["index"], "url": task["url"]}
+    try:
+        result.update(driver.settings.get_default_re_try()(implementation)())
+    except _TASK_EXCEPTIONS as error:
+        _LOG.warning("Task %s failed: %s", task["index"], error)
+        result["error"] = f"{type(error).__name__}: {error}"
+    return result
+
+def _create_driver(port, profile, tries, recycle_after_pages, recycle_after_rss):
+    """Return a new 'Driver' using the 'chromedriver' on 'port'."""
+
+    settings = Settings()
+    settings.try_times = tries
+    settings.recycle_after_pages = recycle_after_pages
+    settings.recycle_after_rss = recycle_after_rss
+    settings.blocked_urls = list(PROFILES[profile]["blocked_urls"])
+    return Driver(_get_default_options(profile), settings, port=port)
+
+def _run_worker(port, driver_args, start_service, tasks, results):
+    """
+    Run the tasks from the queue 'tasks' until 'None' is received, and put their results to the
+    queue 'results'. Uses the 'chromedriver' on 'port', started and shut down by the worker if
+    'start_service' is 'True', and drivers created with 'driver_args'. Between tasks, a driver that
+    stops responding is replaced, and a driver that needs recycling is recycled.
+    """
+
+    driver = None
+    try:
+        if start_service:
+            service._start_chromedriver(port=port)
+
+        for task in iter(tasks.get, None):
+            try:
+                if driver is None or not driver.is_alive():
+                    driver = _create_driver(port, *driver_args)
+                else:
+                    driver.recycle_if_needed()
+            except _TASK_EXCEPTIONS as error:
+                _LOG.error("Could not create a driver on port %s: %s", port, error)
+                driver = None
+                results.put({"index": task["index"], "url": task["url"],
+                             "error": f"{type(error).__name__}: {error}"})
+                continue
+            results.put(run_task(driver, task))
+    finally:
+        if driver is not None:
+            with suppress(*_TASK_EXCEPTIONS):
+                driver.quit()
+        if start_service:
+            service._shutdown_chromedriver(port=port)
+
+def _report_progress(done, failed, total, start_time, stream):
+    """Write the number of finished tasks and the throughput so far to 'stream'."""
+
+    elapsed_time = time.monotonic() - start_time
+    rate = done / elapsed_time if elapsed_time else 0
+    stream.write(f"\r{done}/{total} tasks, {failed} failed, {rate:.2f} tasks/s, "
+                 f"{elapsed_time:.0f} s")
+    stream.flush()
+
+def run(tasks, output, workers, first_port=pool.DEFAULT_FIRST_PORT, profile="default", tries=3,
+        start_service=True, progress=sys.stderr, recycle_after_pages=None, recycle_after_rss=None):
+    """
+    Run 'tasks' in 'workers' processes, each using the 'chromedriver' on its own port starting
+    from 'first_port', and write their results to 'output' as JSON lines in the order they finish.
+    Report the progress to 'progress', unless it is 'None'. Browsers are recycled after
+    'recycle_after_pages' pages or 'recycle_after_rss' megabytes of memory, if given. Return the
+    number of failed tasks.
+    """
+
+    context = multiprocessing.get_context("spawn")
+    task_queue = context.Queue()
+    result_queue = context.Queue()
+    for task in tasks:
+        task_queue.put(task)
+
+    processes = []
+    workers = max(1, min(workers, len(tasks)))
+    for index in range(workers):
+        task_queue.put(None)
+        driver_args = (profile, tries, recycle_after_pages, recycle_after_rss)
+        process = context.Process(target=_run_worker, args=(first_port + index, driver_args,
+                                                            start_service, task_queue,
+                                                            result_queue))
+        process.start()
+        processes.append(process)
+
+    start_time = time.monotonic()
+    report_time = start_time
+    done = failed = 0
+    try:
+        while done < len(tasks):
+            try:
+                result = result_queue.get(timeout=_PROGRESS_INTERVAL)
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError(f"Workers exited with {len(tasks) - done} tasks left")
+            else:
+                done += 1
+                failed += "error" in result
+                output.write(json.dumps(result) + "\n")
+                output.flush()
+
+            if progress is not None and (time.monotonic() - report_time >= _PROGRESS_INTERVAL
+                                         or done == len(tasks)):
+                report_time = time.monotonic()
+                _report_progress(done, failed, len(tasks), start_time, progress)
+    finally:
+        if progress is not None:
+            progress.write("\n")
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+    return failed
+
+def _add_run_parser(subparsers):
+    parser = subparsers.add_parser("run", help="Run the tasks of a task file in worker processes")
+    parser.add_argument("task_file", help="JSON file of the urls and what to extract")
+    parser.add_argument("--output", "-o", default="-",
+                        help="File to write the results to as JSON lines, '-' for stdout")
+    parser.add_argument("--workers", "-w", type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes, each with a browser of its own")
+    parser.add_argument("--first-port", type=int, default=pool.DEFAULT_FIRST_PORT,
+                        help="Port of the 'chromedriver' of the first worker")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="default",
+                        help="Options profile of the browsers")
+    parser.add_argument("--tries", type=int, default=3, help="Retries of a failed task")
+    parser.add_argument("--recycle-after-pages", type=int,
+                        help="Restart a browser after this many pages")
+    parser.add_argument("--recycle-after-rss", type=float,
+                        help="Restart a browser when its processes use this many megabytes")
+    parser.add_argument("--no-start-service", dest="start_service", action="store_false",
+                        help="Use 'chromedriver' services that are already running")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Do not report progress")
+
+def _run_command(args):
+    tasks = load_tasks(args.task_file)
+    progress = None if args.quiet else sys.stderr
+    kwargs = {"workers": args.workers, "first_port": args.first_port, "profile": args.profile,
+              "tries": args.tries, "start_service": args.start_service, "progress": progress,
+              "recycle_after_pages": args.recycle_after_pages,
+              "recycle_after_rss": args.recycle_after_rss}
+    if args.output == "-":
+        failed = run(tasks, sys.stdout, **kwargs)
+    else:
+        with open(args.output, "w") as output_file:
+            failed = run(tasks, output_file, **kwargs)
+    return 1 if failed else 0
+
+def _add_daemon_parser(subparsers):
+    parser = subparsers.add_parser("daemon", help="Lease warm sessions over a Unix socket")
+    parser.add_argument("--socket", default=daemon.DEFAULT_SOCKET_PATH,
+                        help="Path of the Unix socket to listen on")
+    parser.add_argument("--size", type=int, default=4, help="Number of sessions")
+    parser.add_argument("--spares", type=int, default=1,
+                        help="Number of idle sessions kept ready for new leases")
+    parser.add_argument("--first-port", type=int, default=pool.DEFAULT_FIRST_PORT,
+                        help="Port of the 'chromedriver' of the first session")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="default",
+                        help="Options profile of the browsers")
+    parser.add_argument("--no-start-service", dest="start_service", action="store_false",
+                        help="Use 'chromedriver' services that are already running")
+
+def _daemon_command(args):
+    with daemon.SessionDaemon(args.socket, size=args.size, spares=args.spares,
+                              first_port=args.first_port, start_service=args.start_service,
+                              profile=args.profile) as session_daemon:
+
+        def stop(*_):
+            # 'shutdown()' waits for 'serve_forever()', so it can not be called from this thread.
+            threading.Thread(target=session_daemon.shutdown).start()
+
+        signal.signal(signal.SIGTERM, stop)
+        _LOG.warning("Listening on '%s'", args.socket)
+        with suppress(KeyboardInterrupt):
+            session_daemon.serve_forever()
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="selenium-helpers",
+                                     description="Command line tools for 'selenium_helpers'.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    _add_run_parser(subparsers)
+    _add_daemon_parser(subparsers)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.command == "run":
+        return _run_command(args)
+    if args.command == "daemon":
+        return _daemon_command(args)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Script has functions for recording the commands sent to the 'chromedriver' to a trace file, and
+class 'ReplayConnection' for serving a 'Driver' from a trace without a browser.
+
+A trace is a JSON lines file with a record for every command, in the order they were sent:
+> {"command": "findElement", "params": {...}, "response": {...}, "time": 0.0042}
+'time' is the latency of the command, in seconds. Recording is enabled with 'Settings.trace_path'
+and a trace is replayed with 'Driver.replay()'.
+"""
+
+import json
+import time
+import threading
+
+# Parameters left out of the records, since they change from session to session.
+_VOLATILE_PARAMS = ("sessionId",)
+
+# Commands whose parameters are not compared on replay. New session parameters are the
+# capabilities of a browser that is not there.
+_UNCHECKED_COMMANDS = ("newSession",)
+
+_WRITE_LOCK = threading.Lock()
+
+class TraceMismatch(Exception):
+    """Custom exception for a command that differs from the trace being replayed."""
+
+def _normalize_params(params):
+    """Return 'params' as they are written to a trace."""
+
+    if not isinstance(params, dict):
+        return params
+    params = {key: value for key, value in params.items() if key not in _VOLATILE_PARAMS}
+    # Tuples and lists are both written as lists.
+    return json.loads(json.dumps(params))
+
+def append_record(trace_path, command, params, response, elapsed_time):
+    """
+    Append the record of 'command', sent with 'params', and its 'response', which took
+    'elapsed_time' seconds, to the trace 'trace_path'. Each record is written with a single append,
+    so the trace is complete up to the last command even if the process is killed.
+    """
+
+    record = {"command": command, "params": _normalize_params(params), "response": response,
+              "time": round(elapsed_time, 6)}
+    line = json.dumps(record, separators=(",", ":")) + "\n"
+    with _WRITE_LOCK, open(trace_path, "a") as trace_file:
+        trace_file.write(line)
+
+def read_trace(trace_path):
+    """Return the records of the trace 'trace_path' as a list of dicts."""
+
+    with open(trace_path, "r") as trace_file:
+        return [json.loads(line) for line in trace_file if line.strip()]
+
+class ReplayConnection:
+    """
+    Connection that answers every command with the next response of the trace 'trace_path',
+    instead of sending it to a 'chromedriver'. Raise 'TraceMismatch' if a command, or unless
+    'check_params' is 'False' its parameters, differ from the trace, or the trace has ended. If
+    'delay' is 'True', each response is delayed by its recorded latency. Thread safe, but commands
+    of concurrent threads must come in the recorded order.
+
+    Can be used like this:
+    > driver = Driver.replay("login.jsonl")
+    > driver.click_by_xpath("//button")
+    > assert driver.command_executor.remaining == 0
+    """
+
+    def __init__(self, trace_path, delay=False, check_params=True):
+        """Initialize 'ReplayConnection' by reading the trace 'trace_path'."""
+
+        self.records = read_trace(trace_path)
+        self.delay = delay
+        self.check_params = check_params
+        self.position = 0
+        # Set by the driver, like for 'RemoteConnection'.
+        self.w3c = True
+        self._lock = threading.Lock()
+
+    @property
+    def remaining(self):
+        """Number of commands left in the trace."""
+
+        return len(self.records) - self.position
+
+    def execute(self, command, params):
+        """Return the recorded response to 'command'."""
+
+        with self._lock:
+            if self.position >= len(self.records):
+                raise TraceMismatch(f"Trace ended, but got '{command}'")
+            record = self.records[self.position]
+            self.position += 1
+            number = self.position
+
+        if record["command"] != command:
+            raise TraceMismatch(f"Command {number} was '{record['command']}', "
+                                f"but got '{command}'")
+        if self.check_params and command not in _UNCHECKED_COMMANDS:
+            params = _normalize_params(params)
+            if params != record["params"]:
+                raise TraceMismatch(f"Command {number} '{command}' had parameters "
+                                    f"{record['params']}, but got {params}")
+        if self.delay:
+            time.sleep(record["time"])
+        return record["response"]
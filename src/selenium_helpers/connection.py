@@ -0,0 +1,158 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Script has class 'PooledConnection' for sending commands over kept-alive connections."""
+
+import os
+import time
+import logging
+import threading
+from urllib import parse
+
+import urllib3
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote import utils
+from selenium.webdriver.remote.errorhandler import ErrorCode
+from selenium.webdriver.remote.remote_connection import RemoteConnection
+
+from selenium_helpers import command_trace
+
+_MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
+_LOG = logging.getLogger(name=_MODULE_NAME)
+
+# Number of connections kept open to the 'chromedriver'.
+_POOL_SIZE = 4
+# Time, in seconds, to wait for a connection to the 'chromedriver' to open.
+_CONNECT_TIMEOUT = 5
+
+class _CommandStats:
+    """Number of requests and their total and longest latency, in seconds, for a command."""
+
+    def __init__(self):
+        """Initialize '_CommandStats'."""
+
+        self.count = 0
+        self.total_time = 0
+        self.max_time = 0
+
+class PooledConnection(RemoteConnection):
+    """
+    'RemoteConnection' that reuses up to 'pool_size' kept-alive connections, from any number of
+    threads, instead of opening a new connection for every command. Records the latency of each
+    command, and if 'trace_path' is given, appends every command and its response to that trace
+    (see 'command_trace').
+    """
+
+    def __init__(self, remote_server_addr, pool_size=_POOL_SIZE, connect_timeout=_CONNECT_TIMEOUT,
+                 read_timeout=None, command_timeouts=None, trace_path=None):
+        """
+        Initialize 'PooledConnection'. 'connect_timeout' and 'read_timeout' are the timeouts of
+        each request, in seconds, or 'None' for no limit. 'command_timeouts' maps 'Command' names
+        to read timeouts used instead of 'read_timeout' for them. A command without a response in
+        time raises 'TimeoutException'.
+        """
+
+        # The address is local, so there is no need to resolve it.
+        super().__init__(remote_server_addr, keep_alive=True, resolve_ip=False)
+
+        # Chrome DevTools protocol commands, like 'ChromeRemoteConnection' has.
+        self._commands["executeCdpCommand"] = ("POST", "/session/$sessionId/goog/cdp/execute")
+
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.command_timeouts = dict(command_timeouts) if command_timeouts else {}
+        self.trace_path = trace_path
+
+        # Threads block when all connections are in use, instead of opening extra ones that would
+        # be closed right after.
+        self._conn = urllib3.PoolManager(num_pools=1, maxsize=pool_size, block=True, retries=False)
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def execute(self, command, params):
+        """Send 'command' to the remote server and record its latency."""
+
+        self._local.command = command
+        start_time = time.perf_counter()
+        response = None
+        try:
+            response = super().execute(command, params)
+            return response
+        finally:
+            elapsed_time = time.perf_counter() - start_time
+            if self.trace_path is not None and response is not None:
+                command_trace.append_record(self.trace_path, command, params, response,
+                                            elapsed_time)
+            with self._stats_lock:
+                stats = self._stats.setdefault(command, _CommandStats())
+                stats.count += 1
+                stats.total_time += elapsed_time
+                stats.max_time = max(stats.max_time, elapsed_time)
+
+    def get_command_stats(self):
+        """
+        Return a dict of the number of requests and their mean and longest latency, in seconds, by
+        command.
+        """
+
+        with self._stats_lock:
+            return {command: {"count": stats.count,
+                              "mean_time": stats.total_time / stats.count,
+                              "max_time": stats.max_time}
+                    for command, stats in self._stats.items()}
+
+    def _get_request_timeout(self):
+        """Return the 'urllib3.Timeout' for the command being executed in this thread."""
+
+        command = getattr(self._local, "command", None)
+        read_timeout = self.command_timeouts.get(command, self.read_timeout)
+        return urllib3.Timeout(connect=self.connect_timeout, read=read_timeout)
+
+    def _request(self, method, url, body=None):
+        """
+        Send an HTTP request over a pooled connection and return the parsed response, like
+        'RemoteConnection._request()'.
+        """
+
+        _LOG.debug("%s %s %s", method, url, body)
+
+        parsed_url = parse.urlparse(url)
+        headers = self.get_remote_connection_headers(parsed_url, keep_alive=True)
+        if method not in ("POST", "PUT"):
+            body = None
+
+        timeout = self._get_request_timeout()
+        try:
+            response = self._conn.request(method, url, body=body, headers=headers,
+                                          timeout=timeout, redirect=False)
+        except urllib3.exceptions.ReadTimeoutError as error:
+            # Raised as a 'WebDriverException', so that the helpers retry it like other failures.
+            command = getattr(self._local, "command", None)
+            raise TimeoutException(f"No response to '{command}' in {timeout.read_timeout} "
+                                   f"seconds") from error
+        status_code = response.status
+        data = response.data.decode("UTF-8")
+
+        if 300 <= status_code < 304:
+            return self._request("GET", response.headers.get("location"))
+        if 399 < status_code <= 500:
+            return {"status": status_code, "value": data}
+
+        content_type = response.headers.get("Content-Type", "")
+        if content_type.startswith("image/png"):
+            return {"status": 0, "value": data}
+
+        try:
+            data = utils.load_json(data.strip())
+        except ValueError:
+            status = ErrorCode.SUCCESS if 199 < status_code < 300 else ErrorCode.UNKNOWN_ERROR
+            return {"status": status, "value": data.strip()}
+
+        # Some drivers return a response without 'value' when it should be null.
+        if "value" not in data:
+            data["value"] = None
+        return data
@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Script has class 'SessionDaemon', a long-running process that owns the 'chromedriver' services and
+browser sessions of a 'DriverPool' and leases them to short-lived processes over a Unix socket,
+and 'lease_driver()' for leasing one.
+
+The protocol is one JSON object per line. A client sends {"op": "lease", "timeout": <seconds>} and
+gets {"session_id": ..., "port": ..., "profile": ...}, then {"op": "release"} when done. A session
+is also released when the client disconnects, so a client that exits never keeps it.
+{"op": "stats"} returns 'DriverPool.stats()'. Errors are returned as {"error": <message>}.
+
+A released session is reset before it is leased again: its window is navigated to 'about:blank'
+and the cookies of all domains are cleared. Other browser state, like local storage and the cache,
+is kept.
+"""
+
+import os
+import json
+import socket
+import logging
+import tempfile
+import threading
+import socketserver
+from contextlib import contextmanager, suppress
+
+from selenium_helpers import pool
+from selenium_helpers.selenium_helpers import PROFILES, Driver, Settings, _get_default_options
+
+_MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
+_LOG = logging.getLogger(name=_MODULE_NAME)
+
+# Unix socket of the daemon, unless given.
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), f"selenium-helpers-{os.getuid()}.sock")
+
+class DaemonError(Exception):
+    """Custom exception for an error returned by the daemon."""
+
+class SessionDaemon:
+    """
+    Class for leasing the sessions of a 'DriverPool' of 'size' drivers over the Unix socket
+    'socket_path'. After every lease, idle drivers are created in the background until 'spares'
+    of them are ready, so that a burst of clients does not wait for browsers to start.
+
+    Can be used like this:
+    > with SessionDaemon(size=4, spares=2) as daemon:
+    >     daemon.serve_forever()
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET_PATH, size=4, spares=1,
+                 first_port=pool.DEFAULT_FIRST_PORT, start_service=True, profile="default"):
+        """
+        Initialize 'SessionDaemon'. The other arguments are passed to 'DriverPool'. Raise
+        'DaemonError' if another daemon is listening on 'socket_path'.
+        """
+
+        if spares > size:
+            raise ValueError(f"More spares than sessions: {spares} > {size}")
+        _remove_stale_socket(socket_path)
+
+        self.socket_path = socket_path
+        self.spares = spares
+        self.profile = profile
+        self.pool = pool.DriverPool(size, first_port=first_port, start_service=start_service,
+                                    options_factory=lambda: _get_default_options(profile))
+        self._warm_needed = threading.Event()
+        self._stopped = threading.Event()
+
+        daemon = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                daemon._handle(self.rfile, self.wfile)
+
+        self._server = socketserver.ThreadingUnixStreamServer(socket_path, Handler)
+        self._server.daemon_threads = True
+        self._warm_thread = threading.Thread(target=self._keep_warm, daemon=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def serve_forever(self):
+        """Warm the spare sessions and serve clients until 'shutdown()' is called."""
+
+        self._warm_thread.start()
+        self._warm_needed.set()
+        self._server.serve_forever(poll_interval=0.1)
+
+    def shutdown(self):
+        """Stop 'serve_forever()'. Can be called from another thread."""
+
+        self._stopped.set()
+        self._warm_needed.set()
+        self._server.shutdown()
+
+    def close(self):
+        """Close the socket and the pool, quitting the browsers."""
+
+        self._server.server_close()
+        with suppress(FileNotFoundError):
+            os.remove(self.socket_path)
+        self.pool.close()
+
+    def _keep_warm(self):
+        """Create spare drivers whenever asked to, until the daemon stops."""
+
+        while True:
+            self._warm_needed.wait()
+            self._warm_needed.clear()
+            if self._stopped.is_set():
+                return
+            try:
+                self.pool.warm(self.spares)
+            except pool._CONNECTION_EXCEPTIONS as error:
+                _LOG.error("Could not warm spare sessions: %s", error)
+
+    def _handle(self, rfile, wfile):
+        """Answer the requests of a client until it disconnects, releasing its lease then."""
+
+        slot = None
+        try:
+            for line in rfile:
+                try:
+                    request = json.loads(line)
+                    response, slot = self._answer(request, slot)
+                except (ValueError, pool.PoolExhausted) + pool._CONNECTION_EXCEPTIONS as error:
+                    response = {"error": f"{type(error).__name__}: {error}"}
+                wfile.write(json.dumps(response).encode("UTF-8") + b"\n")
+                wfile.flush()
+        finally:
+            if slot is not None:
+                self._release(slot)
+
+    def _release(self, slot):
+        """Reset the session of 'slot' for the next client and return 'slot' to the pool."""
+
+        # A session that can not be reset is replaced on its next checkout, if it does not respond.
+        with suppress(*pool._CONNECTION_EXCEPTIONS):
+            slot.driver.execute_cdp_cmd("Page.navigate", {"url": "about:blank"})
+            slot.driver.execute_cdp_cmd("Network.clearBrowserCookies")
+        self.pool._release(slot)
+
+    def _answer(self, request, slot):
+        """Return the response to 'request' and the slot leased by the client afterwards."""
+
+        operation = request.get("op")
+        if operation == "lease":
+            if slot is not None:
+                raise ValueError("A session is already leased")
+            slot = self.pool._acquire(request.get("timeout"))
+            self._warm_needed.set()
+            return {"session_id": slot.driver.session_id, "port": slot.port,
+                    "profile": self.profile}, slot
+        if operation == "release":
+            if slot is not None:
+                self._release(slot)
+            return {}, None
+        if operation == "stats":
+            return self.pool.stats(), slot
+        raise ValueError(f"Unknown operation: '{operation}'")
+
+def _remove_stale_socket(socket_path):
+    """
+    Remove the socket 'socket_path' left by a daemon that is no longer running. Raise
+    'DaemonError' if a daemon is listening on it.
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(socket_path)
+        except FileNotFoundError:
+            return
+        except ConnectionRefusedError:
+            _LOG.info("Removing stale socket: '%s'", socket_path)
+            with suppress(FileNotFoundError):
+                os.remove(socket_path)
+            return
+    raise DaemonError(f"A daemon is already listening on '{socket_path}'")
+
+def _send(connection_file, request):
+    """Send 'request' to the daemon and return the response. Raise 'DaemonError' on error."""
+
+    connection_file.write(json.dumps(request).encode("UTF-8") + b"\n")
+    connection_file.flush()
+    line = connection_file.readline()
+    if not line:
+        raise DaemonError("Daemon closed the connection")
+    response = json.loads(line)
+    if "error" in response:
+        raise DaemonError(response["error"])
+    return response
+
+@contextmanager
+def lease_driver(socket_path=DEFAULT_SOCKET_PATH, timeout=None, settings=None):
+    """
+    Lease a warm session from the daemon listening on 'socket_path' for the duration of the
+    context, waiting at most 'timeout' seconds for one, and return a 'Driver' using it with
+    'settings'. The driver has the options of the profile of the daemon, and 'settings' default to
+    'Settings()' with the blocked URLs of that profile, like with 'Driver.create()'. The daemon has
+    checked the session, so it is not checked again. Do not quit the driver, the session belongs to
+    the daemon. Raise 'DaemonError' if no session was leased.
+
+    A session used by earlier clients is at 'about:blank' without cookies, but their other state,
+    like local storage, is kept.
+
+    Can be used like this:
+    > with lease_driver() as driver:
+    >     driver.read_text_by_xpath("//h1")
+    """
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        with connection.makefile("rwb") as connection_file:
+            lease = _send(connection_file, {"op": "lease", "timeout": timeout})
+            profile = lease["profile"]
+            if settings is None:
+                settings = Settings()
+                settings.blocked_urls = list(PROFILES[profile]["blocked_urls"])
+            driver = Driver(_get_default_options(profile), settings, port=lease["port"],
+                            session_id=lease["session_id"], verify=False)
+            yield driver
+            _send(connection_file, {"op": "release"})
+
+def get_daemon_stats(socket_path=DEFAULT_SOCKET_PATH):
+    """Return the statistics of the pool of the daemon listening on 'socket_path'."""
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        with connection.makefile("rwb") as connection_file:
+            return _send(connection_file, {"op": "stats"})
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Script has class 'ElementCache' for reusing found elements."""
+
+import threading
+from collections import OrderedDict
+
+class ElementCache:
+    """
+    Class for keeping at most 'size' found elements by xpath, root element and document, evicting
+    the least recently used ones first. Thread safe.
+    """
+
+    def __init__(self, size):
+        """Initialize 'ElementCache'. If 'size' is zero, nothing is cached."""
+
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._elements = OrderedDict()
+        self._lock = threading.Lock()
+        # Incremented on navigation, so that elements of earlier documents are not returned.
+        self._document = 0
+
+    def _get_key(self, xpath, root_element):
+        root_id = getattr(root_element, "id", None)
+        return xpath, root_id, self._document
+
+    def get(self, xpath, root_element=None):
+        """Return the cached element for 'xpath' and 'root_element', or 'None'."""
+
+        if not self.size:
+            return None
+
+        key = self._get_key(xpath, root_element)
+        with self._lock:
+            element = self._elements.get(key)
+            if element is None:
+                self.misses += 1
+                return None
+            self._elements.move_to_end(key)
+            self.hits += 1
+            return element
+
+    def put(self, xpath, root_element, element):
+        """Cache 'element' for 'xpath' and 'root_element'."""
+
+        if not self.size:
+            return
+
+        key = self._get_key(xpath, root_element)
+        with self._lock:
+            self._elements[key] = element
+            self._elements.move_to_end(key)
+            while len(self._elements) > self.size:
+                self._elements.popitem(last=False)
+
+    def clear(self):
+        """Forget all cached elements, for example after navigating to another document."""
+
+        with self._lock:
+            self._elements.clear()
+            self._document += 1
+
+    def stats(self):
+        """Return a dict with the number of cached elements, hits and misses."""
+
+        with self._lock:
+            return {"size": len(self._elements), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Script has class 'LocatedElement' for elements that find themselves again when stale."""
+
+import os
+import logging
+
+from selenium.common.exceptions import StaleElementReferenceException
+from selenium.webdriver.remote.webelement import WebElement
+
+_MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
+_LOG = logging.getLogger(name=_MODULE_NAME)
+
+class LocatedElement(WebElement):
+    """
+    'WebElement' that remembers the xpath and the root element it was found with. If a command
+    fails because the element is stale, for example after the page re-rendered it, the element is
+    found again once and only the failed command is repeated. Commands run as scripts with the
+    element as an argument, like 'get_attribute()', are repeated by 'Driver.execute()'.
+    """
+
+    def __init__(self, parent, id_, xpath, root_element=None, w3c=False):
+        """
+        Initialize 'LocatedElement'. 'xpath' and 'root_element' find the element again, and
+        'root_element' defaults to the driver 'parent'.
+        """
+
+        super().__init__(parent, id_, w3c=w3c)
+        self.xpath = xpath
+        self.root_element = root_element
+
+    @classmethod
+    def from_element(cls, element, xpath, root_element=None):
+        """Return 'LocatedElement' for the found 'element'."""
+
+        return cls(element.parent, element.id, xpath, root_element=root_element, w3c=element._w3c)
+
+    def relocate(self):
+        """Find the element again with its xpath and root element."""
+
+        root_element = self.root_element if self.root_element is not None else self._parent
+        self._id = root_element.find_element_by_xpath(self.xpath).id
+
+    def _execute(self, command, params=None):
+        """Execute 'command', finding the element again once if it is stale."""
+
+        try:
+            return super()._execute(command, params)
+        except StaleElementReferenceException:
+            _LOG.debug("Finding stale element again: '%s'", self.xpath)
+            self.relocate()
+            return super()._execute(command, params)
@@ -0,0 +1,182 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Script has class 'Metrics' for recording where the time of 'Driver' calls goes."""
+
+import json
+import threading
+from collections import defaultdict
+
+# Upper bounds of the histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# Prefix of the metric names in the Prometheus text format.
+_PREFIX = "selenium_helpers"
+
+class Histogram:
+    """Class for counting observed values in cumulative buckets, like Prometheus does."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialize 'Histogram' with the bucket upper bounds 'buckets'."""
+
+        self.buckets = tuple(sorted(buckets))
+        self.bucket_counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        """Add 'value' to the histogram."""
+
+        self.count += 1
+        self.sum += value
+        for index, upper_bound in enumerate(self.buckets):
+            if value <= upper_bound:
+                self.bucket_counts[index] += 1
+
+    def to_dict(self):
+        """Return the histogram as a dict."""
+
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": {f"{upper_bound}": count for upper_bound, count
+                        in zip(self.buckets, self.bucket_counts)},
+        }
+
+def _escape_label(value):
+    """Return 'value' escaped for a label value in the Prometheus text format."""
+
+    return f"{value}".replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+class Metrics:
+    """
+    Class for recording the latency of each WebDriver command, the retries of 'ReTry' and the time
+    spent waiting after actions. Set an instance to 'Settings.metrics' to enable recording.
+    Thread safe.
+
+    Can be used like this:
+    > settings.metrics = Metrics()
+    > driver.read_text_by_xpath("//h1")
+    > print(settings.metrics.to_prometheus())
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialize 'Metrics' with histograms using the bucket upper bounds 'buckets'."""
+
+        self._lock = threading.Lock()
+        self._buckets = buckets
+        self.commands = defaultdict(self._new_histogram)
+        self.command_errors = defaultdict(int)
+        self.retries = defaultdict(int)
+        self.retry_sleep_time = 0
+        self.settle_times = defaultdict(self._new_histogram)
+        self.delay_times = defaultdict(int)
+        self.create_times = defaultdict(self._new_histogram)
+
+    def _new_histogram(self):
+        return Histogram(self._buckets)
+
+    def record_command(self, command, elapsed_time, failed=False):
+        """Record that 'command' took 'elapsed_time' seconds, and whether it 'failed'."""
+
+        with self._lock:
+            self.commands[command].observe(elapsed_time)
+            if failed:
+                self.command_errors[command] += 1
+
+    def record_retry(self, error, sleep_time):
+        """Record a retry after the exception 'error', sleeping 'sleep_time' seconds first."""
+
+        with self._lock:
+            self.retries[type(error).__name__] += 1
+            self.retry_sleep_time += sleep_time
+
+    def record_settle(self, action, elapsed_time):
+        """Record waiting 'elapsed_time' seconds for the page to settle after 'action'."""
+
+        with self._lock:
+            self.settle_times[action].observe(elapsed_time)
+
+    def record_delay(self, action, sleep_time):
+        """Record sleeping a fixed 'sleep_time' seconds after 'action'."""
+
+        with self._lock:
+            self.delay_times[action] += sleep_time
+
+    def record_create(self, path, elapsed_time):
+        """
+        Record that 'Driver.create()' took 'elapsed_time' seconds on 'path': "warm" when it
+        reattached to a live session, "cold" when there was no saved session and "stale" when the
+        saved session did not respond.
+        """
+
+        with self._lock:
+            self.create_times[path].observe(elapsed_time)
+
+    def to_dict(self):
+        """Return the recorded metrics as a dict."""
+
+        with self._lock:
+            return {
+                "commands": {command: histogram.to_dict()
+                             for command, histogram in self.commands.items()},
+                "command_errors": dict(self.command_errors),
+                "retries": dict(self.retries),
+                "retry_sleep_seconds": self.retry_sleep_time,
+                "settle": {f"{action}": histogram.to_dict()
+                           for action, histogram in self.settle_times.items()},
+                "delay_seconds": {f"{action}": sleep_time for action, sleep_time
+                                  in self.delay_times.items()},
+                "create": {path: histogram.to_dict()
+                           for path, histogram in self.create_times.items()},
+            }
+
+    def to_json(self):
+        """Return the recorded metrics as a JSON string."""
+
+        return json.dumps(self.to_dict(), indent=4)
+
+    def to_prometheus(self):
+        """Return the recorded metrics in the Prometheus text exposition format."""
+
+        lines = []
+
+        def add_histograms(name, help_text, label, histograms):
+            lines.append(f"# HELP {_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {_PREFIX}_{name} histogram")
+            for key, histogram in histograms.items():
+                label_text = f"{label}=\"{_escape_label(key)}\""
+                for upper_bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                    lines.append(f"{_PREFIX}_{name}_bucket{{{label_text},le=\"{upper_bound}\"}} "
+                                 f"{count}")
+                lines.append(f"{_PREFIX}_{name}_bucket{{{label_text},le=\"+Inf\"}} "
+                             f"{histogram.count}")
+                lines.append(f"{_PREFIX}_{name}_sum{{{label_text}}} {histogram.sum}")
+                lines.append(f"{_PREFIX}_{name}_count{{{label_text}}} {histogram.count}")
+
+        def add_counters(name, help_text, label, values):
+            lines.append(f"# HELP {_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {_PREFIX}_{name} counter")
+            for key, value in values.items():
+                lines.append(f"{_PREFIX}_{name}{{{label}=\"{_escape_label(key)}\"}} {value}")
+
+        with self._lock:
+            add_histograms("command_seconds", "Latency of WebDriver commands.", "command",
+                           self.commands)
+            add_counters("command_errors_total", "Failed WebDriver commands.", "command",
+                         self.command_errors)
+            add_counters("retries_total", "Retries by exception type.", "exception",
+                         self.retries)
+            lines.append(f"# HELP {_PREFIX}_retry_sleep_seconds_total Time slept between retries.")
+            lines.append(f"# TYPE {_PREFIX}_retry_sleep_seconds_total counter")
+            lines.append(f"{_PREFIX}_retry_sleep_seconds_total {self.retry_sleep_time}")
+            add_histograms("settle_seconds", "Time waited for the page to settle after actions.",
+                           "action", self.settle_times)
+            add_counters("delay_seconds_total", "Time slept for fixed delays after actions.",
+                         "action", self.delay_times)
+            add_histograms("create_seconds", "Time taken by 'Driver.create()' by path.", "path",
+                           self.create_times)
+        return "\n".join(lines) + "\n"
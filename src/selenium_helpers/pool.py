@@ -0,0 +1,248 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Script has class 'DriverPool' for using many 'Driver' sessions from many threads."""
+
+import os
+import time
+import queue
+import logging
+import threading
+from contextlib import contextmanager, suppress
+
+import urllib3
+
+from selenium_helpers import service
+from selenium_helpers.repeat_on_failure import ReTry
+from selenium_helpers.selenium_helpers import (Driver, Settings, WebDriverException,
+                                               _get_default_options)
+
+_MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
+_LOG = logging.getLogger(name=_MODULE_NAME)
+
+# Port of the first 'chromedriver' of a pool. The others use the following ports.
+DEFAULT_FIRST_PORT = 9600
+
+# Exceptions raised while a 'chromedriver' is not yet, or no longer, accepting connections.
+_CONNECTION_EXCEPTIONS = (WebDriverException, urllib3.exceptions.HTTPError, OSError)
+
+class PoolExhausted(Exception):
+    """Custom exception for when no driver was checked in before the timeout."""
+
+class _Slot:
+    """A 'chromedriver' port of a pool and the driver using it, if created."""
+
+    def __init__(self, port):
+        """Initialize '_Slot'."""
+
+        self.port = port
+        self.driver = None
+        self.checkout_time = None
+
+class DriverPool:
+    """
+    Class for sharing 'size' 'Driver' sessions between threads. Each driver uses a 'chromedriver'
+    of its own, on ports starting from 'first_port'. Can be used as a context manager, which
+    closes the pool on exit.
+
+    Can be used like this:
+    > with DriverPool(4) as pool:
+    >     with pool.checkout() as driver:
+    >         driver.read_text_by_xpath("//h1")
+    """
+
+    def __init__(self, size, first_port=DEFAULT_FIRST_PORT, start_service=True,
+                 options_factory=_get_default_options, settings_factory=Settings):
+        """
+        Initialize 'DriverPool'. If 'start_service' is 'True', the pool starts and shuts down the
+        'chromedriver' services itself. New drivers are created with options and settings returned
+        by 'options_factory()' and 'settings_factory()'. Drivers are created on the first checkout
+        of their slot, and recycled on checkout when their settings ask for it (see
+        'Driver.recycle_if_needed()').
+        """
+
+        if size < 1:
+            raise ValueError(f"Invalid pool size: {size}")
+
+        self.size = size
+        self.start_service = start_service
+        self.options_factory = options_factory
+        self.settings_factory = settings_factory
+
+        self._slots = [_Slot(first_port + index) for index in range(size)]
+        self._idle_slots = queue.LifoQueue()
+        for slot in reversed(self._slots):
+            self._idle_slots.put(slot)
+
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+        self._checkouts = 0
+        self._replacements = 0
+        self._recycles = 0
+        self._total_wait_time = 0
+        self._max_wait_time = 0
+        self._total_busy_time = 0
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @contextmanager
+    def checkout(self, timeout=None):
+        """
+        Check out a live driver for the duration of the context, waiting at most 'timeout' seconds
+        for one to be checked in. Raise 'PoolExhausted' on timeout.
+        """
+
+        slot = self._acquire(timeout)
+        try:
+            yield slot.driver
+        finally:
+            self._release(slot)
+
+    def _acquire(self, timeout):
+        """Take an idle slot, make sure its driver is alive and return the slot."""
+
+        if self._closed:
+            raise RuntimeError("Pool is closed")
+
+        start_time = time.monotonic()
+        try:
+            slot = self._idle_slots.get(timeout=timeout)
+        except queue.Empty:
+            raise PoolExhausted(f"No driver checked in within {timeout} seconds") from None
+        wait_time = time.monotonic() - start_time
+
+        try:
+            if slot.driver is None or not slot.driver.is_alive():
+                self._replace_driver(slot)
+            elif slot.driver.recycle_if_needed():
+                with self._lock:
+                    self._recycles += 1
+        except BaseException:
+            self._idle_slots.put(slot)
+            raise
+
+        with self._lock:
+            self._checkouts += 1
+            self._total_wait_time += wait_time
+            self._max_wait_time = max(self._max_wait_time, wait_time)
+            slot.checkout_time = time.monotonic()
+        return slot
+
+    def _release(self, slot):
+        """Return 'slot' to the idle slots."""
+
+        with self._lock:
+            self._total_busy_time += time.monotonic() - slot.checkout_time
+            slot.checkout_time = None
+        self._idle_slots.put(slot)
+
+    def _replace_driver(self, slot):
+        """Create a new driver for 'slot', restarting its 'chromedriver' if needed."""
+
+        if slot.driver is not None:
+            _LOG.warning("Replacing a dead driver on port %s", slot.port)
+            with suppress(*_CONNECTION_EXCEPTIONS):
+                slot.driver.quit()
+            slot.driver = None
+            with self._lock:
+                self._replacements += 1
+
+            if self.start_service:
+                service._shutdown_chromedriver(port=slot.port)
+
+        if self.start_service and not service._is_chromedriver_running(port=slot.port):
+            service._start_chromedriver(port=slot.port)
+
+        settings = self.settings_factory()
+
+        def implementation():
+            """Wrapped function implementation."""
+
+            return Driver(self.options_factory(), settings, port=slot.port)
+
+        re_try = ReTry(_CONNECTION_EXCEPTIONS, tries=settings.try_times,
+                       sleep_time=settings.sleep_time)
+        slot.driver = re_try(implementation)()
+
+    def warm(self, count):
+        """
+        Create drivers for idle slots, so that at least 'count' idle slots, if there are that many,
+        have a driver ready for the next checkouts. Drivers are created one at a time, and each
+        slot is idle again as soon as its driver is ready, so checkouts meanwhile do not wait for
+        the others.
+        """
+
+        while not self._closed:
+            slot = self._take_cold_slot(count)
+            if slot is None:
+                return
+            try:
+                self._replace_driver(slot)
+            finally:
+                # Drivers are checked out from the top, so the warm slot goes there.
+                self._idle_slots.put(slot)
+
+    def _take_cold_slot(self, count):
+        """
+        Take an idle slot without a driver from the idle slots and return it, or 'None' if there is
+        none or if at least 'count' idle slots have a driver.
+        """
+
+        with self._idle_slots.mutex:
+            idle_slots = self._idle_slots.queue
+            if sum(slot.driver is not None for slot in idle_slots) >= count:
+                return None
+            for slot in reversed(idle_slots):
+                if slot.driver is None:
+                    idle_slots.remove(slot)
+                    return slot
+        return None
+
+    def stats(self):
+        """
+        Return a dict of pool statistics: the number of checkouts, replaced and recycled drivers,
+        the mean and the longest time waited for a checkout, the number of drivers in use and the
+        utilization, the fraction of time the drivers have been checked out since the pool was
+        created.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            busy_time = self._total_busy_time
+            in_use = 0
+            for slot in self._slots:
+                if slot.checkout_time is not None:
+                    busy_time += now - slot.checkout_time
+                    in_use += 1
+
+            elapsed_time = now - self._start_time
+            return {
+                "size": self.size,
+                "in_use": in_use,
+                "checkouts": self._checkouts,
+                "replacements": self._replacements,
+                "recycles": self._recycles,
+                "mean_wait_time": self._total_wait_time / self._checkouts if self._checkouts else 0,
+                "max_wait_time": self._max_wait_time,
+                "utilization": busy_time / (elapsed_time * self.size) if elapsed_time else 0,
+            }
+
+    def close(self):
+        """Quit all drivers and shutdown the 'chromedriver' services started by the pool."""
+
+        self._closed = True
+        for slot in self._slots:
+            if slot.driver is not None:
+                with suppress(*_CONNECTION_EXCEPTIONS):
+                    slot.driver.quit()
+                slot.driver = None
+            if self.start_service:
+                service._shutdown_chromedriver(port=slot.port)
@@ -7,28 +7,139 @@
 """Script has class 'ReTry' for repeating function execution in case of an error."""
 
 import time
+import random
+import asyncio
+from contextvars import ContextVar
 
 # Number of tries before raising exception.
 _TRIES = 4
 # Time to sleep between tries, in seconds.
 _SLEEP_TIME = 2
 
+# The innermost 'ReTry' call being executed in the current context.
+_ACTIVE_CALL = ContextVar("active_re_try_call", default=None)
+
+def get_remaining_time():
+    """
+    Return the seconds left until the deadline of the 'ReTry' calls being executed in the current
+    context, or 'None' if there is no deadline.
+    """
+
+    call = _ACTIVE_CALL.get()
+    if call is None or call.deadline is None:
+        return None
+    return max(0, call.deadline - time.monotonic())
+
+class RetryPolicy:
+    """Class for how many times, and how long apart, a function is tried again."""
+
+    def __init__(self, tries=_TRIES, sleep_time=_SLEEP_TIME, backoff=1, max_sleep_time=None,
+                 jitter=0):
+        """
+        Initialize 'RetryPolicy'. Try again at most 'tries' times. Sleep 'sleep_time' seconds
+        before the first retry and multiply the sleep by 'backoff' after every retry, but never
+        sleep more than 'max_sleep_time' seconds. Each sleep is lengthened or shortened randomly by
+        at most the fraction 'jitter' of it.
+        """
+
+        self.tries = tries
+        self.sleep_time = sleep_time
+        self.backoff = backoff
+        self.max_sleep_time = max_sleep_time
+        self.jitter = jitter
+
+    def get_sleep_time(self, retry_count):
+        """Return the time to sleep before retry number 'retry_count', counting from zero."""
+
+        sleep_time = self.sleep_time * self.backoff ** retry_count
+        if self.max_sleep_time is not None:
+            sleep_time = min(sleep_time, self.max_sleep_time)
+        if self.jitter:
+            sleep_time *= 1 + random.uniform(-self.jitter, self.jitter)
+        return max(0, sleep_time)
+
+class _Call:
+    """State of a single call of a function wrapped with 'ReTry'."""
+
+    def __init__(self, exceptions, deadline):
+        """Initialize '_Call'."""
+
+        self.exceptions = exceptions
+        self.deadline = deadline
+
 class ReTry:
     """
     Class for repeating function execution if it raised a known type of an exception. Can be used
     as a decorator.
+
+    Calls can be nested: a 'ReTry' call inside another one does not retry exceptions that the
+    enclosing call retries, but lets them through so that tries are not multiplied. The earliest
+    deadline of the nested calls applies to all of them.
     """
 
-    def __init__(self, exception, tries=_TRIES, sleep_time=_SLEEP_TIME):
+    def __init__(self, exception, tries=_TRIES, sleep_time=_SLEEP_TIME, backoff=1,
+                 max_sleep_time=None, jitter=0, deadline=None, policies=None, on_retry=None):
         """
         Initialize 'ReTry'. If exception is raised, try executing the function again
         'tries' times while sleeping 'sleep_time' seconds in between function calls. Exception
         of type 'exception' is suppressed, while other exceptions are re-raised.
+
+        'backoff', 'max_sleep_time' and 'jitter' are passed to 'RetryPolicy'. If 'deadline' is
+        given, stop retrying when the next try would start more than 'deadline' seconds after the
+        first one. 'policies' maps exception types to 'RetryPolicy' instances used instead of the
+        default policy for those exceptions and their subclasses; they are retried as well.
+        'on_retry', if given, is called with the exception and the time to sleep before each retry.
         """
 
         self.exception = exception
         self.tries = tries
         self.sleep_time = sleep_time
+        self.deadline = deadline
+        self.policy = RetryPolicy(tries=tries, sleep_time=sleep_time, backoff=backoff,
+                                  max_sleep_time=max_sleep_time, jitter=jitter)
+        self.policies = dict(policies) if policies else {}
+        self.on_retry = on_retry
+
+        exceptions = exception if isinstance(exception, tuple) else (exception,)
+        self.exceptions = exceptions + tuple(self.policies)
+
+    def get_policy(self, error):
+        """Return the retry policy for the exception 'error'."""
+
+        for exception_type in type(error).__mro__:
+            if exception_type in self.policies:
+                return self.policies[exception_type]
+        return self.policy
+
+    def _get_deadline(self, enclosing_call):
+        """Return the deadline of a new call, as a 'time.monotonic()' value or 'None'."""
+
+        deadline = enclosing_call.deadline if enclosing_call else None
+        if self.deadline is not None:
+            own_deadline = time.monotonic() + self.deadline
+            deadline = own_deadline if deadline is None else min(deadline, own_deadline)
+        return deadline
+
+    def _get_retry_sleep_time(self, error, call, enclosing_call, retry_counts):
+        """
+        Return the time to sleep before trying again after 'error', or 'None' if 'error' should be
+        raised. 'retry_counts' has the retries of the call so far, by policy, and is updated.
+        """
+
+        if enclosing_call and isinstance(error, enclosing_call.exceptions):
+            return None
+
+        policy = self.get_policy(error)
+        retry_count = retry_counts.get(id(policy), 0)
+        sleep_time = policy.get_sleep_time(retry_count)
+        past_deadline = (call.deadline is not None and
+                         time.monotonic() + sleep_time > call.deadline)
+        if retry_count >= policy.tries or past_deadline:
+            return None
+        retry_counts[id(policy)] = retry_count + 1
+        if self.on_retry:
+            self.on_retry(error, sleep_time)
+        return sleep_time
 
     def __call__(self, function_with_params):
         """Call 'function_with_params' repeatedly on failure."""
@@ -36,13 +147,52 @@ class ReTry:
         def try_to_execute(*args, **kwargs):
             """Pass arguments to 'function_with_params'."""
 
-            for try_count in range(self.tries + 1):
-                try:
-                    return function_with_params(*args, **kwargs)
-                except self.exception:
-                    if try_count == self.tries:
-                        raise
-                time.sleep(self.sleep_time)
-            # We will never land here.
+            enclosing_call = _ACTIVE_CALL.get()
+            call = _Call(self.exceptions, self._get_deadline(enclosing_call))
+            token = _ACTIVE_CALL.set(call)
+            try:
+                retry_counts = {}
+                while True:
+                    try:
+                        return function_with_params(*args, **kwargs)
+                    except self.exceptions as error:
+                        sleep_time = self._get_retry_sleep_time(error, call, enclosing_call,
+                                                                retry_counts)
+                        if sleep_time is None:
+                            raise
+                    time.sleep(sleep_time)
+            finally:
+                _ACTIVE_CALL.reset(token)
+
+        return try_to_execute
+
+class AsyncReTry(ReTry):
+    """
+    'ReTry' for coroutine functions. Sleeps with 'asyncio.sleep()', so other tasks run while a
+    call waits to be tried again. Nested calls work as with 'ReTry' within a task.
+    """
+
+    def __call__(self, function_with_params):
+        """Await 'function_with_params' repeatedly on failure."""
+
+        async def try_to_execute(*args, **kwargs):
+            """Pass arguments to 'function_with_params'."""
+
+            enclosing_call = _ACTIVE_CALL.get()
+            call = _Call(self.exceptions, self._get_deadline(enclosing_call))
+            token = _ACTIVE_CALL.set(call)
+            try:
+                retry_counts = {}
+                while True:
+                    try:
+                        return await function_with_params(*args, **kwargs)
+                    except self.exceptions as error:
+                        sleep_time = self._get_retry_sleep_time(error, call, enclosing_call,
+                                                                retry_counts)
+                        if sleep_time is None:
+                            raise
+                    await asyncio.sleep(sleep_time)
+            finally:
+                _ACTIVE_CALL.reset(token)
 
         return try_to_execute
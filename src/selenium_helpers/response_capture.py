@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Script has class 'ResponseCapture' for reading the responses the browser receives, returned by
+'Driver.capture_responses()'. The DevTools network events are read from the performance log of the
+session, and the bodies with the DevTools command 'Network.getResponseBody'.
+"""
+
+import os
+import re
+import json
+import time
+import base64
+import logging
+
+from selenium.common.exceptions import WebDriverException
+
+_MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
+_LOG = logging.getLogger(name=_MODULE_NAME)
+
+# Time, in seconds, 'ResponseCapture.read()' sleeps between reads of the performance log.
+_POLL_INTERVAL = 0.05
+
+def _parse_body(result):
+    """Return the body of the 'Network.getResponseBody' 'result', parsed from JSON if possible."""
+
+    body = result.get("body", "")
+    if result.get("base64Encoded"):
+        body = base64.b64decode(body)
+    try:
+        return json.loads(body)
+    except ValueError:
+        return body
+
+class ResponseCapture:
+    """
+    Class for collecting the responses of 'driver' whose URL matches the regular expression
+    'url_pattern'. Only responses received after initializing are collected, so the performance
+    log is emptied first.
+    """
+
+    def __init__(self, driver, url_pattern):
+        """Initialize 'ResponseCapture'."""
+
+        self._driver = driver
+        self._url_pattern = re.compile(url_pattern)
+        # URLs of matching responses that have not finished loading, by request id.
+        self._pending = {}
+        self._driver.get_log("performance")
+
+    def read(self, timeout=0):
+        """
+        Return the matching responses that finished loading since the last call as a list of pairs
+        of URL and body, waiting at most 'timeout' seconds for at least one. Bodies are parsed from
+        JSON if possible, and otherwise returned as they are. Responses whose body the browser no
+        longer has are skipped.
+        """
+
+        end_time = time.monotonic() + timeout
+        while True:
+            responses = self._read_log()
+            if responses or time.monotonic() >= end_time:
+                return responses
+            time.sleep(_POLL_INTERVAL)
+
+    def _read_log(self):
+        """Read the new entries of the performance log and return the responses finished."""
+
+        responses = []
+        for entry in self._driver.get_log("performance"):
+            message = json.loads(entry["message"])["message"]
+            method = message.get("method")
+            params = message.get("params", {})
+
+            if method == "Network.responseReceived":
+                url = params["response"]["url"]
+                if self._url_pattern.search(url):
+                    self._pending[params["requestId"]] = url
+            elif method == "Network.loadingFailed":
+                self._pending.pop(params["requestId"], None)
+            elif method == "Network.loadingFinished" and params["requestId"] in self._pending:
+                url = self._pending.pop(params["requestId"])
+                try:
+                    result = self._driver.execute_cdp_cmd("Network.getResponseBody",
+                                                          {"requestId": params["requestId"]})
+                except WebDriverException as error:
+                    _LOG.warning("Could not read the response from '%s': %s", url, error.msg)
+                    continue
+                responses.append((url, _parse_body(result)))
+        return responses
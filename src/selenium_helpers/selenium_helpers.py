@@ -8,8 +8,13 @@
 
 import os
 import time
+import uuid
+import logging
+import itertools
+from collections import deque
 from contextlib import contextmanager, suppress
 
+import urllib3
 import selenium
 from selenium.webdriver.remote.command import Command
 from selenium.webdriver.chrome.options import Options
@@ -17,16 +22,88 @@ from selenium.webdriver.chrome.options import Options
 import selenium.common.exceptions as selenium_exceptions
 WebDriverException = selenium_exceptions.WebDriverException
 NoAlertPresentException = selenium_exceptions.NoAlertPresentException
-
+TimeoutException = selenium_exceptions.TimeoutException
+NoSuchElementException = selenium_exceptions.NoSuchElementException
+StaleElementReferenceException = selenium_exceptions.StaleElementReferenceException
+InvalidSelectorException = selenium_exceptions.InvalidSelectorException
+
+from selenium_helpers import browser_scripts
+from selenium_helpers import command_trace
+from selenium_helpers import connection
+from selenium_helpers.element_cache import ElementCache
+from selenium_helpers.located_element import LocatedElement
 from selenium_helpers import session
 from selenium_helpers import service
-from selenium_helpers.repeat_on_failure import ReTry
+from selenium_helpers.repeat_on_failure import AsyncReTry, ReTry, RetryPolicy, get_remaining_time
+from selenium_helpers.response_capture import ResponseCapture
+from selenium_helpers.snapshot import Snapshot, SnapshotXPathError
+from selenium_helpers.xpath_validation import get_xpath_error
+
+_MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
+_LOG = logging.getLogger(name=_MODULE_NAME)
+
+# Number of the latest settle times kept in 'Driver.settle_times'.
+_SETTLE_TIMES_LENGTH = 1000
+
+# Commands after which cached elements may belong to another document.
+_NAVIGATION_COMMANDS = (Command.GET, Command.GO_BACK, Command.GO_FORWARD, Command.REFRESH,
+                        Command.SWITCH_TO_WINDOW, Command.SWITCH_TO_FRAME,
+                        Command.SWITCH_TO_PARENT_FRAME, Command.CLOSE)
+
+# Commands that run a script with elements as its arguments.
+_SCRIPT_COMMANDS = (Command.EXECUTE_SCRIPT, Command.EXECUTE_ASYNC_SCRIPT,
+                    Command.W3C_EXECUTE_SCRIPT, Command.W3C_EXECUTE_SCRIPT_ASYNC)
+
+# Conditions for 'Driver.wait_for_xpath()'.
+WAIT_CONDITIONS = ("present", "visible", "clickable", "text_nonempty")
+
+# Script timeout, in seconds, of a new 'chromedriver' session.
+_DEFAULT_SCRIPT_TIMEOUT = 30
+
+# Time, in seconds, 'Driver.map_urls()' sleeps when none of its tabs has loaded.
+_TAB_POLL_INTERVAL = 0.05
+
+# Patterns of font and media URLs, blocked by the "throughput" profile.
+_FONT_AND_MEDIA_URLS = ["*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot", "*.mp3", "*.mp4", "*.m4a",
+                        "*.m3u8", "*.ogg", "*.wav", "*.webm"]
+
+# Maximum size, in bytes, of a response body and of all bodies the browser keeps for
+# 'Driver.capture_responses()'.
+_MAX_RESOURCE_BUFFER_SIZE = 50 * 1024 * 1024
+_MAX_TOTAL_BUFFER_SIZE = 200 * 1024 * 1024
+
+# Profiles for '_get_default_options()' and 'Driver.create()': browser arguments, preferences,
+# page load strategy, URL patterns for 'Settings.blocked_urls', and whether the performance log is
+# enabled. "throughput" is for pages that are only scraped: a headless browser that does not load
+# images, fonts or media, and returns from 'get()' when the document is parsed, leaving the rest to
+# 'Driver.wait_until_settled()'. "capture" is "throughput" with the performance log, for
+# 'Driver.capture_responses()'.
+PROFILES = {
+    "default": {
+        "arguments": ["--start-maximized", "disable-infobars"],
+        "prefs": {},
+        "page_load_strategy": "normal",
+        "blocked_urls": [],
+        "performance_log": False,
+    },
+    "throughput": {
+        "arguments": ["--headless", "--disable-gpu", "--window-size=1920,1080", "disable-infobars",
+                      "--blink-settings=imagesEnabled=false", "--disable-remote-fonts",
+                      "--mute-audio", "--autoplay-policy=user-gesture-required"],
+        "prefs": {"profile.managed_default_content_settings.images": 2},
+        "page_load_strategy": "eager",
+        "blocked_urls": _FONT_AND_MEDIA_URLS,
+        "performance_log": False,
+    },
+}
+PROFILES["capture"] = {**PROFILES["throughput"], "performance_log": True}
 
 class InvalidXPath(Exception):
     """Custom exception for invalid xpath."""
 
 class Settings:
     ReTry = ReTry
+    AsyncReTry = AsyncReTry
     WebDriverException = WebDriverException
     NoAlertPresentException = NoAlertPresentException
 
@@ -35,59 +112,254 @@ class Settings:
         self.click_delay = 1
         self.send_keys_delay = 1
 
+        # If 'True', the delays above are upper bounds: after an action, wait only until the page
+        # has settled (see 'Driver.wait_until_settled()'). Otherwise always sleep the full delay.
+        self.wait_for_settle = True
+        # Time, in seconds, the DOM must stay unchanged for the page to count as settled.
+        self.settle_quiet_time = 0.1
+
         self.try_times = 10
         self.sleep_time = 1
+        # Multiplier for 'sleep_time' after every retry, the longest sleep, and the random fraction
+        # added to or subtracted from each sleep.
+        self.backoff = 1
+        self.max_sleep_time = None
+        self.jitter = 0
+        # Time limit, in seconds, for retrying a helper call, including its nested helper calls.
+        # 'None' for no limit.
+        self.deadline = None
+        # Exception types mapped to 'RetryPolicy' instances, overriding the settings above.
+        self.re_try_policies = {}
+
+        # If 'True', 'find_by_xpath()', 'click_by_xpath()' and 'read_text_by_xpath()' wait for the
+        # element with 'Driver.wait_for_xpath()', at most 'wait_timeout' seconds, instead of
+        # polling for it.
+        self.wait_for_elements = False
+        self.wait_timeout = 10
+
+        # Number of kept-alive connections to the 'chromedriver', shared by the threads using the
+        # driver, and the timeouts of each request, in seconds. 'command_timeouts' maps 'Command'
+        # names to read timeouts used instead of 'read_timeout' for them.
+        self.connection_pool_size = 4
+        self.connect_timeout = 5
+        self.read_timeout = None
+        self.command_timeouts = {}
+
+        # Number of elements found by 'Driver.find_by_xpath()' kept for reuse, until navigating or
+        # until an element is stale. A cached element that is stale finds itself again with its
+        # xpath, like with 'self_healing_elements'. Zero disables the cache.
+        self.element_cache_size = 0
+        # If 'True', 'Driver.find_by_xpath()' returns 'LocatedElement' instances, which find
+        # themselves again once when stale, instead of failing the command.
+        self.self_healing_elements = False
+
+        # 'metrics.Metrics' instance recording command latencies, retries and waits, or 'None'.
+        self.metrics = None
+
+        # Number of rows read per script call by 'Driver.extract_records()' and 'read_table()'.
+        self.chunk_size = 500
+
+        # URL patterns, with '*' as a wildcard, that 'Driver.open_url()' blocks the browser from
+        # requesting. Set from the profile by 'Driver.create()'.
+        self.blocked_urls = []
+
+        # 'Driver.recycle_if_needed()' restarts the browser after 'recycle_after_pages' pages, or
+        # when the 'chromedriver' and its browsers use more than 'recycle_after_rss' megabytes of
+        # memory. 'None' for no limit. If 'recycle_keep_cookies' is 'True', the cookies are carried
+        # over to the new browser.
+        self.recycle_after_pages = None
+        self.recycle_after_rss = None
+        self.recycle_keep_cookies = False
+
+        # Path of a trace file that every command sent to the 'chromedriver' and its response are
+        # appended to, for replaying them with 'Driver.replay()', or 'None'. Use a file per driver.
+        self.trace_path = None
 
     def get_default_re_try(self):
         return Settings.ReTry(
             Settings.WebDriverException,
-            tries=self.try_times,
-            sleep_time=self.sleep_time
+            **self._get_re_try_kwargs()
         )
 
     def get_alerts_re_try(self):
         return Settings.ReTry(
             Settings.NoAlertPresentException,
-            tries=self.try_times,
-            sleep_time=self.sleep_time
+            **self._get_re_try_kwargs()
         )
 
-def _get_default_options():
-    """Return the default options for a new driver."""
+    def get_async_default_re_try(self):
+        return Settings.AsyncReTry(
+            Settings.WebDriverException,
+            **self._get_re_try_kwargs()
+        )
+
+    def get_async_alerts_re_try(self):
+        return Settings.AsyncReTry(
+            Settings.NoAlertPresentException,
+            **self._get_re_try_kwargs()
+        )
+
+    def _get_re_try_kwargs(self):
+        policies = self.re_try_policies
+        if self.wait_for_elements:
+            # A wait that timed out has already waited for the whole time.
+            policies = {TimeoutException: RetryPolicy(tries=0), **policies}
+
+        return {
+            "tries": self.try_times,
+            "sleep_time": self.sleep_time,
+            "backoff": self.backoff,
+            "max_sleep_time": self.max_sleep_time,
+            "jitter": self.jitter,
+            "deadline": self.deadline,
+            "policies": policies,
+            "on_retry": self.metrics.record_retry if self.metrics else None,
+        }
+
+def _check_xpaths(*xpaths):
+    """
+    Raise 'InvalidXPath' if any of 'xpaths' has a syntax error, so that it is neither sent to the
+    browser nor retried.
+    """
+
+    for xpath in xpaths:
+        error = get_xpath_error(xpath)
+        if error is not None:
+            raise InvalidXPath(f"'{xpath}': {error}")
+
+def _split_xpaths(xpaths):
+    """
+    Return the keys and the values of 'xpaths' as lists, if it is a dict. Otherwise return 'None'
+    and 'xpaths' as a list.
+    """
+
+    if isinstance(xpaths, dict):
+        keys = list(xpaths)
+        return keys, [xpaths[key] for key in keys]
+    return None, list(xpaths)
+
+def _bind_locator(found, xpath, root_element, many):
+    """
+    Return the element 'found' with 'xpath' and 'root_element' as 'LocatedElement', or if 'many' is
+    'True', the list of elements 'found' with the index of each element added to 'xpath'.
+    """
+
+    if many:
+        return [LocatedElement.from_element(element, f"({xpath})[{index}]", root_element)
+                for index, element in enumerate(found, start=1)]
+    return LocatedElement.from_element(found, xpath, root_element)
+
+def _get_located_arguments(driver_command, params):
+    """
+    Return the 'LocatedElement' arguments, also inside lists, of 'driver_command' if it runs a
+    script. Otherwise return an empty list.
+    """
+
+    if driver_command not in _SCRIPT_COMMANDS or not params:
+        return []
+    located_elements = []
+    for argument in params.get("args", []):
+        arguments = argument if isinstance(argument, (list, tuple)) else [argument]
+        located_elements.extend(element for element in arguments
+                                if isinstance(element, LocatedElement))
+    return located_elements
+
+def _get_default_options(profile="default"):
+    """Return the options of 'profile' for a new driver. Raise 'ValueError' for unknown profile."""
+
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown profile: '{profile}'")
+    profile = PROFILES[profile]
 
     options = Options()
-    # options.add_argument("--headless")
-    options.add_argument("--start-maximized")
-    options.add_argument("disable-infobars")
+    for argument in profile["arguments"]:
+        options.add_argument(argument)
+    if profile["prefs"]:
+        options.add_experimental_option("prefs", profile["prefs"])
+    options.set_capability("pageLoadStrategy", profile["page_load_strategy"])
+    if profile["performance_log"]:
+        options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True,
+                                                             "enablePage": False})
     return options
 
 class Driver(selenium.webdriver.remote.webdriver.WebDriver):
     """Remote driver class that uses an existing session when possible."""
 
     @staticmethod
-    def create(start_service=False):
-        """Return instance of 'Driver' and start the 'chromedriver' service if needed."""
+    def create(start_service=False, worker=None, profile="default", settings=None):
+        """
+        Return instance of 'Driver' and start the 'chromedriver' service if needed. Reuse the
+        session saved with the key 'worker', or with the port if 'worker' is not given, and claim
+        it for this process until 'release()' is called or the process exits. Raise
+        'session.SessionAlreadyExists' if another running process has claimed it.
+
+        A new session is started with the options of 'profile', one of 'PROFILES'. A reused session
+        keeps the options it was started with. 'settings' default to 'Settings()' with the blocked
+        URLs of 'profile'.
+
+        A saved session is checked with a single request, skipped if it was found alive moments
+        ago (see 'session._is_session_alive()'). The time taken is recorded to 'Settings.metrics',
+        if set, by path: "warm", "cold" or "stale".
+        """
 
+        start_time = time.perf_counter()
         if start_service:
             service._start_chromedriver()
 
-        options = _get_default_options()
+        options = _get_default_options(profile)
+        if settings is None:
+            settings = Settings()
+            settings.blocked_urls = list(PROFILES[profile]["blocked_urls"])
         port = os.environ.get(service.PORT_ENV_KEY, service.DEFAULT_PORT)
-        session_id = session._read_session_id()
+        session_key = worker if worker is not None else port
+
+        session._reap_sessions()
+        record = session._claim_session(session_key)
+        path = "cold"
+        if record:
+            if session._is_session_alive(record["port"], record["session_id"]):
+                driver = Driver(options, settings, port=record["port"],
+                                session_id=record["session_id"], verify=False)
+                driver.session_key = session_key
+                driver._record_create("warm", start_time)
+                return driver
+
+            # The claim is kept, so that no other process starts a session for the key meanwhile.
+            path = "stale"
+
+        try:
+            driver = Driver(options, settings, port=port)
+        except BaseException:
+            session._remove_session(session_key)
+            raise
+        try:
+            session._register_session(session_key, driver.session_id, port,
+                                      pid=driver.get_service_pid())
+        except BaseException:
+            with suppress(WebDriverException, urllib3.exceptions.HTTPError, OSError):
+                driver.quit()
+            raise
+        driver.session_key = session_key
+        driver._record_create(path, start_time)
+        return driver
 
-        with suppress(selenium.common.exceptions.WebDriverException):
-            driver = Driver(options, Settings(), port=port, session_id=session_id)
-            session._save_session_id(driver.session_id)
-            return driver
+    def _record_create(self, path, start_time):
+        """Record the time 'create()' took on 'path' since 'start_time'."""
 
-        session._clear_session_id()
+        elapsed_time = time.perf_counter() - start_time
+        _LOG.debug("Created driver (%s) in %.3f seconds", path, elapsed_time)
+        if self.settings.metrics:
+            self.settings.metrics.record_create(path, elapsed_time)
 
-        driver = Driver(options, Settings(), port=port)
-        session._save_session_id(driver.session_id)
-        return driver
-
-    def __init__(self, options, settings, port=None, session_id=None):
-        """Initialize 'Driver'."""
+    def __init__(self, options, settings, port=None, session_id=None, verify=True,
+                 command_executor=None):
+        """
+        Initialize 'Driver'. If 'session_id' is given, reuse that session, and unless 'verify' is
+        'False', check that it responds. A new session is not checked, since starting it already
+        shows that the browser opened. 'command_executor' is used instead of a connection to the
+        'chromedriver' on 'port', if given.
+        """
 
         if not isinstance(options, Options):
             raise TypeError(f"Invalid type: {type(options)}")
@@ -96,38 +368,327 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
             raise TypeError(f"Invalid type: {type(settings)}")
 
         self.settings = settings
+        self.port = port
+        # Key of the session in the session registry, if saved there by 'create()'.
+        self.session_key = None
+        # Number of pages opened since the browser was started, or recycled.
+        self.pages_visited = 0
+        # Pairs of action name and seconds spent waiting for the page to settle after it.
+        self.settle_times = deque(maxlen=_SETTLE_TIMES_LENGTH)
+        # Script timeout of the session, in seconds. Only ever raised by the helpers.
+        self._script_timeout = _DEFAULT_SCRIPT_TIMEOUT
+        # 'Snapshot' used for finding elements inside 'snapshot()', or 'None'.
+        self._snapshot = None
+        # URL patterns blocked with 'block_urls()', or 'None' if not set.
+        self._blocked_urls = None
+        self.element_cache = ElementCache(settings.element_cache_size)
 
         url = f"http://127.0.0.1:{port}"
         self._saved_session_id = session_id
+        # Options for starting the browser again in 'recycle()'.
+        self._options = options
+        if command_executor is None:
+            command_executor = connection.PooledConnection(
+                url,
+                pool_size=settings.connection_pool_size,
+                connect_timeout=settings.connect_timeout,
+                read_timeout=settings.read_timeout,
+                command_timeouts=settings.command_timeouts,
+                trace_path=settings.trace_path
+            )
+
+        super().__init__(command_executor=command_executor, desired_capabilities={},
+                         options=options)
+
+        if session_id and verify:
+            # Verify that the session still responds.
+            self.current_url
 
-        super().__init__(command_executor=url, desired_capabilities={}, options=options)
+    @staticmethod
+    def replay(trace_path, settings=None, delay=False, check_params=True):
+        """
+        Return a 'Driver' answered from the trace 'trace_path', recorded with 'Settings.trace_path',
+        instead of a browser, using 'settings'. The helpers must send the same commands as when
+        recording, or 'command_trace.TraceMismatch' is raised, so a replay shows when a change
+        to the helpers adds round trips. 'delay' and 'check_params' are passed to
+        'command_trace.ReplayConnection'.
+        """
 
-        # Verify that the browser opened.
-        self.current_url
+        replay_connection = command_trace.ReplayConnection(trace_path, delay=delay,
+                                                           check_params=check_params)
+        return Driver(_get_default_options(), settings or Settings(),
+                      command_executor=replay_connection)
 
     def execute(self, driver_command, params=None):
-        """Override 'super().execute()' so existing session is used."""
+        """
+        Override 'super().execute()' so existing session is used, and cached elements are
+        forgotten after navigating or finding a stale element.
+        """
 
         if driver_command == Command.NEW_SESSION and self._saved_session_id:
-            return {"success": 0, "value": None, "sessionId": self._saved_session_id}
-        return super().execute(driver_command, params=params)
+            response = {"success": 0, "value": None, "sessionId": self._saved_session_id}
+            if self.settings.trace_path is not None:
+                # Record the reused session, so that the trace replays from its first command.
+                command_trace.append_record(self.settings.trace_path, driver_command, params,
+                                            response, 0)
+            return response
+
+        if driver_command in _NAVIGATION_COMMANDS:
+            self.element_cache.clear()
+        if driver_command == Command.GET:
+            self.pages_visited += 1
+        try:
+            return self._execute_and_record(driver_command, params)
+        except StaleElementReferenceException:
+            self.element_cache.clear()
+            located_elements = _get_located_arguments(driver_command, params)
+            if not located_elements:
+                raise
+
+        # Scripts, like 'get_attribute()' and 'is_displayed()', take the elements as arguments, so
+        # the elements find themselves again here instead of in 'LocatedElement._execute()'.
+        _LOG.debug("Finding %s stale script arguments again", len(located_elements))
+        for element in located_elements:
+            element.relocate()
+        return self._execute_and_record(driver_command, params)
+
+    def _execute_and_record(self, driver_command, params):
+        """Call 'super().execute()' and record its latency to 'Settings.metrics', if set."""
+
+        metrics = self.settings.metrics
+        if metrics is None:
+            return super().execute(driver_command, params=params)
+
+        start_time = time.perf_counter()
+        failed = True
+        try:
+            response = super().execute(driver_command, params=params)
+            failed = False
+            return response
+        finally:
+            metrics.record_command(driver_command, time.perf_counter() - start_time, failed)
+
+    def is_alive(self):
+        """Return 'True' if the session still responds to commands."""
+
+        with suppress(WebDriverException, urllib3.exceptions.HTTPError, OSError):
+            self.current_url
+            return True
+        return False
+
+    def get_service_pid(self):
+        """Return the saved 'pid' of the 'chromedriver' the driver uses, or 'None' if not saved."""
+
+        pid = service._read_saved_pid(port=self.port)
+        if pid is None and f"{self.port}" == os.environ.get(service.PORT_ENV_KEY,
+                                                            service.DEFAULT_PORT):
+            pid = service._read_saved_pid()
+        return pid
+
+    def get_memory_usage(self):
+        """
+        Return the resident memory of the 'chromedriver' the driver uses and of the browsers it
+        started, in bytes. Return 'None' if its 'pid' is not saved or '/proc' is not available.
+        """
+
+        pid = self.get_service_pid()
+        if pid is None or not service._is_process_alive(pid):
+            return None
+        return service._read_process_tree_rss(pid)
+
+    def needs_recycling(self):
+        """Return 'True' if the browser has reached a limit of 'Settings' for recycling it."""
+
+        max_pages = self.settings.recycle_after_pages
+        if max_pages is not None and self.pages_visited >= max_pages:
+            return True
+
+        max_rss = self.settings.recycle_after_rss
+        if max_rss is not None:
+            rss = self.get_memory_usage()
+            return rss is not None and rss > max_rss * 1024 * 1024
+        return False
+
+    def recycle(self, keep_cookies=None):
+        """
+        Quit the browser and start a new session with the same options. If 'keep_cookies', or
+        'Settings.recycle_keep_cookies' if not given, is 'True', carry the cookies of all domains
+        over to the new browser. The new session replaces the old one in the session registry.
+        """
+
+        keep_cookies = self.settings.recycle_keep_cookies if keep_cookies is None else keep_cookies
+        cookies = []
+        if keep_cookies:
+            cookies = self.execute_cdp_cmd("Network.getAllCookies").get("cookies", [])
+
+        _LOG.info("Recycling the browser after %s pages", self.pages_visited)
+        with suppress(WebDriverException, urllib3.exceptions.HTTPError, OSError):
+            self.quit()
+
+        self._saved_session_id = None
+        self._script_timeout = _DEFAULT_SCRIPT_TIMEOUT
+        self._blocked_urls = None
+        self.element_cache.clear()
+        self.pages_visited = 0
+        self.start_session(self._options.to_capabilities())
+
+        if cookies:
+            self.execute_cdp_cmd("Network.setCookies", {"cookies": cookies})
+        if self.session_key is not None:
+            session._register_session(self.session_key, self.session_id, self.port,
+                                      pid=self.get_service_pid())
+
+    def recycle_if_needed(self):
+        """
+        Recycle the browser if it needs recycling (see 'needs_recycling()'). Call between tasks,
+        since the current page is lost. Return 'True' if the browser was recycled.
+        """
+
+        if not self.needs_recycling():
+            return False
+        self.recycle()
+        return True
 
     def find_by_xpath(self, xpath, root_element=None, many=False):
         """
         Wrapper for calling 'self.find_element_by_xpath(xpath)'. If 'many' is 'True', return a list
-        of elements, instead of the first found.
+        of elements, instead of the first found. Raise 'InvalidXPath' right away, without retrying,
+        if 'xpath' is not valid.
         """
 
+        _check_xpaths(xpath)
+        if self._snapshot is not None:
+            return self._find_in_snapshot(xpath, root_element, many)
+
+        if not many:
+            element = self.element_cache.get(xpath, root_element)
+            if element is not None:
+                return element
+
+        cache_root_element = root_element
         root_element = root_element if root_element else self
 
         def implementation():
             """Wrapped function implementation."""
 
-            if many:
-                return root_element.find_elements_by_xpath(xpath)
-            return root_element.find_element_by_xpath(xpath)
+            try:
+                if many:
+                    if self.settings.wait_for_elements:
+                        self._wait_for_element(xpath, root_element, "present")
+                    return root_element.find_elements_by_xpath(xpath)
+                if self.settings.wait_for_elements:
+                    return self._wait_for_element(xpath, root_element, "present")
+                return root_element.find_element_by_xpath(xpath)
+            except InvalidSelectorException as error:
+                # Rejected by the browser although the syntax is valid, e.g. an unknown function.
+                raise InvalidXPath(f"'{xpath}': {error.msg}") from None
+
+        found = self.settings.get_default_re_try()(implementation)()
+        if self.settings.self_healing_elements:
+            found = _bind_locator(found, xpath, cache_root_element, many)
+        if not many and self.element_cache.size:
+            # A cached element can go stale without navigating, e.g. after a click re-renders the
+            # page, so it finds itself again at once instead of the helper retrying with a sleep.
+            if not isinstance(found, LocatedElement):
+                found = _bind_locator(found, xpath, cache_root_element, many)
+            self.element_cache.put(xpath, cache_root_element, found)
+        return found
 
-        return self.settings.get_default_re_try()(implementation)()
+    @contextmanager
+    def snapshot(self):
+        """
+        Read the page source once, and answer 'find_by_xpath()', 'read_text_by_xpath()' and
+        'read_attribute_by_xpath()' locally from it inside the context. Requires 'lxml'.
+
+        Inside the context 'find_by_xpath()' returns 'lxml' elements, which can be used as
+        'root_element' but not for interacting with the page. Texts include hidden elements, and
+        attributes are read as written in the source. Elements not found raise
+        'NoSuchElementException' right away, since the snapshot does not change.
+
+        Can be used like this:
+        > with driver.snapshot():
+        >     rows = [driver.read_text_by_xpath(f"//tr[{index}]") for index in range(1, 100)]
+        """
+
+        def implementation():
+            """Wrapped function implementation."""
+
+            return self.page_source
+
+        page_source = self.settings.get_default_re_try()(implementation)()
+        self._snapshot = Snapshot(page_source)
+        try:
+            yield self._snapshot
+        finally:
+            self._snapshot = None
+
+    def _find_in_snapshot(self, xpath, root_element, many):
+        """Find elements from the snapshot like 'find_by_xpath()' does from the page."""
+
+        try:
+            elements = self._snapshot.find(xpath, root_element=root_element)
+        except SnapshotXPathError as error:
+            raise InvalidXPath(f"{error}") from None
+
+        if many:
+            return elements
+        if not elements:
+            raise NoSuchElementException(f"Element not found from the snapshot: '{xpath}'")
+        return elements[0]
+
+    def wait_for_xpath(self, xpath, timeout, condition="present", root_element=None):
+        """
+        Wait at most 'timeout' seconds for the first element matching 'xpath' and 'root_element' to
+        fulfill 'condition', and return it. 'condition' is one of 'WAIT_CONDITIONS'. The browser
+        checks the condition on every DOM mutation, so the element is returned as soon as it is
+        ready. Raise 'TimeoutException' on timeout and 'InvalidXPath' if 'xpath' can not be
+        evaluated.
+        """
+
+        if condition not in WAIT_CONDITIONS:
+            raise ValueError(f"Unknown condition: '{condition}'")
+        _check_xpaths(xpath)
+        root_element = root_element if root_element is not self else None
+
+        self._ensure_script_timeout(timeout)
+        result = self.execute_async_script(browser_scripts.WAIT_FOR_XPATH, xpath, root_element,
+                                           condition, timeout * 1000)
+        if result is None:
+            raise TimeoutException(f"Element not {condition} in {timeout} seconds: '{xpath}'")
+        if isinstance(result, dict):
+            raise InvalidXPath(f"'{xpath}': {result['error']}")
+        return result
+
+    def _wait_for_element(self, xpath, root_element, condition):
+        """
+        Call 'wait_for_xpath()' with 'Settings.wait_timeout', shortened to the time left until the
+        deadline of the retries.
+        """
+
+        timeout = self.settings.wait_timeout
+        remaining_time = get_remaining_time()
+        if remaining_time is not None:
+            timeout = min(timeout, remaining_time)
+        element = self.wait_for_xpath(xpath, timeout, condition=condition,
+                                      root_element=root_element)
+        if self.settings.self_healing_elements:
+            root_element = root_element if root_element is not self else None
+            element = _bind_locator(element, xpath, root_element, many=False)
+        return element
+
+    def _ensure_script_timeout(self, timeout):
+        """Make sure that asynchronous scripts can run at least 'timeout' seconds."""
+
+        # Leave time for the script to call back on its own timeout.
+        timeout += 1
+        if self._script_timeout < timeout:
+            self.set_script_timeout(timeout)
+
+    def set_script_timeout(self, time_to_wait):
+        """Override 'super().set_script_timeout()' to remember the timeout of the session."""
+
+        super().set_script_timeout(time_to_wait)
+        self._script_timeout = time_to_wait
 
     def click_by_xpath(self, xpath, send_js_event=False, root_element=None):
         """Find and click the first element matching 'xpath' and 'root_element'."""
@@ -135,12 +696,15 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
         def implementation():
             """Wrapped function implementation."""
 
-            element = self.find_by_xpath(xpath, root_element=root_element, many=False)
+            if self.settings.wait_for_elements:
+                element = self._wait_for_element(xpath, root_element, "clickable")
+            else:
+                element = self.find_by_xpath(xpath, root_element=root_element, many=False)
             if send_js_event:
                 self.execute_script("arguments[0].click();", element)
             else:
                 element.click()
-            time.sleep(self.settings.click_delay)
+            self._wait_after_action("click", self.settings.click_delay)
             return element
 
         return self.settings.get_default_re_try()(implementation)()
@@ -151,10 +715,20 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
         'allow_empty' is 'False' and the text is empty, raise 'WebDriverException'.
         """
 
+        if self._snapshot is not None:
+            text = Snapshot.read_text(self._find_in_snapshot(xpath, root_element, many=False))
+            if not text and not allow_empty:
+                raise WebDriverException(f"Text empty: '{xpath}'")
+            return text
+
         def implementation():
             """Wrapped function implementation."""
 
-            text = self.find_by_xpath(xpath, root_element=root_element, many=False).text
+            if self.settings.wait_for_elements and not allow_empty:
+                element = self._wait_for_element(xpath, root_element, "text_nonempty")
+            else:
+                element = self.find_by_xpath(xpath, root_element=root_element, many=False)
+            text = element.text
             if not text and not allow_empty:
                 raise WebDriverException(f"Text empty: '{xpath}'")
             return text
@@ -168,6 +742,10 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
         'find_by_xpath()'.
         """
 
+        if self._snapshot is not None:
+            element = self._find_in_snapshot(xpath, root_element, many=False)
+            return Snapshot.read_attribute(element, attribute)
+
         def implementation():
             """Wrapped function implementation."""
 
@@ -176,6 +754,99 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
 
         return self.settings.get_default_re_try()(implementation)()
 
+    def read_texts_by_xpaths(self, xpaths, root_element=None, attribute=None):
+        """
+        Read the texts of the first elements matching each of 'xpaths' with a single script call.
+        If 'attribute' is given, read that attribute instead of the text. 'xpaths' can be a list or
+        a dict, and the result is of the same shape, with 'None' in place of xpaths that matched
+        nothing. Raise 'InvalidXPath' if an xpath can not be evaluated.
+
+        Texts are read with 'innerText', so they can differ from 'WebElement.text' in whitespace.
+        """
+
+        keys, xpath_list = _split_xpaths(xpaths)
+        _check_xpaths(*xpath_list)
+
+        def implementation():
+            """Wrapped function implementation."""
+
+            return self.execute_script(browser_scripts.READ_XPATHS, xpath_list, root_element,
+                                       attribute)
+
+        values = self.settings.get_default_re_try()(implementation)()
+        if isinstance(values, dict):
+            raise InvalidXPath(f"'{xpath_list[values['index']]}': {values['error']}")
+
+        if keys is not None:
+            return dict(zip(keys, values))
+        return values
+
+    def extract_records(self, row_xpath, columns, root_element=None):
+        """
+        Yield a record for every element matching 'row_xpath' and 'root_element'. 'columns' are
+        xpaths relative to a row: if it is a list, records are tuples of the column texts, and if it
+        is a dict, records are dicts with the same keys. Columns that matched nothing are 'None'.
+
+        Rows are read in chunks of 'Settings.chunk_size' rows per script call, so a large region
+        is never serialized at once. The rows are found once, for the first chunk, and kept in the
+        page until the last chunk is read. Raise 'InvalidXPath' if an xpath can not be evaluated.
+        """
+
+        keys, column_xpaths = _split_xpaths(columns)
+        _check_xpaths(row_xpath, *column_xpaths)
+        # Key of the rows kept in the page between chunks.
+        rows_key = uuid.uuid4().hex
+
+        def read_chunk(offset):
+            """Read the rows starting from 'offset'."""
+
+            chunk = self.execute_script(browser_scripts.EXTRACT_RECORDS, row_xpath, column_xpaths,
+                                        root_element, offset, self.settings.chunk_size, rows_key)
+            if "error" in chunk:
+                raise InvalidXPath(f"'{row_xpath}' or {column_xpaths}: {chunk['error']}")
+            return chunk
+
+        for values in self._read_chunks(read_chunk):
+            yield dict(zip(keys, values)) if keys is not None else tuple(values)
+
+    def read_table(self, xpath, root_element=None):
+        """
+        Find the first table element matching 'xpath' and 'root_element' and yield the texts of the
+        cells of each of its rows as a tuple. Header and footer rows are included. Rows are read in
+        chunks like in 'extract_records()'.
+        """
+
+        _check_xpaths(xpath)
+
+        def read_chunk(offset):
+            """Read the rows starting from 'offset'."""
+
+            chunk = self.execute_script(browser_scripts.READ_TABLE, xpath, root_element, offset,
+                                        self.settings.chunk_size)
+            if chunk is None:
+                raise WebDriverException(f"Table not found: '{xpath}'")
+            if "error" in chunk:
+                raise InvalidXPath(f"'{xpath}': {chunk['error']}")
+            return chunk
+
+        for values in self._read_chunks(read_chunk):
+            yield tuple(values)
+
+    def _read_chunks(self, read_chunk):
+        """
+        Call 'read_chunk(offset)' until all rows are read and yield the rows one by one. Each
+        chunk is retried separately.
+        """
+
+        offset = 0
+        while True:
+            chunk = self.settings.get_default_re_try()(read_chunk)(offset)
+            yield from chunk["rows"]
+
+            offset += len(chunk["rows"])
+            if not chunk["rows"] or offset >= chunk["total"]:
+                return
+
     def send_keys_by_xpath(self, xpath, keys, root_element=None):
         """
         Find the first element matching 'xpath' and 'root_element' and try to change its value to
@@ -188,10 +859,10 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
             element = self.find_by_xpath(xpath, root_element=root_element)
 
             element.clear()
-            time.sleep(self.settings.send_keys_delay)
+            self._wait_after_action("clear", self.settings.send_keys_delay)
 
             element.send_keys(keys)
-            time.sleep(self.settings.send_keys_delay)
+            self._wait_after_action("send_keys", self.settings.send_keys_delay)
 
             element_value = element.get_attribute("value")
             if element_value != keys:
@@ -203,6 +874,45 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
             keys = f"{keys}"
         return self.settings.get_default_re_try()(implementation)()
 
+    def fill_form(self, fields, root_element=None, verified=False):
+        """
+        Fill the form 'fields', a dict of xpaths and values, with a single script call that sets the
+        value of the first element matching each xpath and 'root_element' and dispatches 'input'
+        and 'change' events. Boolean values set the checked state of checkboxes and radio buttons.
+        Return a dict telling for each xpath whether the field was filled. Raise 'InvalidXPath' if
+        an xpath can not be evaluated.
+
+        Setting values from a script is much faster than typing them, but some fields only react to
+        real key events. If 'verified' is true, the fields that were found and editable but rejected
+        their value are filled again with 'send_keys_by_xpath'. Fields that were not found are not,
+        since finding them again would only be retried until the retries run out.
+        """
+
+        xpaths = list(fields)
+        _check_xpaths(*xpaths)
+        values = [value if isinstance(value, bool) else f"{value}" for value in fields.values()]
+        pairs = [[xpath, value] for xpath, value in zip(xpaths, values)]
+
+        def implementation():
+            """Wrapped function implementation."""
+
+            return self.execute_script(browser_scripts.FILL_FORM, pairs, root_element)
+
+        results = self.settings.get_default_re_try()(implementation)()
+        if isinstance(results, dict):
+            raise InvalidXPath(f"'{xpaths[results['index']]}': {results['error']}")
+
+        filled = {xpath: result["accepted"] for xpath, result in zip(xpaths, results)}
+        if verified:
+            for xpath, value, result in zip(xpaths, values, results):
+                if result["accepted"] or not result["editable"] or isinstance(value, bool):
+                    continue
+                _LOG.debug("Typing value rejected by field: '%s'", xpath)
+                with suppress(WebDriverException):
+                    self.send_keys_by_xpath(xpath, value, root_element=root_element)
+                    filled[xpath] = True
+        return filled
+
     def set_value(self, xpath, value):
         """Set value of the element matching 'xpath' to 'value'."""
 
@@ -210,17 +920,68 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
             """Wrapped function implementation."""
 
             element = self.find_by_xpath(xpath)
-            self.execute_script(f"arguments[0].value='{value}';", element)
+            # Pass 'value' as an argument, so that quotes or backslashes in it are not interpreted.
+            self.execute_script("arguments[0].value = arguments[1];", element, value)
             if self.read_attribute_by_xpath(xpath, "value") != value:
                 raise WebDriverException
 
         self.settings.get_default_re_try()(implementation)()
 
+    def execute_cdp_cmd(self, cmd, params=None):
+        """Execute the DevTools protocol command 'cmd' with 'params' and return the result."""
+
+        return self.execute("executeCdpCommand", {"cmd": cmd, "params": params or {}})["value"]
+
+    def block_urls(self, patterns):
+        """
+        Block the browser from requesting URLs matching any of 'patterns', with '*' as a wildcard,
+        replacing the patterns set earlier. The commands are only sent if the patterns change.
+        """
+
+        patterns = list(patterns)
+        if patterns == (self._blocked_urls or []):
+            return
+
+        self.execute_cdp_cmd("Network.enable")
+        self.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        self._blocked_urls = patterns
+
     @contextmanager
-    def open_url(self, url, go_back=True, refresh=False):
+    def capture_responses(self, url_pattern):
+        """
+        Capture the responses to requests whose URL matches the regular expression 'url_pattern',
+        like the XHR and fetch calls that bring the data of a page, while inside the context. Yield
+        a 'ResponseCapture', whose 'read()' returns the responses finished so far as pairs of URL
+        and body parsed from JSON. Reading the data once is much faster than reading the elements
+        rendered from it.
+
+        The session must have been started with the performance log enabled, like the "capture"
+        profile does, since the network events are read from it.
+
+        Can be used like this:
+        > with driver.capture_responses(r"/api/products") as capture:
+        >     driver.click_by_xpath("//button[@id='load-more']")
+        >     for url, products in capture.read(timeout=10):
+        >         print(products)
+        """
+
+        # Keep large bodies until they are read.
+        self.execute_cdp_cmd("Network.enable", {"maxResourceBufferSize": _MAX_RESOURCE_BUFFER_SIZE,
+                                                "maxTotalBufferSize": _MAX_TOTAL_BUFFER_SIZE})
+        try:
+            yield ResponseCapture(self, url_pattern)
+        finally:
+            # Enabling again with the default buffers frees the memory of the large ones. The
+            # domain is not disabled, since that would also stop blocking URLs.
+            with suppress(WebDriverException, urllib3.exceptions.HTTPError, OSError):
+                self.execute_cdp_cmd("Network.enable")
+
+    @contextmanager
+    def open_url(self, url, go_back=True, refresh=False, blocked_urls=None):
         """
         Open the 'url'. If 'go_back' is 'True', go back to the original url afterwards. If 'refresh' is
-        'True', open the 'url' even if it is already open.
+        'True', open the 'url' even if it is already open. Requests to URLs matching 'blocked_urls',
+        or 'Settings.blocked_urls' if not given, are blocked (see 'block_urls()').
 
         Can be used like this:
         > with open_url("google.com"):
@@ -236,14 +997,140 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
             is_new_url = new_url != self.current_url
             if refresh or is_new_url:
                 self.get(new_url)
-                time.sleep(self.settings.change_page_delay)
+                self._wait_after_action("open_url", self.settings.change_page_delay)
 
+        self.block_urls(self.settings.blocked_urls if blocked_urls is None else blocked_urls)
         original_url = self.current_url
         go_to(url)
         yield
         if go_back:
             go_to(original_url)
 
+    def map_urls(self, urls, extract_fn, max_tabs=4, timeout=None):
+        """
+        Load 'urls' in up to 'max_tabs' tabs at a time and yield pairs of url and the result of
+        'extract_fn(self)', called with the tab of the url as the current window once its page has
+        loaded and settled. The pairs are yielded in the order the pages load, not in the order of
+        'urls'. A page that has not loaded in 'timeout' seconds, 'Settings.wait_timeout' by
+        default, is extracted as it is.
+
+        The pages load concurrently in one session, so while one page is extracted, the others keep
+        loading. Each tab is closed after its extraction, and the original window is the current one
+        whenever a pair is yielded and after the generator is closed.
+        """
+
+        timeout = self.settings.wait_timeout if timeout is None else timeout
+        ready_states = ["complete"]
+        # A reused session has no capabilities, so read the strategy from the options.
+        if self._options.capabilities.get("pageLoadStrategy", "normal") != "normal":
+            ready_states.append("interactive")
+        urls = iter(urls)
+        original_handle = self.current_window_handle
+        # Urls and start times of the loading tabs, by window handle.
+        tabs = {}
+
+        def find_loaded_tab():
+            """Return the handle of a loaded tab, switched to, or 'None' if none has loaded."""
+
+            for handle, (_, start_time) in tabs.items():
+                self.switch_to.window(handle)
+                if time.time() - start_time >= timeout:
+                    return handle
+                # Scripts can fail while the tab switches from one document to another.
+                with suppress(WebDriverException):
+                    if self.execute_script(browser_scripts.IS_LOADED, ready_states):
+                        return handle
+            return None
+
+        try:
+            while True:
+                for url in itertools.islice(urls, max(0, max_tabs - len(tabs))):
+                    tabs[self._open_tab(url, original_handle)] = url, time.time()
+                if not tabs:
+                    return
+
+                handle = find_loaded_tab()
+                if handle is None:
+                    time.sleep(_TAB_POLL_INTERVAL)
+                    continue
+
+                url, _ = tabs.pop(handle)
+                try:
+                    self._wait_after_action("open_url", self.settings.change_page_delay)
+                    result = extract_fn(self)
+                finally:
+                    # Closed even if the extraction fails, since it is no longer in 'tabs'.
+                    with suppress(WebDriverException):
+                        self.switch_to.window(handle)
+                        self.close()
+                    self.switch_to.window(original_handle)
+                yield url, result
+        finally:
+            for handle in tabs:
+                with suppress(WebDriverException):
+                    self.switch_to.window(handle)
+                    self.close()
+            with suppress(WebDriverException):
+                self.switch_to.window(original_handle)
+
+    def _open_tab(self, url, original_handle):
+        """
+        Open a tab from the window 'original_handle', start navigating it to 'url', and return its
+        handle. 'Settings.blocked_urls' are blocked in the tab before navigating.
+        """
+
+        self.switch_to.window(original_handle)
+        handles = set(self.window_handles)
+        self.execute_script(browser_scripts.OPEN_TAB)
+        handle, = set(self.window_handles) - handles
+
+        self.switch_to.window(handle)
+        if self.settings.blocked_urls:
+            # URLs are blocked per tab.
+            self.execute_cdp_cmd("Network.enable")
+            self.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.settings.blocked_urls})
+        self.execute_script(browser_scripts.NAVIGATE, url)
+        # Navigating from a script is not a 'Command.GET', so count the page here.
+        self.pages_visited += 1
+        return handle
+
+    def wait_until_settled(self, max_wait, action=None):
+        """
+        Wait until the document is loaded, no fetch or XHR requests are in flight and the DOM has
+        not changed for 'Settings.settle_quiet_time' seconds, but at most 'max_wait' seconds.
+        Return the time waited, and record it with 'action' to 'self.settle_times'.
+
+        Requests are counted from the first call on each page, so requests started before it are
+        not waited for.
+        """
+
+        start_time = time.time()
+        try:
+            self._ensure_script_timeout(max_wait)
+            self.execute_async_script(browser_scripts.WAIT_UNTIL_SETTLED, max_wait * 1000,
+                                      self.settings.settle_quiet_time * 1000)
+        except WebDriverException as error:
+            # The page can change or an alert can open while the script runs.
+            _LOG.debug("Could not wait for the page to settle: %s", error)
+            time.sleep(max(0, max_wait - (time.time() - start_time)))
+
+        elapsed_time = time.time() - start_time
+        _LOG.debug("Page settled after '%s' in %.3f seconds", action, elapsed_time)
+        self.settle_times.append((action, elapsed_time))
+        if self.settings.metrics:
+            self.settings.metrics.record_settle(action, elapsed_time)
+        return elapsed_time
+
+    def _wait_after_action(self, action, delay):
+        """Wait for the page to settle after 'action', or sleep 'delay' seconds if disabled."""
+
+        if self.settings.wait_for_settle:
+            self.wait_until_settled(delay, action=action)
+        else:
+            time.sleep(delay)
+            if self.settings.metrics:
+                self.settings.metrics.record_delay(action, delay)
+
     def accept_alert(self):
         """Close alert by clicking 'OK'."""
 
@@ -262,9 +1149,24 @@ class Driver(selenium.webdriver.remote.webdriver.WebDriver):
             self.switch_to.alert.dismiss()
         self.settings.get_alerts_re_try()(implementation)()
 
+    def release(self):
+        """Release the session for other processes to reuse, if it was claimed by 'create()'."""
+
+        if self.session_key is not None:
+            session._release_session(self.session_key)
+
+    def quit(self):
+        """Quit the browser, and forget that the session was alive."""
+
+        try:
+            super().quit()
+        finally:
+            session._forget_session_liveness(self.port, self.session_id)
+
     def shutdown(self):
         """Close the window and shutdown the 'chromedriver'."""
 
         self.quit()
-        session._clear_session_id()
+        if self.session_key is not None:
+            session._remove_session(self.session_key)
         service._shutdown_chromedriver()
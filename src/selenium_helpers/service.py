@@ -7,9 +7,12 @@
 """Script handles initializing 'chromedriver' service."""
 
 import os
+import json
+import time
 import signal
 import logging
 import subprocess
+import http.client
 from contextlib import suppress
 
 from filelock import FileLock
@@ -33,12 +36,35 @@ _FILE_DIR = os.path.dirname(__file__)
 _MODULE_NAME, _ = os.path.splitext(_FILE_DIR)
 _LOG = logging.getLogger(name=_MODULE_NAME)
 
-# Save 'chromedriver' 'pid' to this file.
+# Save 'pid' of the 'chromedriver' using the default port to this file.
 _PID_FILE_PATH = os.path.join(_FILE_DIR, "chromedriver-pid.txt")
 
 # Lock file for '_PID_FILE_PATH'.
 _PID_FILE_PATH_LOCK = _PID_FILE_PATH + ".lock"
 
+# Time, in seconds, to wait for a new 'chromedriver' to accept connections.
+_STARTUP_TIMEOUT = 20
+# First and longest interval, in seconds, between probing a starting 'chromedriver'.
+_PROBE_INTERVAL = 0.005
+_MAX_PROBE_INTERVAL = 0.1
+
+class ServiceNotReady(Exception):
+    """
+    Custom exception for when the 'chromedriver' does not accept connections in time, or exits
+    before it does.
+    """
+
+def _get_pid_file_path(port=None):
+    """
+    Return the file path for saving 'pid' of the 'chromedriver' using 'port', and the path of
+    its lock file. If 'port' is 'None', return '_PID_FILE_PATH' and '_PID_FILE_PATH_LOCK'.
+    """
+
+    if port is None:
+        return _PID_FILE_PATH, _PID_FILE_PATH_LOCK
+    pid_file_path = os.path.join(_FILE_DIR, f"chromedriver-pid-{port}.txt")
+    return pid_file_path, pid_file_path + ".lock"
+
 def _read_port():
     """
     Try reading port number from the environment, otherwise use the default value:
@@ -50,10 +76,14 @@ def _read_port():
         os.environ[PORT_ENV_KEY] = DEFAULT_PORT
     return os.environ[PORT_ENV_KEY]
 
-def _read_log_path():
-    """Try reading log path from the environment."""
+def _read_log_path(port=None):
+    """
+    Try reading log path from the environment. By default, services started with a specific
+    'port' log to a file of their own.
+    """
 
-    default_log_path = os.path.join(os.getcwd(), "service.log")
+    log_file_name = "service.log" if port is None else f"service-{port}.log"
+    default_log_path = os.path.join(os.getcwd(), log_file_name)
     log_path = os.environ.get(LOG_PATH_ENV_KEY, default_log_path)
     _LOG.info("Logging to file: '%s'", log_path)
     return log_path
@@ -76,50 +106,209 @@ def _read_log_level():
                _DEFAULT_LOG_LEVEL)
     return _DEFAULT_LOG_LEVEL
 
-def _read_pid():
+def _read_pid(pid_file_path=_PID_FILE_PATH):
     """
     Read and return 'pid' of the currently running 'chromedriver' from the text file
-    '_PID_FILE_PATH'. If not found, return 'None'.
+    'pid_file_path'. If not found, return 'None'.
     """
 
-    with open(_PID_FILE_PATH, "r") as pid_file:
+    with open(pid_file_path, "r") as pid_file:
         pid = pid_file.readline().strip()
     with suppress(ValueError):
         return int(pid)
     return None
 
-def _shutdown_chromedriver():
-    """Shutdown the service."""
+def _is_process_alive(pid):
+    """Return 'True' if a process with 'pid' exists."""
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # The process exists, but belongs to another user.
+        return True
+    return True
+
+def _read_saved_pid(port=None):
+    """
+    Return the saved 'pid' of the 'chromedriver', or 'None' if not saved. If 'port' is given,
+    return the 'pid' of the service using it.
+    """
+
+    pid_file_path, pid_file_path_lock = _get_pid_file_path(port)
+    if not os.path.isfile(pid_file_path):
+        # Not started here, so leave no lock file behind either.
+        return None
+    with FileLock(pid_file_path_lock, timeout=15):
+        with suppress(FileNotFoundError):
+            return _read_pid(pid_file_path)
+    return None
+
+def _is_chromedriver_running(port=None):
+    """
+    Return 'True' if the 'chromedriver' whose 'pid' is saved is still running. If 'port' is given,
+    check the service using it.
+    """
+
+    pid = _read_saved_pid(port)
+    return bool(pid) and _is_process_alive(pid)
+
+def _get_child_pids():
+    """Return a dict of the 'pid' of each running process, by the 'pid' of its parent."""
+
+    child_pids = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        with suppress(OSError):
+            with open(f"/proc/{entry}/stat", "r") as stat_file:
+                stat = stat_file.read()
+            # The process name is in parentheses and can contain spaces.
+            parent_pid = int(stat[stat.rindex(")") + 2:].split()[1])
+            child_pids.setdefault(parent_pid, []).append(int(entry))
+    return child_pids
+
+def _read_rss(pid):
+    """Return the resident memory of the process 'pid', in bytes, or 0 if it is not running."""
+
+    with suppress(OSError):
+        with open(f"/proc/{pid}/statm", "r") as statm_file:
+            return int(statm_file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    return 0
+
+def _read_process_tree_rss(pid):
+    """
+    Return the resident memory of the process 'pid' and all its descendants, in bytes, like the
+    'chromedriver' and the browsers it started. Return 'None' if '/proc' is not available.
+    """
+
+    if not os.path.isdir("/proc"):
+        return None
+
+    child_pids = _get_child_pids()
+    rss = 0
+    pids = [pid]
+    while pids:
+        pid = pids.pop()
+        rss += _read_rss(pid)
+        pids.extend(child_pids.get(pid, []))
+    return rss
+
+def _is_ready(port, timeout=1):
+    """Return 'True' if the 'chromedriver' using 'port' is ready to create sessions."""
+
+    connection = http.client.HTTPConnection("127.0.0.1", int(port), timeout=timeout)
+    try:
+        connection.request("GET", "/status")
+        response = connection.getresponse()
+        body = response.read()
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        connection.close()
+
+    if response.status != 200:
+        return False
+    with suppress(ValueError, KeyError, TypeError, AttributeError):
+        return bool(json.loads(body)["value"].get("ready", True))
+    return True
+
+def _is_session_alive(port, session_id, timeout=1):
+    """
+    Return 'True' if the session 'session_id' of the 'chromedriver' using 'port' responds, by
+    reading its url.
+    """
+
+    connection = http.client.HTTPConnection("127.0.0.1", int(port), timeout=timeout)
+    try:
+        connection.request("GET", f"/session/{session_id}/url")
+        response = connection.getresponse()
+        response.read()
+    except (OSError, http.client.HTTPException):
+        return False
+    finally:
+        connection.close()
+    return response.status == 200
+
+def _wait_until_ready(port, process, timeout):
+    """
+    Probe the 'chromedriver' 'process' using 'port' with increasing intervals until it is ready,
+    it exits or 'timeout' seconds pass. Return 'True' if it became ready.
+    """
+
+    deadline = time.monotonic() + timeout
+    interval = _PROBE_INTERVAL
+    while True:
+        # Another service can answer on the port, so the process must be running when it does.
+        if process.poll() is not None:
+            return False
+        if _is_ready(port):
+            return True
+        if time.monotonic() + interval > deadline:
+            return False
+        time.sleep(interval)
+        interval = min(interval * 2, _MAX_PROBE_INTERVAL)
+
+def _shutdown_chromedriver(port=None):
+    """Shutdown the service. If 'port' is given, shutdown the service using it."""
 
     _LOG.info("Shutting down chromedriver")
 
-    with FileLock(_PID_FILE_PATH_LOCK, timeout=15):
-        if os.path.isfile(_PID_FILE_PATH):
-            pid = _read_pid()
+    pid_file_path, pid_file_path_lock = _get_pid_file_path(port)
+    with FileLock(pid_file_path_lock, timeout=15):
+        if os.path.isfile(pid_file_path):
+            pid = _read_pid(pid_file_path)
             if pid:
                 with suppress(OSError):
                     os.kill(pid, signal.SIGTERM)
-            os.remove(_PID_FILE_PATH)
+            os.remove(pid_file_path)
 
-def _start_chromedriver():
-    """Start chromedriver executable."""
+def _start_chromedriver(port=None, timeout=_STARTUP_TIMEOUT):
+    """
+    Start chromedriver executable, unless the previously started one is still running, and wait
+    at most 'timeout' seconds for it to accept connections. If 'port' is given, use it instead of
+    the port from the environment. Return the started process, or 'None' if the running one is
+    reused. Raise 'ServiceNotReady' if the service does not become ready in time, exits, or if the
+    port is used by a service that was not started here.
+    """
 
-    # TODO:: Check if process with the saved PID exists.
+    service_port = port if port is not None else _read_port()
+    pid_file_path, pid_file_path_lock = _get_pid_file_path(port)
+    with FileLock(pid_file_path_lock, timeout=15):
+        with suppress(FileNotFoundError):
+            pid = _read_pid(pid_file_path)
+            if pid and _is_process_alive(pid) and _is_ready(service_port):
+                _LOG.info("Reusing the running chromedriver instance: %s", pid)
+                return None
 
-    _LOG.info("Starting a new chromedriver instance")
+        if _is_ready(service_port):
+            # Its 'pid' is not known, so it could not be told apart from a new one.
+            raise ServiceNotReady(f"Port {service_port} is used by a chromedriver that was not "
+                                  f"started here")
 
-    executable_path = os.environ[PATH_ENV_KEY]
-    cmd = [executable_path,
-           f"--port={_read_port()}",
-           f"--log-path={_read_log_path()}",
-           f"--log-level={_read_log_level()}",
-           "--readable-timestamp"]
+        _LOG.info("Starting a new chromedriver instance")
 
-    with FileLock(_PID_FILE_PATH_LOCK, timeout=15):
+        executable_path = os.environ[PATH_ENV_KEY]
+        cmd = [executable_path,
+               f"--port={service_port}",
+               f"--log-path={_read_log_path(port)}",
+               f"--log-level={_read_log_level()}",
+               "--readable-timestamp"]
+
+        start_time = time.monotonic()
         process = subprocess.Popen(cmd)
-        if process.poll():
-            _LOG.info("An instance of chromedriver is already running")
-        else:
-            with open(_PID_FILE_PATH, "w") as pid_file:
-                pid_file.write(str(process.pid))
+        if not _wait_until_ready(service_port, process, timeout):
+            exit_code = process.poll()
+            if exit_code is not None:
+                raise ServiceNotReady(f"Chromedriver on port {service_port} exited with code "
+                                      f"{exit_code}")
+            with suppress(OSError):
+                process.terminate()
+            raise ServiceNotReady(f"Chromedriver not ready on port {service_port} "
+                                  f"in {timeout} seconds")
+
+        _LOG.info("Chromedriver ready in %.3f seconds", time.monotonic() - start_time)
+        with open(pid_file_path, "w") as pid_file:
+            pid_file.write(str(process.pid))
     return process
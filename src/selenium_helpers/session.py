@@ -4,51 +4,200 @@
 #
 # Author: Henri Immonen <henri.immonen@mostdigital.fi>
 
-"""Script handles reading and saving of the session ID, used by 'WebDriver'."""
+"""
+Script handles the registry of session IDs, used by 'WebDriver'. Sessions are keyed by worker,
+for example by the port of the 'chromedriver', and claimed by one process at a time.
+"""
 
 import os
+import json
+import time
 import logging
+import threading
 from contextlib import suppress
 
 from filelock import FileLock
 
+from selenium_helpers import service
+
 _FILE_DIR = os.path.dirname(__file__)
 _MODULE_NAME, _ = os.path.splitext(os.path.basename(__file__))
 _LOG = logging.getLogger(name=_MODULE_NAME)
 
-# Save 'chromedriver' 'pid' to this file.
-_SESSION_ID_FILE_PATH = os.path.join(_FILE_DIR, "session-id.txt")
+# Save the sessions to this file.
+_REGISTRY_FILE_PATH = os.path.join(_FILE_DIR, "sessions.json")
+
+# Lock file for '_REGISTRY_FILE_PATH'.
+_REGISTRY_FILE_PATH_LOCK = _REGISTRY_FILE_PATH + ".lock"
+
+# Time, in seconds, a session found alive is trusted without probing it again.
+_LIVENESS_TTL = 2
+
+# 'time.monotonic()' when each session was last found alive, by port and session ID.
+_ALIVE_TIMES = {}
+_ALIVE_TIMES_LOCK = threading.Lock()
 
-# Lock file for '_SESSION_ID_FILE_PATH'.
-_SESSION_ID_FILE_PATH_LOCK = _SESSION_ID_FILE_PATH + ".lock"
 class SessionAlreadyExists(Exception):
-    """Custom exception for when the session ID is already defined."""
+    """Custom exception for when the session is already claimed by another process."""
+
+def _read_registry():
+    """Return the saved sessions as a dict of session records by key."""
+
+    with suppress(FileNotFoundError):
+        with open(_REGISTRY_FILE_PATH, "r") as registry_file:
+            try:
+                return json.load(registry_file)
+            except ValueError:
+                _LOG.warning("Discarding corrupted session registry: '%s'", _REGISTRY_FILE_PATH)
+    return {}
+
+def _write_registry(registry):
+    """Replace the saved sessions with 'registry' atomically."""
+
+    temporary_path = f"{_REGISTRY_FILE_PATH}.{os.getpid()}.tmp"
+    with open(temporary_path, "w") as registry_file:
+        json.dump(registry, registry_file, indent=4)
+    os.replace(temporary_path, _REGISTRY_FILE_PATH)
+
+def _is_claimed_by_other(record):
+    """Return 'True' if 'record' is claimed by another process that is still running."""
+
+    owner = record.get("owner")
+    return bool(owner) and owner != os.getpid() and service._is_process_alive(owner)
+
+def _claim_session(key):
+    """
+    Claim the session saved with 'key' for this process and return its record, or return 'None'
+    if there is no such session. Raise 'SessionAlreadyExists' if another running process has
+    claimed it.
+
+    If there is no session, 'key' is reserved for this process with a record without a session,
+    so that another process does not start a session for it at the same time. Replace the
+    reservation with '_register_session()', or drop it with '_remove_session()'.
+
+    A record is a dict with keys 'session_id' (or 'None' for a reservation), 'port', 'pid' (of the
+    'chromedriver', or 'None'), 'owner' (the 'pid' of the claiming process, or 'None'), 'created'
+    and 'last_used'.
+    """
+
+    key = f"{key}"
+    with FileLock(_REGISTRY_FILE_PATH_LOCK, timeout=15):
+        registry = _read_registry()
+        record = registry.get(key)
+        if record is not None and _is_claimed_by_other(record):
+            raise SessionAlreadyExists(f"Session '{key}' is claimed by process {record['owner']}")
 
-def _read_session_id():
-    """Return the previously saved session ID."""
+        now = time.time()
+        if record is None or record.get("session_id") is None:
+            registry[key] = {
+                "session_id": None,
+                "port": None,
+                "pid": None,
+                "owner": os.getpid(),
+                "created": now,
+                "last_used": now,
+            }
+            _write_registry(registry)
+            return None
 
-    with FileLock(_SESSION_ID_FILE_PATH_LOCK, timeout=15):
-        with suppress(FileNotFoundError):
-            with open(_SESSION_ID_FILE_PATH, "r") as session_id_file:
-                return session_id_file.readline().strip()
-    return ""
+        record["owner"] = os.getpid()
+        record["last_used"] = now
+        _write_registry(registry)
+        return dict(record)
 
-def _save_session_id(session_id):
+def _is_session_alive(port, session_id):
     """
-    Save 'session_id' to a file. Raise 'SessionAlreadyExists' if it is already defined.
+    Return 'True' if the session 'session_id' of the 'chromedriver' using 'port' responds. A
+    session found alive, or registered, less than '_LIVENESS_TTL' seconds ago is not probed.
+    """
+
+    liveness_key = (f"{port}", session_id)
+    with _ALIVE_TIMES_LOCK:
+        alive_time = _ALIVE_TIMES.get(liveness_key)
+    if alive_time is not None and time.monotonic() - alive_time < _LIVENESS_TTL:
+        return True
+
+    alive = service._is_session_alive(port, session_id)
+    with _ALIVE_TIMES_LOCK:
+        if alive:
+            _ALIVE_TIMES[liveness_key] = time.monotonic()
+        else:
+            _ALIVE_TIMES.pop(liveness_key, None)
+    return alive
+
+def _forget_session_liveness(port, session_id):
+    """Make the next '_is_session_alive()' probe the session 'session_id'."""
+
+    with _ALIVE_TIMES_LOCK:
+        _ALIVE_TIMES.pop((f"{port}", session_id), None)
+
+def _register_session(key, session_id, port, pid=None):
+    """
+    Save 'session_id' with 'key' as claimed by this process. 'port' and 'pid' are those of the
+    'chromedriver' the session uses. Raise 'SessionAlreadyExists' if another running process has
+    claimed a session with 'key'.
     """
 
     if not isinstance(session_id, str):
         _LOG.warning("'session_id' is of wrong type: %s", type(session_id))
         session_id = f"{session_id}"
 
-    with FileLock(_SESSION_ID_FILE_PATH_LOCK, timeout=15):
-        with open(_SESSION_ID_FILE_PATH, "w") as session_id_file:
-            session_id_file.write(session_id)
+    key = f"{key}"
+    with FileLock(_REGISTRY_FILE_PATH_LOCK, timeout=15):
+        registry = _read_registry()
+        if key in registry and _is_claimed_by_other(registry[key]):
+            raise SessionAlreadyExists(
+                f"Session '{key}' is claimed by process {registry[key]['owner']}")
+
+        now = time.time()
+        registry[key] = {
+            "session_id": session_id,
+            "port": f"{port}",
+            "pid": pid,
+            "owner": os.getpid(),
+            "created": now,
+            "last_used": now,
+        }
+        _write_registry(registry)
 
-def _clear_session_id():
-    """Clear the last used session ID."""
+    with _ALIVE_TIMES_LOCK:
+        _ALIVE_TIMES[(f"{port}", session_id)] = time.monotonic()
+
+def _release_session(key):
+    """Release the session saved with 'key', so that another process can claim it."""
+
+    key = f"{key}"
+    with FileLock(_REGISTRY_FILE_PATH_LOCK, timeout=15):
+        registry = _read_registry()
+        record = registry.get(key)
+        if record is None or record.get("owner") != os.getpid():
+            return
+        record["owner"] = None
+        record["last_used"] = time.time()
+        _write_registry(registry)
+
+def _remove_session(key):
+    """Remove the session saved with 'key'."""
+
+    key = f"{key}"
+    with FileLock(_REGISTRY_FILE_PATH_LOCK, timeout=15):
+        registry = _read_registry()
+        if registry.pop(key, None) is not None:
+            _write_registry(registry)
+
+def _reap_sessions():
+    """
+    Remove the sessions whose 'chromedriver' process is no longer running, and return their
+    records by key. Sessions without a known 'chromedriver' 'pid' are kept.
+    """
 
-    with FileLock(_SESSION_ID_FILE_PATH_LOCK, timeout=15):
-        with suppress(FileNotFoundError):
-            os.remove(_SESSION_ID_FILE_PATH)
+    with FileLock(_REGISTRY_FILE_PATH_LOCK, timeout=15):
+        registry = _read_registry()
+        reaped = {key: record for key, record in registry.items()
+                  if record.get("pid") and not service._is_process_alive(record["pid"])}
+        if reaped:
+            for key in reaped:
+                _LOG.info("Reaping session '%s' of a stopped chromedriver", key)
+                del registry[key]
+            _write_registry(registry)
+    return reaped
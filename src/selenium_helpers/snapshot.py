@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Script has class 'Snapshot' for evaluating xpaths locally against a copy of the page source.
+Requires 'lxml'.
+"""
+
+import re
+from functools import lru_cache
+
+try:
+    from lxml import etree, html
+except ImportError:
+    etree = html = None
+
+# Number of compiled xpaths cached.
+_XPATH_CACHE_SIZE = 1024
+
+_WHITESPACE = re.compile(r"\s+")
+
+class SnapshotXPathError(Exception):
+    """Custom exception for an xpath that can not be evaluated against a snapshot."""
+
+@lru_cache(maxsize=_XPATH_CACHE_SIZE)
+def _compile(xpath):
+    """Return 'xpath' compiled by 'lxml'."""
+
+    try:
+        return etree.XPath(xpath)
+    except etree.XPathSyntaxError as error:
+        raise SnapshotXPathError(f"'{xpath}': {error}") from None
+
+class Snapshot:
+    """
+    Class for a parsed copy of the page source. Xpaths are evaluated with 'lxml', which only
+    supports XPath 1.0, like browsers do.
+    """
+
+    def __init__(self, page_source):
+        """Initialize 'Snapshot' by parsing 'page_source'. Raise 'ImportError' without 'lxml'."""
+
+        if html is None:
+            raise ImportError("Snapshots require 'lxml'")
+        self.root = html.document_fromstring(page_source)
+
+    def find(self, xpath, root_element=None):
+        """Return a list of the elements matching 'xpath', relative to 'root_element' if given."""
+
+        context = root_element if root_element is not None else self.root
+        try:
+            result = _compile(xpath)(context)
+        except etree.XPathEvalError as error:
+            raise SnapshotXPathError(f"'{xpath}': {error}") from None
+        if not isinstance(result, list):
+            raise SnapshotXPathError(f"'{xpath}' does not select elements")
+        return [node for node in result if isinstance(node, etree._Element)]
+
+    @staticmethod
+    def read_text(element):
+        """
+        Return the text of 'element' with whitespace collapsed. Unlike 'WebElement.text', the text
+        of hidden elements is included.
+        """
+
+        return _WHITESPACE.sub(" ", element.text_content()).strip()
+
+    @staticmethod
+    def read_attribute(element, attribute):
+        """Return the value of 'attribute' of 'element' as written in the source, or 'None'."""
+
+        return element.get(attribute)
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Script has 'get_xpath_error()' for checking the syntax of an xpath locally, before it is sent to
+the browser. Xpaths are compiled with 'lxml' if it is installed. Otherwise only the most common
+mistakes are caught: unterminated strings, unbalanced brackets, empty predicates and dangling
+operators. Results are cached, so checking an xpath again costs a dict lookup.
+"""
+
+import re
+from functools import lru_cache
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Number of xpaths whose check results are cached.
+_XPATH_CACHE_SIZE = 4096
+
+_STRING_LITERAL = re.compile(r"\"[^\"]*\"|'[^']*'")
+_EMPTY_PREDICATE = re.compile(r"\[\s*\]")
+_CLOSING_BRACKETS = {")": "(", "]": "["}
+
+# Characters an xpath can not start or end with.
+_LEADING_OPERATORS = "|=<>,!"
+_TRAILING_OPERATORS = "/|=<>+-,@:!"
+
+def _check_without_lxml(xpath):
+    """Return the first syntax error found from 'xpath', or 'None'."""
+
+    # Replace string literals, so that their contents are not mistaken for syntax.
+    structure = _STRING_LITERAL.sub("0", xpath).strip()
+    if not structure:
+        return "Empty expression"
+    if '"' in structure or "'" in structure:
+        return "Unterminated string literal"
+
+    open_brackets = []
+    for character in structure:
+        if character in "([":
+            open_brackets.append(character)
+        elif character in _CLOSING_BRACKETS:
+            if not open_brackets or open_brackets.pop() != _CLOSING_BRACKETS[character]:
+                return f"Unbalanced '{character}'"
+    if open_brackets:
+        return f"Unclosed '{open_brackets[-1]}'"
+
+    if _EMPTY_PREDICATE.search(structure):
+        return "Empty predicate"
+    if structure[0] in _LEADING_OPERATORS:
+        return f"Expression starts with '{structure[0]}'"
+    if structure[-1] in _TRAILING_OPERATORS and structure != "/":
+        return f"Expression ends with '{structure[-1]}'"
+    return None
+
+@lru_cache(maxsize=_XPATH_CACHE_SIZE)
+def get_xpath_error(xpath):
+    """
+    Return a description of the syntax error in 'xpath', or 'None' if it is valid. Only the syntax
+    is checked, so unknown functions or namespace prefixes are left for the browser to reject.
+    """
+
+    if not isinstance(xpath, str):
+        return f"Not a string: {xpath!r}"
+    if etree is None:
+        return _check_without_lxml(xpath)
+    try:
+        etree.XPath(xpath)
+    except etree.XPathSyntaxError as error:
+        return f"{error}"
+    return None
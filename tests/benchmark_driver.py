@@ -0,0 +1,195 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Benchmarks for 'Driver' against 'FakeWebDriver', so no browser or network is needed. Measures
+'Driver.create()' cold, warm and stale, the throughput and round trips of each helper, and the
+overhead of retries. Run with 'src' in 'PYTHONPATH':
+
+> python tests/benchmark_driver.py --output new.json --compare old.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+from fake_webdriver import FakeElement, FakeWebDriver
+
+from selenium_helpers import browser_scripts, service, session
+from selenium_helpers.selenium_helpers import Driver, Settings, _get_default_options
+
+# Changes smaller than this fraction are not reported by '--compare'.
+_COMPARE_THRESHOLD = 0.25
+
+def _handle_script(server, script, args):
+    """Answer the scripts 'Driver' executes, like a browser with a settled page would."""
+
+    if script == browser_scripts.WAIT_UNTIL_SETTLED:
+        return True
+    if script == browser_scripts.WAIT_FOR_XPATH:
+        elements = server.find(args[0])
+        return elements[0] if elements else None
+    if script == browser_scripts.READ_XPATHS:
+        return [elements[0].text if elements else None
+                for elements in map(server.find, args[0])]
+    return None
+
+def _get_settings():
+    """Return settings without delays, so that only the round trips are measured."""
+
+    settings = Settings()
+    settings.change_page_delay = 0
+    settings.click_delay = 0
+    settings.send_keys_delay = 0
+    settings.sleep_time = 0
+    return settings
+
+def _create_server(latency):
+    """Return a started 'FakeWebDriver' with a small page, answering after 'latency' seconds."""
+
+    elements = {
+        "//h1": [FakeElement("Title")],
+        "//a": [FakeElement("Link", href="https://example.com")],
+        "//button": [FakeElement("Button")],
+        "//input": [FakeElement(value="")],
+    }
+    server = FakeWebDriver(elements=elements, latency={"*": latency})
+    server.script_handler = lambda script, args: _handle_script(server, script, args)
+    server.start()
+    return server
+
+def _time_calls(server, function, number):
+    """
+    Call 'function' 'number' times and return the mean time of a call, in seconds, and the mean
+    number of requests it sent to 'server'.
+    """
+
+    requests_before = sum(server.counts.values())
+    start_time = time.perf_counter()
+    for _ in range(number):
+        function()
+    elapsed_time = time.perf_counter() - start_time
+    requests = sum(server.counts.values()) - requests_before
+    return {"seconds": elapsed_time / number, "round_trips": requests / number}
+
+def benchmark_create(server, number):
+    """Return the results of creating drivers with new, reused and stale sessions."""
+
+    os.environ[service.PORT_ENV_KEY] = f"{server.port}"
+    with tempfile.TemporaryDirectory() as directory:
+        session._REGISTRY_FILE_PATH = os.path.join(directory, "sessions.json")
+        session._REGISTRY_FILE_PATH_LOCK = session._REGISTRY_FILE_PATH + ".lock"
+
+        def create_cold():
+            session._remove_session(server.port)
+            Driver.create()
+
+        def create_stale():
+            server.sessions.clear()
+            session._ALIVE_TIMES.clear()
+            Driver.create()
+
+        results = {"create_cold": _time_calls(server, create_cold, number)}
+        results["create_warm"] = _time_calls(server, Driver.create, number)
+        results["create_stale"] = _time_calls(server, create_stale, number)
+    return results
+
+def benchmark_helpers(server, number):
+    """Return the results of calling each helper of 'Driver'."""
+
+    driver = Driver(_get_default_options(), _get_settings(), port=server.port)
+    waiting_driver = Driver(_get_default_options(), _get_settings(), port=server.port)
+    waiting_driver.settings.wait_for_elements = True
+
+    helpers = {
+        "find_by_xpath": lambda: driver.find_by_xpath("//h1"),
+        "find_by_xpath_many": lambda: driver.find_by_xpath("//a", many=True),
+        "read_text_by_xpath": lambda: driver.read_text_by_xpath("//h1"),
+        "read_attribute_by_xpath": lambda: driver.read_attribute_by_xpath("//a", "href"),
+        "read_texts_by_xpaths": lambda: driver.read_texts_by_xpaths(["//h1", "//a", "//button"]),
+        "click_by_xpath": lambda: driver.click_by_xpath("//button"),
+        "send_keys_by_xpath": lambda: driver.send_keys_by_xpath("//input", "keys"),
+        "wait_for_xpath": lambda: driver.wait_for_xpath("//h1", 1),
+        "find_by_xpath_waiting": lambda: waiting_driver.find_by_xpath("//h1"),
+    }
+
+    def open_url():
+        with driver.open_url("https://example.com/a", go_back=False, refresh=True):
+            pass
+    helpers["open_url"] = open_url
+
+    return {name: _time_calls(server, helper, number) for name, helper in helpers.items()}
+
+def benchmark_retries(server, number):
+    """Return the results of reading a text when the first try of each read fails."""
+
+    driver = Driver(_get_default_options(), _get_settings(), port=server.port)
+
+    def read_after_failure():
+        server.failures["getElementText"] = 1
+        driver.read_text_by_xpath("//h1")
+
+    return {"read_text_by_xpath_one_retry": _time_calls(server, read_after_failure, number)}
+
+def run(latency, number):
+    """Run all benchmarks and return the results as a dict."""
+
+    server = _create_server(latency)
+    try:
+        results = {}
+        results.update(benchmark_create(server, number))
+        results.update(benchmark_helpers(server, number))
+        results.update(benchmark_retries(server, number))
+    finally:
+        server.stop()
+    return {"latency": latency, "number": number, "results": results}
+
+def compare(old, new):
+    """Return lines describing the changes between the results 'old' and 'new'."""
+
+    lines = []
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            lines.append(f"{name}: new")
+            continue
+        old_result = old["results"][name]
+        if result["round_trips"] != old_result["round_trips"]:
+            lines.append(f"{name}: round trips {old_result['round_trips']:.2f} -> "
+                         f"{result['round_trips']:.2f}")
+        change = (result["seconds"] - old_result["seconds"]) / old_result["seconds"]
+        if abs(change) >= _COMPARE_THRESHOLD:
+            lines.append(f"{name}: {old_result['seconds'] * 1000:.3f} ms -> "
+                         f"{result['seconds'] * 1000:.3f} ms ({change:+.0%})")
+    return lines
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.001,
+                        help="Seconds the fake server takes to answer each command")
+    parser.add_argument("--number", type=int, default=100, help="Calls per benchmark")
+    parser.add_argument("--output", help="Save the results as JSON to this file")
+    parser.add_argument("--compare", help="Compare the results to a saved JSON file")
+    args = parser.parse_args()
+
+    results = run(args.latency, args.number)
+    for name, result in results["results"].items():
+        print(f"{name:32} {result['seconds'] * 1000:9.3f} ms {result['round_trips']:6.2f} "
+              f"round trips")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=4, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare, "r") as compare_file:
+            lines = compare(json.load(compare_file), results)
+        print("\n".join(lines) if lines else "No changes")
+
+if __name__ == "__main__":
+    sys.exit(main())
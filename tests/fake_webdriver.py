@@ -0,0 +1,295 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""
+Script has class 'FakeWebDriver', an in-process stand-in for 'chromedriver' that speaks the W3C
+WebDriver protocol over HTTP, for tests and benchmarks that can not run a browser.
+"""
+
+import re
+import json
+import time
+import uuid
+import threading
+import http.server
+from collections import Counter
+
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+
+# Routes as ('method', 'path regex', 'Command' name). Commands not listed answer with 'null'.
+_ROUTES = [
+    ("GET", r"/status", "status"),
+    ("POST", r"/session", "newSession"),
+    ("DELETE", r"/session/[^/]+", "quit"),
+    ("GET", r"/session/[^/]+/url", "getCurrentUrl"),
+    ("POST", r"/session/[^/]+/url", "get"),
+    ("GET", r"/session/[^/]+/source", "getPageSource"),
+    ("POST", r"/session/[^/]+/timeouts", "setTimeouts"),
+    ("GET", r"/session/[^/]+/window", "w3cGetCurrentWindowHandle"),
+    ("POST", r"/session/[^/]+/window", "switchToWindow"),
+    ("DELETE", r"/session/[^/]+/window", "closeWindow"),
+    ("GET", r"/session/[^/]+/window/handles", "w3cGetWindowHandles"),
+    ("POST", r"/session/[^/]+/element", "findElement"),
+    ("POST", r"/session/[^/]+/elements", "findElements"),
+    ("POST", r"/session/[^/]+/element/[^/]+/element", "findChildElement"),
+    ("POST", r"/session/[^/]+/element/[^/]+/elements", "findChildElements"),
+    ("GET", r"/session/[^/]+/element/[^/]+/text", "getElementText"),
+    ("GET", r"/session/[^/]+/element/[^/]+/attribute/[^/]+", "getElementAttribute"),
+    ("GET", r"/session/[^/]+/element/[^/]+/property/[^/]+", "getElementProperty"),
+    ("POST", r"/session/[^/]+/element/[^/]+/click", "clickElement"),
+    ("POST", r"/session/[^/]+/element/[^/]+/clear", "clearElement"),
+    ("POST", r"/session/[^/]+/element/[^/]+/value", "sendKeysToElement"),
+    ("POST", r"/session/[^/]+/execute/sync", "w3cExecuteScript"),
+    ("POST", r"/session/[^/]+/execute/async", "w3cExecuteScriptAsync"),
+    ("POST", r"/session/[^/]+/goog/cdp/execute", "executeCdpCommand"),
+    ("POST", r"/session/[^/]+/log", "getLog"),
+    ("POST", r"/session/[^/]+/alert/accept", "w3cAcceptAlert"),
+    ("POST", r"/session/[^/]+/alert/dismiss", "w3cDismissAlert"),
+]
+_ROUTES = [(method, re.compile(f"^{path}$"), command) for method, path, command in _ROUTES]
+
+class FakeElement:
+    """An element of the fake page, with 'text' and 'attributes'."""
+
+    def __init__(self, text="", **attributes):
+        """Initialize 'FakeElement'."""
+
+        self.id = uuid.uuid4().hex
+        self.text = text
+        self.attributes = attributes
+
+class FakeWebDriver:
+    """
+    In-process WebDriver server. The page is 'elements', a dict of lists of 'FakeElement' by xpath;
+    relative xpaths are looked up the same way. Scripts are answered by 'script_handler(script,
+    args)', which returns the value of the script.
+
+    'latency' maps 'Command' names to seconds to sleep before answering, with the key '*' for the
+    other commands, and 'failures' maps them to the number of next requests that fail with
+    'unknown error'. 'counts' has the number of requests by command.
+
+    Can be used like this:
+    > with FakeWebDriver(latency={"findElement": 0.001}) as server:
+    >     driver = Driver(options, Settings(), port=server.port)
+    """
+
+    def __init__(self, elements=None, latency=None, failures=None, script_handler=None):
+        """Initialize 'FakeWebDriver'."""
+
+        self.elements = elements if elements is not None else {}
+        self.latency = latency if latency is not None else {}
+        self.failures = failures if failures is not None else {}
+        self.script_handler = script_handler
+        self.counts = Counter()
+        self.url = "about:blank"
+        self.page_source = "<html><head></head><body></body></html>"
+        self.sessions = set()
+        # Handles of the open windows, and the current one. 'open_window()' opens more.
+        self.windows = ["main"]
+        self.window = "main"
+        # Pairs of DevTools protocol command and its parameters, in the order received.
+        self.cdp_commands = []
+        # Xpaths the browser rejects as invalid selectors, although their syntax is valid.
+        self.invalid_xpaths = set()
+        # Entries of the performance log not read yet, and the bodies of the responses by request
+        # id, for 'Network.getResponseBody'.
+        self.performance_log = []
+        self.response_bodies = {}
+        self._lock = threading.Lock()
+
+        fake = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                fake._handle(self, "GET")
+
+            def do_POST(self):
+                fake._handle(self, "POST")
+
+            def do_DELETE(self):
+                fake._handle(self, "DELETE")
+
+            def log_message(self, *args):
+                pass
+
+        class Server(http.server.ThreadingHTTPServer):
+            # Many clients can connect at once, and connections over the backlog wait a second.
+            request_queue_size = 64
+
+        self._server = Server(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        """Start serving in a background thread."""
+
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.01,),
+                                        daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving."""
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    def open_window(self):
+        """Open a window, without switching to it, and return its handle."""
+
+        handle = uuid.uuid4().hex
+        self.windows.append(handle)
+        return handle
+
+    def find(self, xpath):
+        """Return the elements matching 'xpath'."""
+
+        return self.elements.get(xpath, [])
+
+    def _get_element(self, element_id):
+        """Return the element with 'element_id', or 'None'."""
+
+        for elements in self.elements.values():
+            for element in elements:
+                if element.id == element_id:
+                    return element
+        return None
+
+    def _handle(self, request, method):
+        """Answer 'request'."""
+
+        length = int(request.headers.get("Content-Length") or 0)
+        body = request.rfile.read(length) if length else b""
+        params = json.loads(body) if body else {}
+        path = request.path.split("?")[0].rstrip("/")
+        parts = path.split("/")
+
+        command = None
+        for route_method, pattern, route_command in _ROUTES:
+            if route_method == method and pattern.match(path):
+                command = route_command
+                break
+
+        with self._lock:
+            self.counts[command] += 1
+            failing = self.failures.get(command, 0) > 0
+            if failing:
+                self.failures[command] -= 1
+
+        latency = self.latency.get(command, self.latency.get("*"))
+        if latency:
+            time.sleep(latency)
+
+        if failing:
+            status, value = 500, {"error": "unknown error", "message": "Injected failure"}
+        else:
+            status, value = self._answer(command, parts, params)
+
+        data = json.dumps({"value": value}).encode("UTF-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json; charset=utf-8")
+        request.send_header("Content-Length", str(len(data)))
+        request.end_headers()
+        request.wfile.write(data)
+
+    def _answer(self, command, parts, params):
+        """Return the status code and the value of the response to 'command'."""
+
+        if command == "status":
+            return 200, {"ready": True, "message": "ready"}
+        if command == "newSession":
+            session_id = uuid.uuid4().hex
+            self.sessions.add(session_id)
+            return 200, {"sessionId": session_id, "capabilities": {"browserName": "fake"}}
+
+        if command is not None and parts[2] not in self.sessions:
+            return 404, {"error": "invalid session id", "message": "Unknown session"}
+
+        if command == "quit":
+            self.sessions.discard(parts[2])
+        elif command == "getCurrentUrl":
+            return 200, self.url
+        elif command == "get":
+            self.url = params["url"]
+        elif command == "getPageSource":
+            return 200, self.page_source
+        elif command == "w3cGetCurrentWindowHandle":
+            return 200, self.window
+        elif command == "w3cGetWindowHandles":
+            return 200, list(self.windows)
+        elif command == "switchToWindow":
+            if params["handle"] not in self.windows:
+                return 404, {"error": "no such window", "message": params["handle"]}
+            self.window = params["handle"]
+        elif command == "closeWindow":
+            self.windows.remove(self.window)
+            return 200, list(self.windows)
+        elif command in ("w3cAcceptAlert", "w3cDismissAlert"):
+            return 404, {"error": "no such alert", "message": "No alert is open"}
+        elif command == "executeCdpCommand":
+            self.cdp_commands.append((params["cmd"], params["params"]))
+            if params["cmd"] == "Network.getResponseBody":
+                request_id = params["params"]["requestId"]
+                if request_id not in self.response_bodies:
+                    return 500, {"error": "unknown error",
+                                 "message": "No resource with given identifier found"}
+                return 200, self.response_bodies[request_id]
+            return 200, {}
+        elif command == "getLog":
+            if params["type"] != "performance":
+                return 400, {"error": "invalid argument", "message": params["type"]}
+            entries, self.performance_log = self.performance_log, []
+            return 200, entries
+        elif command in ("findElement", "findChildElement", "findElements", "findChildElements") \
+                and params["value"] in self.invalid_xpaths:
+            return 400, {"error": "invalid selector", "message": params["value"]}
+        elif command in ("findElement", "findChildElement"):
+            elements = self.find(params["value"])
+            if not elements:
+                return 404, {"error": "no such element", "message": params["value"]}
+            return 200, {ELEMENT_KEY: elements[0].id}
+        elif command in ("findElements", "findChildElements"):
+            return 200, [{ELEMENT_KEY: element.id} for element in self.find(params["value"])]
+        elif command and command.startswith(("getElement", "clickElement", "clearElement",
+                                             "sendKeysToElement")):
+            element = self._get_element(parts[4])
+            if element is None:
+                return 404, {"error": "stale element reference", "message": parts[4]}
+            if command == "getElementText":
+                return 200, element.text
+            if command in ("getElementAttribute", "getElementProperty"):
+                return 200, element.attributes.get(parts[6])
+            if command == "clearElement":
+                element.attributes["value"] = ""
+            if command == "sendKeysToElement":
+                element.attributes["value"] = element.attributes.get("value", "") + params["text"]
+        elif command in ("w3cExecuteScript", "w3cExecuteScriptAsync"):
+            args = [self._get_element(arg[ELEMENT_KEY]) if isinstance(arg, dict) and
+                    ELEMENT_KEY in arg else arg for arg in params["args"]]
+            for arg, element in zip(params["args"], args):
+                if isinstance(arg, dict) and ELEMENT_KEY in arg and element is None:
+                    return 404, {"error": "stale element reference", "message": arg[ELEMENT_KEY]}
+            # Selenium runs 'get_attribute()' as a script with the element and the name.
+            if params["script"].endswith(").apply(null, arguments);") and len(args) == 2 and \
+               isinstance(args[0], FakeElement):
+                return 200, args[0].attributes.get(args[1])
+            if self.script_handler is None:
+                return 200, None
+            value = self.script_handler(params["script"], args)
+            if isinstance(value, FakeElement):
+                value = {ELEMENT_KEY: value.id}
+            return 200, value
+        return 200, None
@@ -0,0 +1,117 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for 'AsyncDriver' against 'FakeWebDriver'."""
+
+import time
+import asyncio
+
+import pytest
+
+from fake_webdriver import FakeElement, FakeWebDriver
+
+from selenium_helpers.async_driver import AsyncDriver
+from selenium_helpers.metrics import Metrics
+from selenium_helpers.selenium_helpers import (InvalidXPath, NoAlertPresentException, Settings,
+                                               _get_default_options)
+
+def get_settings():
+    settings = Settings()
+    settings.change_page_delay = 0
+    settings.click_delay = 0
+    settings.send_keys_delay = 0
+    settings.wait_for_settle = False
+    settings.sleep_time = 0
+    settings.try_times = 3
+    return settings
+
+def test_helpers():
+    elements = {"//h1": [FakeElement("Title")], "//input": [FakeElement(value="")]}
+
+    async def run(port):
+        driver = await AsyncDriver.start(_get_default_options(), get_settings(), port=port)
+        async with driver.open_url("https://example.com", go_back=False):
+            assert await driver.read_text_by_xpath("//h1") == "Title"
+            await driver.send_keys_by_xpath("//input", "keys")
+            assert await driver.read_attribute_by_xpath("//input", "value") == "keys"
+            await driver.click_by_xpath("//h1")
+            with pytest.raises(NoAlertPresentException):
+                await driver.accept_alert()
+        await driver.quit()
+
+    with FakeWebDriver(elements=elements, failures={"getElementText": 1}) as server:
+        asyncio.run(run(server.port))
+        assert server.url == "https://example.com"
+        assert server.counts["getElementText"] == 2
+        assert server.counts["clickElement"] == 1
+        assert not server.sessions
+
+def test_many_sessions_in_one_event_loop():
+    async def read_title(port):
+        driver = await AsyncDriver.start(_get_default_options(), get_settings(), port=port)
+        try:
+            return await driver.read_text_by_xpath("//h1")
+        finally:
+            await driver.quit()
+
+    async def run(port):
+        return await asyncio.gather(*(read_title(port) for _ in range(10)))
+
+    elements = {"//h1": [FakeElement("Title")]}
+    with FakeWebDriver(elements=elements, latency={"getElementText": 0.1}) as server:
+        start_time = time.monotonic()
+        assert asyncio.run(run(server.port)) == ["Title"] * 10
+        # The slow reads wait for the server concurrently.
+        assert time.monotonic() - start_time < 0.5
+        assert server.counts["newSession"] == 10
+
+def test_invalid_selector_is_not_retried():
+    async def run(port):
+        driver = await AsyncDriver.start(_get_default_options(), get_settings(), port=port)
+        with pytest.raises(InvalidXPath):
+            await driver.find_by_xpath("//a[unknown()]")
+        await driver.quit()
+
+    with FakeWebDriver() as server:
+        server.invalid_xpaths.add("//a[unknown()]")
+        asyncio.run(run(server.port))
+        assert server.counts["findElement"] == 1
+
+def test_metrics_use_command_names():
+    settings = get_settings()
+    settings.metrics = Metrics()
+    elements = {"//h1": [FakeElement("Title")], "//li": [FakeElement("A"), FakeElement("B")]}
+
+    async def run(port):
+        driver = await AsyncDriver.start(_get_default_options(), settings, port=port)
+        assert await driver.read_text_by_xpath("//h1") == "Title"
+        for item in await driver.find_elements_by_xpath("//li"):
+            await item.text()
+        await driver.quit()
+
+    with FakeWebDriver(elements=elements) as server:
+        asyncio.run(run(server.port))
+    # The same names as 'Driver' records, without element ids.
+    assert set(settings.metrics.commands) == {"getCurrentUrl", "findElement", "findElements",
+                                              "getElementText"}
+    assert settings.metrics.commands["getElementText"].count == 3
+
+def test_script_timeout_is_only_raised():
+    def handle_script(script, args):
+        return server.find(args[0])[0]
+
+    async def run(port):
+        driver = await AsyncDriver.start(_get_default_options(), get_settings(), port=port)
+        await driver.wait_for_xpath("//h1", 1)
+        assert server.counts["setTimeouts"] == 0
+        await driver.wait_for_xpath("//h1", 40)
+        await driver.wait_for_xpath("//h1", 1)
+        assert server.counts["setTimeouts"] == 1
+        await driver.quit()
+
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]},
+                       script_handler=handle_script) as server:
+        asyncio.run(run(server.port))
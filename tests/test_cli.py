@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for the command line interface in 'cli'."""
+
+import io
+import os
+import json
+import tempfile
+
+from fake_webdriver import FakeElement, FakeWebDriver
+
+from selenium_helpers import browser_scripts, cli
+
+def write_task_file(directory, spec):
+    task_file_path = os.path.join(directory, "tasks.json")
+    with open(task_file_path, "w") as task_file:
+        json.dump(spec, task_file)
+    return task_file_path
+
+def test_load_tasks():
+    with tempfile.TemporaryDirectory() as directory:
+        spec = {"fields": {"title": "//h1"},
+                "urls": ["https://example.com/a", {"url": "https://example.com/b", "fields": {}}]}
+        tasks = cli.load_tasks(write_task_file(directory, spec))
+        assert tasks == [
+            {"index": 0, "url": "https://example.com/a", "fields": {"title": "//h1"},
+             "records": None},
+            {"index": 1, "url": "https://example.com/b", "fields": {}, "records": None},
+        ]
+
+def test_run():
+    def handle_script(script, args):
+        if script == browser_scripts.READ_XPATHS:
+            return [elements[0].text if elements else None
+                    for elements in map(server.find, args[0])]
+        return True
+
+    elements = {"//h1": [FakeElement("Title")]}
+    with FakeWebDriver(elements=elements, script_handler=handle_script,
+                       failures={"get": 1}) as server:
+        tasks = [{"index": index, "url": f"https://example.com/{index}",
+                  "fields": ["//h1", "//h2"], "records": None} for index in range(3)]
+        output = io.StringIO()
+        failed = cli.run(tasks, output, workers=1, first_port=server.port, start_service=False,
+                         progress=None)
+        results = [json.loads(line) for line in output.getvalue().splitlines()]
+        assert failed == 0
+        # The task that failed to open its url was retried.
+        assert server.counts["get"] == 4
+        assert sorted(result["index"] for result in results) == [0, 1, 2]
+        assert all(result["fields"] == ["Title", None] for result in results)
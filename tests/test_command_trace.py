@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for recording and replaying traces with 'command_trace'."""
+
+import os
+import tempfile
+
+import pytest
+
+from fake_webdriver import FakeElement, FakeWebDriver
+
+from selenium_helpers import command_trace
+from selenium_helpers.selenium_helpers import Driver, Settings, _get_default_options
+
+def get_settings():
+    settings = Settings()
+    settings.wait_for_settle = False
+    settings.change_page_delay = 0
+    settings.click_delay = 0
+    settings.sleep_time = 0
+    settings.try_times = 3
+    return settings
+
+def run_flow(driver):
+    driver.get("https://example.com")
+    driver.click_by_xpath("//button")
+    return driver.read_text_by_xpath("//h1")
+
+def test_record_and_replay():
+    elements = {"//h1": [FakeElement("Title")], "//button": [FakeElement("OK")]}
+    with tempfile.TemporaryDirectory() as directory:
+        trace_path = os.path.join(directory, "trace.jsonl")
+        settings = get_settings()
+        settings.trace_path = trace_path
+        with FakeWebDriver(elements=elements, failures={"getElementText": 1}) as server:
+            driver = Driver(_get_default_options(), settings, port=server.port)
+            assert run_flow(driver) == "Title"
+            driver.quit()
+            recorded_count = sum(server.counts.values())
+
+        records = command_trace.read_trace(trace_path)
+        assert len(records) == recorded_count
+        assert records[0]["command"] == "newSession"
+        assert all("sessionId" not in record["params"] for record in records)
+
+        # The failed command is replayed too, so the retry happens again.
+        driver = Driver.replay(trace_path, get_settings())
+        assert run_flow(driver) == "Title"
+        driver.quit()
+        assert driver.command_executor.remaining == 0
+
+        driver = Driver.replay(trace_path, get_settings())
+        driver.get("https://example.com")
+        with pytest.raises(command_trace.TraceMismatch):
+            driver.read_text_by_xpath("//h1")
+
+def test_replay_reattached_session():
+    with tempfile.TemporaryDirectory() as directory:
+        trace_path = os.path.join(directory, "trace.jsonl")
+        settings = get_settings()
+        settings.trace_path = trace_path
+        with FakeWebDriver(elements={"//h1": [FakeElement("Title")]}) as server:
+            session_id = Driver(_get_default_options(), get_settings(), port=server.port).session_id
+            driver = Driver(_get_default_options(), settings, port=server.port,
+                            session_id=session_id, verify=False)
+            assert driver.read_text_by_xpath("//h1") == "Title"
+
+        assert command_trace.read_trace(trace_path)[0]["command"] == "newSession"
+        driver = Driver.replay(trace_path, get_settings())
+        assert driver.session_id == session_id
+        assert driver.read_text_by_xpath("//h1") == "Title"
+        assert driver.command_executor.remaining == 0
@@ -0,0 +1,51 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for 'PooledConnection' against 'FakeWebDriver'."""
+
+import time
+
+import pytest
+
+from fake_webdriver import FakeElement, FakeWebDriver
+
+from selenium_helpers.selenium_helpers import (Driver, Settings, TimeoutException,
+                                               _get_default_options)
+
+def get_settings():
+    settings = Settings()
+    settings.sleep_time = 0
+    settings.try_times = 0
+    return settings
+
+def test_command_stats():
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]},
+                       latency={"findElement": 0.02}) as server:
+        driver = Driver(_get_default_options(), get_settings(), port=server.port)
+        driver.find_by_xpath("//h1")
+        driver.find_by_xpath("//h1")
+
+        stats = driver.command_executor.get_command_stats()
+        assert stats["findElement"]["count"] == 2
+        assert stats["findElement"]["mean_time"] >= 0.02
+        assert stats["findElement"]["max_time"] >= stats["findElement"]["mean_time"]
+        assert stats["newSession"]["count"] == 1
+
+def test_command_timeouts():
+    settings = get_settings()
+    settings.command_timeouts = {"findElement": 0.1}
+    settings.try_times = 1
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]},
+                       latency={"findElement": 1}) as server:
+        driver = Driver(_get_default_options(), settings, port=server.port)
+        start_time = time.monotonic()
+        # A command without a response in time fails like other commands, so it is retried.
+        with pytest.raises(TimeoutException):
+            driver.find_by_xpath("//h1")
+        assert time.monotonic() - start_time < 1
+        assert server.counts["findElement"] == 2
+        # Other commands use 'read_timeout', no limit by default.
+        assert driver.current_url == "about:blank"
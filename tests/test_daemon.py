@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for leasing sessions from 'SessionDaemon'."""
+
+import os
+import socket
+import tempfile
+import threading
+
+import pytest
+
+from fake_webdriver import FakeElement, FakeWebDriver
+
+from selenium_helpers.daemon import DaemonError, SessionDaemon, get_daemon_stats, lease_driver
+from selenium_helpers.selenium_helpers import PROFILES
+
+def test_lease_and_release():
+    elements = {"//h1": [FakeElement("Title")]}
+    with FakeWebDriver(elements=elements) as server, tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "daemon.sock")
+        with SessionDaemon(socket_path, size=1, spares=1, first_port=server.port,
+                           start_service=False) as daemon:
+            thread = threading.Thread(target=daemon.serve_forever)
+            thread.start()
+            try:
+                with lease_driver(socket_path, timeout=5) as driver:
+                    session_id = driver.session_id
+                    assert driver.read_text_by_xpath("//h1") == "Title"
+                    # The only session is leased.
+                    with pytest.raises(DaemonError):
+                        with lease_driver(socket_path, timeout=0.1):
+                            pass
+
+                with lease_driver(socket_path, timeout=5) as driver:
+                    assert driver.session_id == session_id
+                assert server.counts["newSession"] == 1
+                assert get_daemon_stats(socket_path)["checkouts"] == 2
+            finally:
+                daemon.shutdown()
+                thread.join()
+        assert not os.path.exists(socket_path)
+
+def test_socket_of_running_daemon_is_kept():
+    with FakeWebDriver() as server, tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "daemon.sock")
+        # A socket left by a daemon that is no longer running is replaced.
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale_socket:
+            stale_socket.bind(socket_path)
+
+        with SessionDaemon(socket_path, size=1, spares=0, first_port=server.port,
+                           start_service=False) as daemon:
+            thread = threading.Thread(target=daemon.serve_forever)
+            thread.start()
+            try:
+                with pytest.raises(DaemonError):
+                    SessionDaemon(socket_path, size=1, spares=0, first_port=server.port,
+                                  start_service=False)
+                assert get_daemon_stats(socket_path)["checkouts"] == 0
+            finally:
+                daemon.shutdown()
+                thread.join()
+
+def test_released_session_is_reset():
+    with FakeWebDriver() as server, tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "daemon.sock")
+        with SessionDaemon(socket_path, size=1, spares=0, first_port=server.port,
+                           start_service=False) as daemon:
+            thread = threading.Thread(target=daemon.serve_forever)
+            thread.start()
+            try:
+                with lease_driver(socket_path, timeout=5):
+                    pass
+                assert server.cdp_commands == [("Page.navigate", {"url": "about:blank"}),
+                                               ("Network.clearBrowserCookies", {})]
+            finally:
+                daemon.shutdown()
+                thread.join()
+
+def test_lease_has_profile_of_daemon():
+    with FakeWebDriver() as server, tempfile.TemporaryDirectory() as directory:
+        socket_path = os.path.join(directory, "daemon.sock")
+        with SessionDaemon(socket_path, size=1, spares=0, first_port=server.port,
+                           start_service=False, profile="throughput") as daemon:
+            thread = threading.Thread(target=daemon.serve_forever)
+            thread.start()
+            try:
+                with lease_driver(socket_path, timeout=5) as driver:
+                    assert driver._options.capabilities["pageLoadStrategy"] == "eager"
+                    assert driver.settings.blocked_urls == PROFILES["throughput"]["blocked_urls"]
+            finally:
+                daemon.shutdown()
+                thread.join()
@@ -0,0 +1,509 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for 'Driver' against 'FakeWebDriver'."""
+
+import os
+import json
+import base64
+
+import pytest
+
+from fake_webdriver import FakeElement, FakeWebDriver
+
+from selenium_helpers import browser_scripts, service, session
+from selenium_helpers.metrics import Metrics
+from selenium_helpers.selenium_helpers import (PROFILES, Driver, InvalidXPath,
+                                               NoSuchElementException, Settings,
+                                               TimeoutException, WebDriverException,
+                                               _get_default_options)
+
+def get_settings():
+    settings = Settings()
+    settings.change_page_delay = 0
+    settings.click_delay = 0
+    settings.send_keys_delay = 0
+    settings.sleep_time = 0
+    settings.try_times = 3
+    return settings
+
+def create_driver(server, settings=None):
+    return Driver(_get_default_options(), settings or get_settings(), port=server.port)
+
+def test_read_text_by_xpath():
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]}) as server:
+        driver = create_driver(server)
+        assert driver.read_text_by_xpath("//h1") == "Title"
+        assert server.counts["findElement"] == 1
+        assert server.counts["getElementText"] == 1
+
+def test_nested_retries_are_not_multiplied():
+    with FakeWebDriver() as server:
+        driver = create_driver(server)
+        try:
+            driver.click_by_xpath("//missing")
+        except WebDriverException:
+            pass
+        else:
+            raise AssertionError("Clicked a missing element")
+        assert server.counts["findElement"] == 4
+
+def test_read_texts_by_xpaths_in_one_round_trip():
+    def handle_script(script, args):
+        assert script == browser_scripts.READ_XPATHS
+        return ["Title", None]
+
+    with FakeWebDriver(script_handler=handle_script) as server:
+        driver = create_driver(server)
+        texts = driver.read_texts_by_xpaths({"title": "//h1", "missing": "//p"})
+        assert texts == {"title": "Title", "missing": None}
+        assert server.counts["w3cExecuteScript"] == 1
+
+def test_metrics():
+    settings = get_settings()
+    settings.metrics = Metrics()
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]},
+                       failures={"getElementText": 1}) as server:
+        driver = create_driver(server, settings)
+        assert driver.read_text_by_xpath("//h1") == "Title"
+        assert settings.metrics.commands["getElementText"].count == 2
+        assert settings.metrics.command_errors["getElementText"] == 1
+        assert settings.metrics.retries == {"WebDriverException": 1}
+
+def test_snapshot():
+    pytest.importorskip("lxml")
+    with FakeWebDriver() as server:
+        server.page_source = """
+            <html><body>
+                <h1>Title</h1>
+                <table><tr><td> A </td><td><a href="/b">B</a></td></tr></table>
+            </body></html>"""
+        driver = create_driver(server)
+        with driver.snapshot():
+            assert driver.read_text_by_xpath("//h1") == "Title"
+            row = driver.find_by_xpath("//tr")
+            assert driver.read_text_by_xpath("./td[1]", root_element=row) == "A"
+            assert driver.read_attribute_by_xpath("//a", "href") == "/b"
+            assert len(driver.find_by_xpath("//td", many=True)) == 2
+            with pytest.raises(NoSuchElementException):
+                driver.find_by_xpath("//p")
+            with pytest.raises(InvalidXPath):
+                driver.find_by_xpath("//td[")
+        assert server.counts["getPageSource"] == 1
+        assert server.counts["findElement"] == 0
+
+def test_element_cache():
+    settings = get_settings()
+    settings.element_cache_size = 10
+    settings.metrics = Metrics()
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]}) as server:
+        driver = create_driver(server, settings)
+        assert driver.read_text_by_xpath("//h1") == "Title"
+        assert driver.read_text_by_xpath("//h1") == "Title"
+        assert server.counts["findElement"] == 1
+        assert driver.element_cache.stats()["hits"] == 1
+
+        # The cached element goes stale when the page re-renders.
+        server.elements["//h1"] = [FakeElement("New title")]
+        assert driver.read_text_by_xpath("//h1") == "New title"
+        assert server.counts["findElement"] == 2
+        # It is found again right away, without retrying the read.
+        assert not settings.metrics.retries
+
+        driver.get("https://example.com")
+        driver.find_by_xpath("//h1")
+        assert server.counts["findElement"] == 3
+
+def test_self_healing_elements():
+    settings = get_settings()
+    settings.self_healing_elements = True
+    settings.try_times = 0
+    elements = {"//h1": [FakeElement("Title")], "//li": [FakeElement("A"), FakeElement("B")]}
+    with FakeWebDriver(elements=elements) as server:
+        driver = create_driver(server, settings)
+        element = driver.find_by_xpath("//h1")
+        items = driver.find_by_xpath("//li", many=True)
+
+        # The page re-renders, so the found elements go stale.
+        server.elements = {"//h1": [FakeElement("New title")], "(//li)[2]": [FakeElement("New B")]}
+        assert element.text == "New title"
+        assert items[1].text == "New B"
+        assert server.counts["getElementText"] == 4
+
+def test_self_healing_script_arguments():
+    settings = get_settings()
+    settings.self_healing_elements = True
+    settings.try_times = 0
+
+    def handle_script(script, args):
+        return args[0].text
+
+    with FakeWebDriver(elements={"//input": [FakeElement("Old", value="1")]},
+                       script_handler=handle_script) as server:
+        driver = create_driver(server, settings)
+        element = driver.find_by_xpath("//input")
+
+        # Attributes are read with a script that takes the element as an argument.
+        server.elements = {"//input": [FakeElement("New", value="2")]}
+        assert element.get_attribute("value") == "2"
+        assert driver.read_attribute_by_xpath("//input", "value") == "2"
+
+        server.elements = {"//input": [FakeElement("Newest")]}
+        assert driver.execute_script("return arguments[0].textContent", element) == "Newest"
+        server.elements = {"//input": [FakeElement("Shown")]}
+        assert element.is_displayed()
+        assert server.counts["findElement"] == 5
+
+def test_fill_form():
+    def handle_script(script, args):
+        if script == browser_scripts.WAIT_UNTIL_SETTLED:
+            return True
+        assert script == browser_scripts.FILL_FORM
+        # Values are passed as arguments, never written into the script.
+        assert args[0] == [["//input[1]", "it's \"quoted\""], ["//input[2]", "42"],
+                           ["//input[3]", True], ["//input[4]", "x"]]
+        return [{"found": True, "editable": True, "accepted": True},
+                {"found": True, "editable": True, "accepted": False},
+                {"found": True, "editable": True, "accepted": True},
+                {"found": False, "editable": False, "accepted": False}]
+
+    elements = {"//input[2]": [FakeElement(value="")]}
+    with FakeWebDriver(elements=elements, script_handler=handle_script) as server:
+        driver = create_driver(server)
+        fields = {"//input[1]": "it's \"quoted\"", "//input[2]": 42, "//input[3]": True,
+                  "//input[4]": "x"}
+        assert driver.fill_form(fields) == {"//input[1]": True, "//input[2]": False,
+                                            "//input[3]": True, "//input[4]": False}
+        assert server.counts["w3cExecuteScript"] == 1
+
+        # Only the field that rejected its value is typed into, not the one that was not found.
+        assert driver.fill_form(fields, verified=True) == {"//input[1]": True, "//input[2]": True,
+                                                           "//input[3]": True, "//input[4]": False}
+        assert server.counts["sendKeysToElement"] == 1
+        assert server.counts["findElement"] == 1
+        assert server.elements["//input[2]"][0].attributes["value"] == "42"
+
+def test_throughput_profile():
+    capabilities = _get_default_options("throughput").to_capabilities()
+    assert capabilities["pageLoadStrategy"] == "eager"
+    assert "--headless" in capabilities["goog:chromeOptions"]["args"]
+    with pytest.raises(ValueError):
+        _get_default_options("unknown")
+
+def test_open_url_blocks_urls():
+    settings = get_settings()
+    settings.wait_for_settle = False
+    settings.blocked_urls = PROFILES["throughput"]["blocked_urls"]
+    with FakeWebDriver() as server:
+        driver = create_driver(server, settings)
+        with driver.open_url("https://example.com/a"):
+            pass
+        with driver.open_url("https://example.com/b"):
+            pass
+        assert server.cdp_commands == [("Network.enable", {}),
+                                       ("Network.setBlockedURLs",
+                                        {"urls": settings.blocked_urls})]
+
+        with driver.open_url("https://example.com/c", blocked_urls=["*.png"]):
+            pass
+        assert server.cdp_commands[-1] == ("Network.setBlockedURLs", {"urls": ["*.png"]})
+
+def test_map_urls():
+    settings = get_settings()
+    settings.wait_for_settle = False
+    # Number of checks until the page of each url has loaded.
+    load_checks = {"a": 3, "b": 1, "c": 1}
+    urls_by_window = {}
+
+    def handle_script(script, args):
+        if script == browser_scripts.OPEN_TAB:
+            server.open_window()
+        elif script == browser_scripts.NAVIGATE:
+            urls_by_window[server.window] = args[0]
+        elif script == browser_scripts.IS_LOADED:
+            url = urls_by_window[server.window]
+            load_checks[url] -= 1
+            return load_checks[url] <= 0
+        return None
+
+    with FakeWebDriver(script_handler=handle_script) as server:
+        driver = create_driver(server, settings)
+        results = list(driver.map_urls(["a", "b", "c"], lambda _: urls_by_window[server.window],
+                                       max_tabs=2))
+        assert results == [("b", "b"), ("c", "c"), ("a", "a")]
+        assert server.windows == ["main"]
+        assert server.window == "main"
+        assert driver.pages_visited == 3
+
+        def fail(_):
+            raise WebDriverException("Extraction failed")
+
+        # The tab of a failed extraction is closed too.
+        load_checks.update({"d": 1})
+        with pytest.raises(WebDriverException):
+            list(driver.map_urls(["d"], fail))
+        assert server.windows == ["main"]
+        assert server.window == "main"
+
+def test_map_urls_on_reused_session():
+    settings = get_settings()
+    settings.wait_for_settle = False
+    ready_states = []
+
+    def handle_script(script, args):
+        if script == browser_scripts.OPEN_TAB:
+            server.open_window()
+        elif script == browser_scripts.IS_LOADED:
+            ready_states.append(args[0])
+            return True
+        return None
+
+    with FakeWebDriver(script_handler=handle_script) as server:
+        session_id = create_driver(server, settings).session_id
+        driver = Driver(_get_default_options("throughput"), settings, port=server.port,
+                        session_id=session_id)
+        assert driver.capabilities is None
+        assert list(driver.map_urls(["a"], lambda _: "result")) == [("a", "result")]
+        assert ready_states == [["complete", "interactive"]]
+
+def test_recycle_after_pages():
+    settings = get_settings()
+    settings.wait_for_settle = False
+    settings.recycle_after_pages = 2
+    settings.recycle_keep_cookies = True
+    with FakeWebDriver() as server:
+        driver = create_driver(server, settings)
+        session_id = driver.session_id
+        driver.get("https://example.com/a")
+        assert not driver.recycle_if_needed()
+        driver.get("https://example.com/b")
+        assert driver.recycle_if_needed()
+
+        assert driver.session_id != session_id
+        assert server.sessions == {driver.session_id}
+        assert driver.pages_visited == 0
+        assert server.cdp_commands[0] == ("Network.getAllCookies", {})
+        assert driver.current_url
+
+def test_create_paths(monkeypatch, tmp_path):
+    settings = get_settings()
+    settings.metrics = Metrics()
+    registry_path = os.path.join(tmp_path, "sessions.json")
+    monkeypatch.setattr(session, "_REGISTRY_FILE_PATH", registry_path)
+    monkeypatch.setattr(session, "_REGISTRY_FILE_PATH_LOCK", registry_path + ".lock")
+    monkeypatch.setattr(session, "_ALIVE_TIMES", {})
+    with FakeWebDriver() as server:
+        monkeypatch.setenv(service.PORT_ENV_KEY, f"{server.port}")
+
+        driver = Driver.create(settings=settings)
+        driver.release()
+        # The session was registered moments ago, so it is reused without probing it.
+        assert Driver.create(settings=settings).session_id == driver.session_id
+        assert server.counts["getCurrentUrl"] == 0
+        driver.release()
+
+        server.sessions.clear()
+        session._forget_session_liveness(server.port, driver.session_id)
+        new_driver = Driver.create(settings=settings)
+        assert new_driver.session_id != driver.session_id
+        assert server.counts["getCurrentUrl"] == 1
+        new_driver.release()
+
+        assert {path: times.count for path, times in settings.metrics.create_times.items()} == \
+            {"cold": 1, "warm": 1, "stale": 1}
+
+def test_invalid_xpath_fails_fast():
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]}) as server:
+        driver = create_driver(server)
+        for call in (lambda: driver.click_by_xpath("//h1["),
+                     lambda: driver.read_text_by_xpath("//h1]"),
+                     lambda: driver.wait_for_xpath("//", 1),
+                     lambda: driver.read_texts_by_xpaths({"title": "//h1", "bad": "//p[@id='x]"})):
+            with pytest.raises(InvalidXPath):
+                call()
+        assert server.counts["findElement"] == 0
+        assert server.counts["w3cExecuteScript"] == 0
+        assert server.counts["w3cExecuteScriptAsync"] == 0
+
+        # An xpath the browser rejects is not retried either.
+        server.invalid_xpaths.add("//a[unknown()]")
+        with pytest.raises(InvalidXPath):
+            driver.find_by_xpath("//a[unknown()]")
+        assert server.counts["findElement"] == 1
+
+def network_event(method, **params):
+    return {"level": "INFO", "timestamp": 0,
+            "message": json.dumps({"message": {"method": method, "params": params}})}
+
+def test_capture_responses():
+    capabilities = _get_default_options("capture").to_capabilities()
+    assert capabilities["goog:loggingPrefs"] == {"performance": "ALL"}
+
+    with FakeWebDriver() as server:
+        driver = create_driver(server)
+        # Events from before the capture are not read.
+        server.performance_log = [
+            network_event("Network.responseReceived", requestId="0",
+                          response={"url": "https://example.com/api/old"}),
+            network_event("Network.loadingFinished", requestId="0"),
+        ]
+        with driver.capture_responses(r"/api/") as capture:
+            assert server.cdp_commands[0][0] == "Network.enable"
+            server.performance_log = [
+                network_event("Network.responseReceived", requestId="1",
+                              response={"url": "https://example.com/api/a"}),
+                network_event("Network.responseReceived", requestId="2",
+                              response={"url": "https://example.com/image.png"}),
+                network_event("Network.responseReceived", requestId="3",
+                              response={"url": "https://example.com/api/b"}),
+                network_event("Network.responseReceived", requestId="4",
+                              response={"url": "https://example.com/api/c"}),
+                network_event("Network.loadingFinished", requestId="1"),
+                network_event("Network.loadingFinished", requestId="2"),
+                network_event("Network.loadingFailed", requestId="4"),
+            ]
+            server.response_bodies = {
+                "1": {"body": "{\"items\": [1, 2]}", "base64Encoded": False},
+                "3": {"body": base64.b64encode(b"plain").decode(), "base64Encoded": True},
+            }
+            assert capture.read() == [("https://example.com/api/a", {"items": [1, 2]})]
+
+            server.performance_log = [network_event("Network.loadingFinished", requestId="3")]
+            assert capture.read(timeout=1) == [("https://example.com/api/b", b"plain")]
+            assert capture.read() == []
+        assert [command for command, _ in server.cdp_commands].count("Network.getResponseBody") == 2
+        # The default body buffers are restored on exit.
+        assert server.cdp_commands[-1] == ("Network.enable", {})
+
+def test_extract_records_in_chunks():
+    rows = [[f"name {index}", f"{index}"] for index in range(5)]
+    keys = set()
+
+    def handle_script(script, args):
+        if script == browser_scripts.READ_TABLE:
+            offset, limit = args[2], args[3]
+            return {"total": len(rows), "rows": rows[offset:offset + limit]}
+        assert script == browser_scripts.EXTRACT_RECORDS
+        row_xpath, columns, _, offset, limit, key = args
+        assert (row_xpath, columns) == ("//tr", ["./td[1]", "./td[2]"])
+        keys.add(key)
+        return {"total": len(rows), "rows": rows[offset:offset + limit]}
+
+    settings = get_settings()
+    settings.chunk_size = 2
+    with FakeWebDriver(script_handler=handle_script) as server:
+        driver = create_driver(server, settings)
+        records = list(driver.extract_records("//tr", {"name": "./td[1]", "price": "./td[2]"}))
+        assert records == [{"name": name, "price": price} for name, price in rows]
+        assert server.counts["w3cExecuteScript"] == 3
+        # Every chunk of one extraction uses the rows found for the first chunk.
+        assert len(keys) == 1
+
+        records = list(driver.extract_records("//tr", ["./td[1]", "./td[2]"]))
+        assert records == [tuple(row) for row in rows]
+        assert len(keys) == 2
+
+        assert list(driver.read_table("//table")) == [tuple(row) for row in rows]
+        assert server.counts["w3cExecuteScript"] == 9
+
+def test_read_table_not_found():
+    def handle_script(script, args):
+        return None
+
+    settings = get_settings()
+    settings.try_times = 0
+    with FakeWebDriver(script_handler=handle_script) as server:
+        driver = create_driver(server, settings)
+        with pytest.raises(WebDriverException):
+            list(driver.read_table("//table"))
+
+def test_wait_until_settled_after_action():
+    settle_args = []
+
+    def handle_script(script, args):
+        assert script == browser_scripts.WAIT_UNTIL_SETTLED
+        settle_args.append(args[:2])
+        return True
+
+    settings = get_settings()
+    settings.click_delay = 5
+    settings.metrics = Metrics()
+    with FakeWebDriver(elements={"//button": [FakeElement("OK")]},
+                       script_handler=handle_script) as server:
+        driver = create_driver(server, settings)
+        driver.click_by_xpath("//button")
+        # The delay is only an upper bound, so the click returns once the page has settled.
+        [(action, elapsed_time)] = driver.settle_times
+        assert action == "click"
+        assert elapsed_time < 1
+        assert settle_args == [[5000, settings.settle_quiet_time * 1000]]
+        assert settings.metrics.settle_times["click"].count == 1
+
+def test_wait_until_settled_falls_back_to_sleeping():
+    settings = get_settings()
+    settings.click_delay = 0.2
+    with FakeWebDriver(elements={"//button": [FakeElement("OK")]},
+                       failures={"w3cExecuteScriptAsync": 1}) as server:
+        driver = create_driver(server, settings)
+        driver.click_by_xpath("//button")
+        [(action, elapsed_time)] = driver.settle_times
+        assert action == "click"
+        assert elapsed_time >= 0.2
+
+def test_fixed_delay_without_settle():
+    settings = get_settings()
+    settings.wait_for_settle = False
+    settings.click_delay = 0.05
+    settings.metrics = Metrics()
+    with FakeWebDriver(elements={"//button": [FakeElement("OK")]}) as server:
+        driver = create_driver(server, settings)
+        driver.click_by_xpath("//button")
+        assert not driver.settle_times
+        assert server.counts["w3cExecuteScriptAsync"] == 0
+        assert settings.metrics.delay_times == {"click": 0.05}
+
+def test_wait_for_elements():
+    conditions = []
+
+    def handle_script(script, args):
+        if script == browser_scripts.WAIT_UNTIL_SETTLED:
+            return True
+        assert script == browser_scripts.WAIT_FOR_XPATH
+        xpath, _, condition, _ = args
+        conditions.append(condition)
+        return server.find(xpath)[0] if server.find(xpath) else None
+
+    settings = get_settings()
+    settings.wait_for_elements = True
+    settings.wait_timeout = 1
+    elements = {"//h1": [FakeElement("Title")], "//button": [FakeElement("OK")]}
+    with FakeWebDriver(elements=elements, script_handler=handle_script) as server:
+        driver = create_driver(server, settings)
+        driver.find_by_xpath("//h1")
+        driver.click_by_xpath("//button")
+        assert driver.read_text_by_xpath("//h1", allow_empty=False) == "Title"
+        assert conditions == ["present", "clickable", "text_nonempty"]
+        assert server.counts["findElement"] == 0
+
+        # A wait that timed out is not retried, even by nested helpers.
+        conditions.clear()
+        with pytest.raises(TimeoutException):
+            driver.click_by_xpath("//missing")
+        assert conditions == ["clickable"]
+
+def test_script_timeout_is_only_raised():
+    def handle_script(script, args):
+        return server.find(args[0])[0]
+
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]},
+                       script_handler=handle_script) as server:
+        driver = create_driver(server)
+        # Waits shorter than the default script timeout of the session leave it as it is.
+        driver.wait_for_xpath("//h1", 1)
+        assert server.counts["setTimeouts"] == 0
+        driver.wait_for_xpath("//h1", 40)
+        driver.wait_for_xpath("//h1", 1)
+        assert server.counts["setTimeouts"] == 1
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for 'metrics'."""
+
+import json
+
+from selenium_helpers.metrics import Histogram, Metrics
+from selenium_helpers.repeat_on_failure import ReTry
+
+def test_histogram():
+    histogram = Histogram(buckets=(0.1, 1))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.count == 3
+    assert histogram.bucket_counts == [1, 2]
+    assert histogram.to_dict()["buckets"] == {"0.1": 1, "1": 2}
+
+def test_retries_are_recorded():
+    metrics = Metrics()
+    tries = []
+
+    @ReTry(ValueError, tries=3, sleep_time=0, on_retry=metrics.record_retry)
+    def fail_twice():
+        tries.append(None)
+        if len(tries) < 3:
+            raise ValueError("failure")
+
+    fail_twice()
+    assert metrics.retries == {"ValueError": 2}
+    assert metrics.retry_sleep_time == 0
+
+def test_exports():
+    metrics = Metrics(buckets=(0.1,))
+    metrics.record_command("findElement", 0.05)
+    metrics.record_command("findElement", 0.2, failed=True)
+    metrics.record_settle("click", 0.01)
+    metrics.record_delay("open_url", 2)
+
+    exported = json.loads(metrics.to_json())
+    assert exported["commands"]["findElement"]["count"] == 2
+    assert exported["command_errors"] == {"findElement": 1}
+    assert exported["delay_seconds"] == {"open_url": 2}
+
+    text = metrics.to_prometheus()
+    assert 'selenium_helpers_command_seconds_bucket{command="findElement",le="0.1"} 1' in text
+    assert 'selenium_helpers_command_seconds_bucket{command="findElement",le="+Inf"} 2' in text
+    assert 'selenium_helpers_command_errors_total{command="findElement"} 1' in text
+    assert 'selenium_helpers_settle_seconds_count{action="click"} 1' in text
+    assert text.endswith("\n")
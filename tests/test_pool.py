@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for 'DriverPool' against 'FakeWebDriver'."""
+
+import os
+
+import pytest
+
+from fake_webdriver import FakeElement, FakeWebDriver
+
+from selenium_helpers import service
+from selenium_helpers.pool import DriverPool, PoolExhausted
+from selenium_helpers.selenium_helpers import Settings, _get_default_options
+
+def get_settings():
+    settings = Settings()
+    settings.wait_for_settle = False
+    settings.sleep_time = 0
+    settings.try_times = 0
+    return settings
+
+def create_pool(server):
+    return DriverPool(1, first_port=server.port, start_service=False,
+                      settings_factory=get_settings)
+
+def test_checkout_reuses_live_driver():
+    with FakeWebDriver(elements={"//h1": [FakeElement("Title")]}) as server:
+        with create_pool(server) as pool:
+            with pool.checkout() as driver:
+                assert driver.read_text_by_xpath("//h1") == "Title"
+                session_id = driver.session_id
+                assert pool.stats()["in_use"] == 1
+            with pool.checkout() as driver:
+                assert driver.session_id == session_id
+
+            # The driver is created on the first checkout and checked on the second one.
+            assert server.counts["newSession"] == 1
+            assert server.counts["getCurrentUrl"] == 1
+            stats = pool.stats()
+            assert stats["size"] == 1
+            assert stats["in_use"] == 0
+            assert stats["checkouts"] == 2
+            assert stats["replacements"] == 0
+        assert not server.sessions
+
+def test_dead_session_is_replaced():
+    with FakeWebDriver() as server:
+        with create_pool(server) as pool:
+            with pool.checkout() as driver:
+                session_id = driver.session_id
+            server.sessions.clear()
+
+            with pool.checkout() as driver:
+                assert driver.session_id != session_id
+                assert driver.session_id in server.sessions
+            assert pool.stats()["replacements"] == 1
+
+def test_pool_exhausted():
+    with FakeWebDriver() as server:
+        with create_pool(server) as pool:
+            with pool.checkout():
+                with pytest.raises(PoolExhausted):
+                    with pool.checkout(timeout=0.1):
+                        pass
+            with pool.checkout(timeout=0.1):
+                pass
+            assert pool.stats()["checkouts"] == 2
+
+def test_warm_returns_each_slot_when_ready():
+    session_ids = []
+
+    def create_options():
+        session_ids.append(None)
+        if len(session_ids) == 2:
+            # The slot warmed first can be checked out while the next driver is created.
+            with pool.checkout(timeout=0) as driver:
+                session_ids[0] = driver.session_id
+        return _get_default_options()
+
+    with FakeWebDriver() as server:
+        with DriverPool(2, first_port=server.port, start_service=False,
+                        options_factory=create_options, settings_factory=get_settings) as pool:
+            # Both slots use the one server.
+            pool._slots[1].port = server.port
+            pool.warm(2)
+            assert session_ids[0] in server.sessions
+            assert server.counts["newSession"] == 2
+            # Both idle slots are warm already.
+            pool.warm(2)
+            assert server.counts["newSession"] == 2
+
+def test_unmanaged_service_leaves_no_files(monkeypatch, tmp_path):
+    monkeypatch.setattr(service, "_FILE_DIR", f"{tmp_path}")
+    settings = get_settings()
+    # Checking the memory usage reads the saved 'pid' of the service.
+    settings.recycle_after_rss = 1024
+    with FakeWebDriver() as server:
+        with DriverPool(1, first_port=server.port, start_service=False,
+                        settings_factory=lambda: settings) as pool:
+            with pool.checkout() as driver:
+                assert driver.get_service_pid() is None
+            with pool.checkout():
+                pass
+            assert pool.stats()["recycles"] == 0
+    assert not os.listdir(tmp_path)
@@ -6,7 +6,9 @@
 
 """Tests for 'repeat_on_failure'."""
 
-from repeat_on_failure import ReTry
+import time
+
+from repeat_on_failure import ReTry, RetryPolicy
 
 tests = []
 
@@ -90,6 +92,84 @@ def test_case4():
 
 tests.append(test_case4)
 
+# Case 5: nested calls do not multiply tries.
+calls = 0
+@ReTry(Exception, sleep_time=0, tries=3)
+def case5_inner():
+    global calls
+    calls += 1
+    raise Exception("failure")
+
+@ReTry(Exception, sleep_time=0, tries=3)
+def case5_outer():
+    case5_inner()
+
+def test_case5():
+    global calls
+    print("Starting 'test_case5'.")
+    calls = 0
+    try:
+        case5_outer()
+    except Exception:
+        pass
+    assert calls == 4, calls
+    print("'test_case5' done.")
+
+tests.append(test_case5)
+
+# Case 6: deadline stops retrying.
+@ReTry(Exception, sleep_time=0.01, tries=1000, deadline=0.05)
+def case6():
+    raise Exception("failure")
+
+def test_case6():
+    print("Starting 'test_case6'.")
+    start_time = time.monotonic()
+    try:
+        case6()
+    except Exception:
+        pass
+    assert time.monotonic() - start_time < 1
+    print("'test_case6' done.")
+
+tests.append(test_case6)
+
+# Case 7: exception specific policy.
+class CustomException7(Exception):
+    pass
+
+calls7 = 0
+@ReTry(Exception, sleep_time=0, tries=5, policies={CustomException7: RetryPolicy(tries=0)})
+def case7():
+    global calls7
+    calls7 += 1
+    raise CustomException7("failure")
+
+def test_case7():
+    global calls7
+    print("Starting 'test_case7'.")
+    calls7 = 0
+    try:
+        case7()
+    except CustomException7:
+        pass
+    assert calls7 == 1, calls7
+    print("'test_case7' done.")
+
+tests.append(test_case7)
+
+# Case 8: exponential backoff is capped and jittered.
+def test_case8():
+    print("Starting 'test_case8'.")
+    policy = RetryPolicy(sleep_time=1, backoff=2, max_sleep_time=5)
+    assert [policy.get_sleep_time(count) for count in range(4)] == [1, 2, 4, 5]
+
+    policy = RetryPolicy(sleep_time=1, jitter=0.5)
+    assert all(0.5 <= policy.get_sleep_time(0) <= 1.5 for _ in range(100))
+    print("'test_case8' done.")
+
+tests.append(test_case8)
+
 # Run tests.
 for test in tests:
     test()
\ No newline at end of file
@@ -0,0 +1,95 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for starting and stopping the service in 'service'."""
+
+import os
+import socket
+import stat
+import subprocess
+import sys
+
+import pytest
+
+from fake_webdriver import FakeWebDriver
+
+from selenium_helpers import service
+
+# Stand-in for 'chromedriver' that starts answering '/status' after a short delay.
+FAKE_CHROMEDRIVER = f"""#!{sys.executable}
+import sys, time, http.server
+port = int([arg for arg in sys.argv if arg.startswith("--port=")][0].split("=")[1])
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = b'{{"value": {{"ready": true}}}}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    def log_message(self, *args):
+        pass
+time.sleep(0.2)
+http.server.HTTPServer(("127.0.0.1", port), Handler).serve_forever()
+"""
+
+def get_free_port():
+    with socket.socket() as free_socket:
+        free_socket.bind(("127.0.0.1", 0))
+        return free_socket.getsockname()[1]
+
+def install_executable(monkeypatch, tmp_path, source):
+    executable_path = os.path.join(tmp_path, "chromedriver")
+    with open(executable_path, "w") as executable_file:
+        executable_file.write(source)
+    os.chmod(executable_path, os.stat(executable_path).st_mode | stat.S_IEXEC)
+    monkeypatch.setenv(service.PATH_ENV_KEY, executable_path)
+    monkeypatch.setenv(service.LOG_PATH_ENV_KEY, os.path.join(tmp_path, "service.log"))
+    monkeypatch.setattr(service, "_FILE_DIR", f"{tmp_path}")
+
+def test_start_and_reuse(monkeypatch, tmp_path):
+    install_executable(monkeypatch, tmp_path, FAKE_CHROMEDRIVER)
+
+    port = get_free_port()
+    process = service._start_chromedriver(port=port, timeout=10)
+    try:
+        assert process is not None
+        assert service._is_ready(port)
+        assert service._read_saved_pid(port) == process.pid
+        assert service._is_chromedriver_running(port=port)
+
+        # The running service is reused.
+        assert service._start_chromedriver(port=port, timeout=10) is None
+    finally:
+        service._shutdown_chromedriver(port=port)
+        process.wait(timeout=10)
+
+    assert not service._is_chromedriver_running(port=port)
+
+def test_port_used_by_another_service(monkeypatch, tmp_path):
+    install_executable(monkeypatch, tmp_path, FAKE_CHROMEDRIVER)
+    with FakeWebDriver() as server:
+        # The service answering on the port was not started here, so it is not reused.
+        with pytest.raises(service.ServiceNotReady):
+            service._start_chromedriver(port=server.port, timeout=10)
+        assert service._read_saved_pid(server.port) is None
+
+def test_exited_service(monkeypatch, tmp_path):
+    install_executable(monkeypatch, tmp_path, f"#!{sys.executable}\nimport sys\nsys.exit(1)\n")
+    port = get_free_port()
+    with pytest.raises(service.ServiceNotReady, match="exited with code 1"):
+        service._start_chromedriver(port=port, timeout=10)
+    assert service._read_saved_pid(port) is None
+
+def test_read_process_tree_rss():
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(10)"])
+    try:
+        child_rss = service._read_process_tree_rss(process.pid)
+        assert child_rss > 0
+        tree_rss = service._read_process_tree_rss(os.getpid())
+        assert tree_rss >= child_rss + service._read_rss(os.getpid())
+    finally:
+        process.kill()
+        process.wait()
@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for the session registry in 'session'."""
+
+import os
+import subprocess
+import sys
+
+from selenium_helpers import session
+
+def use_temporary_registry(monkeypatch, directory):
+    registry_path = os.path.join(directory, "sessions.json")
+    monkeypatch.setattr(session, "_REGISTRY_FILE_PATH", registry_path)
+    monkeypatch.setattr(session, "_REGISTRY_FILE_PATH_LOCK", registry_path + ".lock")
+    monkeypatch.setattr(session, "_ALIVE_TIMES", {})
+
+def get_stopped_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def test_claim_and_release(monkeypatch, tmp_path):
+    use_temporary_registry(monkeypatch, tmp_path)
+
+    assert session._claim_session("worker-1") is None
+    session._register_session("worker-1", "abc", 9515)
+    record = session._claim_session("worker-1")
+    assert record["session_id"] == "abc"
+    assert record["port"] == "9515"
+    assert record["owner"] == os.getpid()
+
+    session._release_session("worker-1")
+    assert session._read_registry()["worker-1"]["owner"] is None
+
+def test_claimed_by_other_process(monkeypatch, tmp_path):
+    use_temporary_registry(monkeypatch, tmp_path)
+
+    session._register_session("worker-1", "abc", 9515)
+    registry = session._read_registry()
+    registry["worker-1"]["owner"] = os.getppid()
+    session._write_registry(registry)
+
+    try:
+        session._claim_session("worker-1")
+    except session.SessionAlreadyExists:
+        pass
+    else:
+        raise AssertionError("Claimed a session of another process")
+
+    # Claims of stopped processes are ignored.
+    registry["worker-1"]["owner"] = get_stopped_pid()
+    session._write_registry(registry)
+    assert session._claim_session("worker-1")["session_id"] == "abc"
+
+def test_reap_sessions(monkeypatch, tmp_path):
+    use_temporary_registry(monkeypatch, tmp_path)
+
+    session._register_session("alive", "abc", 9515, pid=os.getpid())
+    session._register_session("stopped", "def", 9516, pid=get_stopped_pid())
+    session._register_session("unknown", "ghi", 9517)
+
+    assert list(session._reap_sessions()) == ["stopped"]
+    assert sorted(session._read_registry()) == ["alive", "unknown"]
+
+def test_claim_reserves_key(monkeypatch, tmp_path):
+    use_temporary_registry(monkeypatch, tmp_path)
+
+    assert session._claim_session("worker-1") is None
+    assert session._read_registry()["worker-1"]["owner"] == os.getpid()
+
+    # Another process can not claim the key while this one starts a session for it.
+    script = ("import sys; from selenium_helpers import session; "
+              f"session._REGISTRY_FILE_PATH = {session._REGISTRY_FILE_PATH!r}; "
+              f"session._REGISTRY_FILE_PATH_LOCK = {session._REGISTRY_FILE_PATH_LOCK!r}\n"
+              "try:\n    session._claim_session('worker-1')\n"
+              "except session.SessionAlreadyExists:\n    sys.exit(3)")
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+    assert subprocess.run([sys.executable, "-c", script], env=environment).returncode == 3
+
+    session._register_session("worker-1", "abc", 9515)
+    assert session._claim_session("worker-1")["session_id"] == "abc"
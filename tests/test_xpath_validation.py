@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+# -*- coding: utf-8 -*-
+# vim: ts=4 sw=4 tw=100 et ai si
+#
+# Author: Henri Immonen <henri.immonen@mostdigital.fi>
+
+"""Tests for checking xpaths in 'xpath_validation'."""
+
+import pytest
+
+from selenium_helpers import xpath_validation
+
+VALID_XPATHS = ["/", "//h1", "(//li)[2]", "./td[1]", "//a/@href", "//*[local-name()='svg']",
+                "//a[contains(text(), \"[x\")]", "//p[@id='a' or @id='b']/following-sibling::*",
+                "count(//tr) > 1"]
+
+INVALID_XPATHS = ["", "  ", "//h1[", "//h1]", "(//li]", "//p[@id='x]", "//p[]", "//", "//a/@",
+                  "child::", "| //a", "//a !"]
+
+@pytest.mark.parametrize("xpath", VALID_XPATHS)
+def test_valid(xpath):
+    assert xpath_validation.get_xpath_error(xpath) is None
+    assert xpath_validation._check_without_lxml(xpath) is None
+
+@pytest.mark.parametrize("xpath", INVALID_XPATHS)
+def test_invalid(xpath):
+    assert xpath_validation._check_without_lxml(xpath) is not None
+    if xpath_validation.etree is not None:
+        assert xpath_validation.get_xpath_error(xpath) is not None